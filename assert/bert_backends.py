@@ -0,0 +1,216 @@
+"""BERTScore CPU 推論後端：PyTorch（預設）、動態量化 int8、ONNX Runtime
+
+後端只替換 BERTScorer 內部的模型，tokenizer、取用的層數、greedy matching 與 baseline 校正都不變。
+以環境變數 BERT_SCORE_BACKEND 選擇後端：
+    torch      原始 PyTorch 模型（參考後端）
+    int8       torch 動態量化（Linear 層權重 int8）
+    onnx       匯出為 ONNX 並以 ONNX Runtime 執行
+    onnx-int8  ONNX Runtime 動態量化模型
+
+切換前可先比對分數一致性與加速比:
+    python assert/bert_backends.py sample.csv --backend onnx --backend int8 [--limit 200]
+"""
+import argparse
+import csv
+import os
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+DEFAULT_MODELS_DIR = os.environ.get("BERT_SCORE_MODELS_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results", "bert_models"
+)
+ONNX_OPSET = 14
+
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"不支援的 BERTScore 後端: {backend}（可用: {', '.join(BACKENDS)}）")
+    return backend
+
+
+class OnnxEncoder:
+    """以 ONNX Runtime 執行的編碼器，呼叫方式與 bert_score 使用的 transformers 模型相同"""
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+    def parameters(self):
+        # bert_score 以第一個參數的 device 決定輸入張量的位置，ONNX Runtime 一律使用 CPU
+        import torch
+        yield torch.empty(0)
+
+    def __call__(self, input_ids, attention_mask=None, output_hidden_states=False):
+        import torch
+
+        if output_hidden_states:
+            raise ValueError("ONNX 後端不支援 all_layers")
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        hidden_states = self.session.run(None, {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.int64)
+        })[0]
+        return (torch.from_numpy(hidden_states),)
+
+
+def _model_path(scorer, suffix: str, models_dir: str) -> str:
+    name = f"{scorer.model_type.replace('/', '--')}-L{scorer.num_layers}{suffix}.onnx"
+    return os.path.join(models_dir, name)
+
+
+def _atomic_path(path: str) -> str:
+    return os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex[:8]}-{os.path.basename(path)}")
+
+
+def export_onnx(scorer, models_dir: str = DEFAULT_MODELS_DIR) -> str:
+    """將 BERTScorer 的模型（已截斷至使用的層數）匯出為 ONNX，已存在時直接使用"""
+    import torch
+
+    path = _model_path(scorer, "", models_dir)
+    if os.path.exists(path):
+        return path
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids, attention_mask=attention_mask)[0]
+
+    os.makedirs(models_dir, exist_ok=True)
+    temp_path = _atomic_path(path)
+    dummy = scorer._tokenizer(["warmup"], return_tensors="pt")
+    export_args = dict(
+        input_names=["input_ids", "attention_mask"],
+        output_names=["hidden_states"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "hidden_states": {0: "batch", 1: "sequence"}
+        },
+        opset_version=ONNX_OPSET
+    )
+    module = HiddenStates(scorer._model.cpu()).eval()
+    inputs = (dummy["input_ids"], dummy["attention_mask"])
+    with torch.no_grad():
+        try:
+            # 新版 torch 預設使用 dynamo 匯出，這裡沿用 TorchScript 匯出器
+            torch.onnx.export(module, inputs, temp_path, dynamo=False, **export_args)
+        except TypeError:
+            torch.onnx.export(module, inputs, temp_path, **export_args)
+    os.replace(temp_path, path)
+    print(f"已匯出 ONNX 模型: {path}")
+    return path
+
+
+def quantize_onnx(scorer, models_dir: str = DEFAULT_MODELS_DIR) -> str:
+    """以 ONNX Runtime 動態量化（權重 int8）匯出的模型"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    path = _model_path(scorer, "-int8", models_dir)
+    if os.path.exists(path):
+        return path
+    temp_path = _atomic_path(path)
+    quantize_dynamic(export_onnx(scorer, models_dir), temp_path, weight_type=QuantType.QInt8)
+    os.replace(temp_path, path)
+    print(f"已量化 ONNX 模型: {path}")
+    return path
+
+
+def apply_backend(scorer, backend: str, num_threads: Optional[int] = None, models_dir: str = DEFAULT_MODELS_DIR):
+    """將 BERTScorer 的模型替換為指定後端（非 torch 後端一律在 CPU 執行）"""
+    check_backend(backend)
+    if backend == "int8":
+        import torch
+        from torch.ao.quantization import quantize_dynamic
+
+        scorer._model = quantize_dynamic(scorer._model.cpu(), {torch.nn.Linear}, dtype=torch.qint8).eval()
+    elif backend == "onnx":
+        scorer._model = OnnxEncoder(export_onnx(scorer, models_dir), num_threads)
+    elif backend == "onnx-int8":
+        scorer._model = OnnxEncoder(quantize_onnx(scorer, models_dir), num_threads)
+    scorer.backend = backend
+    return scorer
+
+
+def _load_pairs(csv_path: str, output_column: str, reference_column: str, limit: int) -> Tuple[List[str], List[str]]:
+    outputs, references = [], []
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get(output_column) and row.get(reference_column):
+                outputs.append(row[output_column])
+                references.append(row[reference_column])
+                if len(outputs) >= limit:
+                    break
+    return outputs, references
+
+
+def _timed_scores(scorer, outputs, references, batch_size, repeat):
+    """回傳 (P/R/F1 陣列, 最佳一次的秒數)"""
+    best, scores = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        P, R, F1 = scorer.score(outputs, references, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        scores = np.stack([P.numpy(), R.numpy(), F1.numpy()], axis=1)
+    return scores, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 BERTScore 後端與 PyTorch 參考後端的分數一致性與速度")
+    parser.add_argument("csv_path", help="樣本 CSV（需包含模型輸出與參考答案欄位）")
+    parser.add_argument("--backend", action="append", choices=BACKENDS[1:], help="要比較的後端（可重複指定）")
+    parser.add_argument("--output-column", default="output")
+    parser.add_argument("--reference-column", default="expected_answer")
+    parser.add_argument("--limit", type=int, default=200, help="最多使用的樣本數")
+    parser.add_argument("--batch-size", type=int, default=1, help="每次評分的筆數（1 等同 assertion 逐筆呼叫）")
+    parser.add_argument("--threshold", type=float, default=0.5, help="assertion 通過門檻")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    import bert_scoring
+
+    outputs, references = _load_pairs(args.csv_path, args.output_column, args.reference_column, args.limit)
+    if not outputs:
+        parser.error("樣本 CSV 中沒有同時包含模型輸出與參考答案的資料列")
+    settings = (bert_scoring.DEFAULT_LANG, bert_scoring.DEFAULT_MODEL_TYPE, bert_scoring.DEFAULT_RESCALE)
+    print(f"樣本: {len(outputs)} 筆，設定: {settings}")
+
+    reference_scorer = bert_scoring.get_scorer(*settings, backend="torch")
+    reference_scorer.score(["warmup"], ["warmup"])
+    expected, reference_time = _timed_scores(reference_scorer, outputs, references, args.batch_size, args.repeat)
+    print(f"{'torch':<10} {len(outputs) / reference_time:>9.1f} 筆/秒")
+
+    for backend in args.backend or ["int8", "onnx"]:
+        scorer = bert_scoring.get_scorer(*settings, backend=backend)
+        scorer.score(["warmup"], ["warmup"])
+        scores, elapsed = _timed_scores(scorer, outputs, references, args.batch_size, args.repeat)
+        diff = np.abs(scores - expected)
+        agreement = ((scores >= args.threshold) == (expected >= args.threshold)).mean(axis=0) * 100
+        correlation = [np.corrcoef(scores[:, i], expected[:, i])[0, 1] if len(outputs) > 1 else 1.0
+                       for i in range(3)]
+        print(f"{backend:<10} {len(outputs) / elapsed:>9.1f} 筆/秒  加速 {reference_time / elapsed:.2f}x")
+        for i, metric in enumerate(("Precision", "Recall", "F1")):
+            print(f"    {metric:<10} 最大差異 {diff[:, i].max():.4f}  平均差異 {diff[:, i].mean():.4f}  "
+                  f"相關係數 {correlation[i]:.4f}  通過判定一致 {agreement[i]:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
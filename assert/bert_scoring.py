@@ -1,63 +1,313 @@
-from typing import Dict, Any, Union
-from bert_score import score
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 
-def get_assert_bert_f1(output: str, context: Dict[str, Any]) -> Dict[str, Any]:
-    reference = context["vars"].get("expected_answer", "")
-    
-    if not reference:
-        return {
-            "pass": False,
-            "score": 0.0,
-            "reason": "No reference provided in context.vars.expected_answer"
-        }
+# torch 與 bert_score 在第一次需要於本行程計算時才載入，
+# 評分伺服器執行中時 assertion 只作為輕量的 client，不需負擔載入時間
 
+# BERTScore 設定（可由環境變數或 assertion 的 config 覆寫）
+DEFAULT_LANG = os.environ.get("BERT_SCORE_LANG", "zh")
+DEFAULT_MODEL_TYPE = os.environ.get("BERT_SCORE_MODEL") or None
+DEFAULT_RESCALE = os.environ.get("BERT_SCORE_RESCALE", "1").lower() not in ("0", "false", "no")
+# torch 使用的 CPU 執行緒數（未設定時使用 torch 預設值）
+TORCH_THREADS = os.environ.get("BERT_SCORE_THREADS")
+# 推論後端：torch、int8、onnx、onnx-int8（見 bert_backends.py）
+BACKEND = os.environ.get("BERT_SCORE_BACKEND", "torch")
 
+# 行程內共用的 BERTScorer，依 (lang, model_type, rescale_with_baseline, backend) 快取，
+# 同一行程內的多次評分只需載入一次模型與 baseline
+_scorers: Dict[Tuple[str, Optional[str], bool, str], Any] = {}
+_scorers_lock = threading.Lock()
+_threads_configured = False
 
-    # BERTScore（使用中文模型）
-    P, R, F1 = score([output], [reference], lang="zh", rescale_with_baseline=True)
-    bert_f1 = F1[0].item()
-    
-    pass_condition = bert_f1 >= 0.5
+# 同一筆 (output, reference, 模型設定) 的 P/R/F1 只計算一次，F1 / Recall / Precision 三個 assertion 共用
+CACHE_SIZE = int(os.environ.get("BERT_SCORE_CACHE_SIZE", "4096"))
+# 以 SQLite 保存分數，跨次執行共用；預設放在 assert 目錄下（不受 promptfoo 執行時的工作目錄影響），設為 off 停用
+CACHE_PATH = os.environ.get("BERT_SCORE_CACHE_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "bert_score_cache.db"
+)
+if CACHE_PATH.lower() == "off":
+    CACHE_PATH = None
+# 磁碟快取的筆數上限，超過時刪除最久未使用的分數（0 表示不限制）
+DISK_CACHE_SIZE = int(os.environ.get("BERT_SCORE_DISK_CACHE_SIZE", "200000"))
+# 每寫入多少筆檢查一次磁碟快取上限
+DISK_EVICT_INTERVAL = 500
+_disk_cache_writes = 0
+_score_cache: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+_score_cache_lock = threading.Lock()
+_disk_cache: Optional[sqlite3.Connection] = None
 
-    return {
-        "pass": pass_condition,
-        "score": bert_f1,
-        "reason": f"BERTScore F1: {bert_f1:.4f}",
-        "named_scores": {
-            "bert-score": bert_f1
-        }
-    }
+# 評分伺服器位址（見 bert_server.py）：unix socket 路徑或 host:port，設為 off 停用
+SERVER = os.environ.get("BERT_SCORE_SERVER", "")
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "promptlab-bert.sock")
+DEFAULT_TCP_ADDRESS = ("127.0.0.1", 8765)
+SERVER_TIMEOUT = float(os.environ.get("BERT_SCORE_SERVER_TIMEOUT", "120"))
 
-def get_assert_bert_recall(output: str, context: Dict[str, Any]) -> Dict[str, Any]:
-    reference = context["vars"].get("expected_answer", "")
-    
-    if not reference:
-        return {
-            "pass": False,
-            "score": 0.0,
-            "reason": "No reference provided in context.vars.expected_answer"
-        }
+# 預先計算的參考答案嵌入（見 reference_embeddings.py），於第一次計算時載入
+_reference_embeddings = None
+_reference_store = None
 
 
+def configure_threads(num_threads: Optional[int] = None) -> None:
+    """設定 torch 的 CPU 執行緒數，只在第一次建立模型前生效一次"""
+    global _threads_configured
+    if _threads_configured:
+        return
+    num_threads = num_threads or (int(TORCH_THREADS) if TORCH_THREADS else None)
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+    _threads_configured = True
 
-    # BERTScore（使用中文模型）
-    P, R, F1 = score([output], [reference], lang="zh", rescale_with_baseline=True)
-    bert_R = R[0].item()
-    
-    pass_condition = bert_R >= 0.5
 
-    return {
-        "pass": pass_condition,
-        "score": bert_R,
-        "reason": f"BERTScore Recall: {bert_R:.4f}",
-        "named_scores": {
-            "bert-score": bert_R
-        }
-    }
+def _import_sibling(name: str):
+    """載入同目錄的模組（promptfoo 以檔案路徑載入本模組，需自行加入搜尋路徑）"""
+    assert_dir = os.path.dirname(os.path.abspath(__file__))
+    if assert_dir not in sys.path:
+        sys.path.insert(0, assert_dir)
+    return __import__(name)
 
-def get_assert_bert_precision(output: str, context: Dict[str, Any]) -> Dict[str, Any]:
+
+def get_scorer(lang: str = DEFAULT_LANG, model_type: Optional[str] = DEFAULT_MODEL_TYPE,
+               rescale_with_baseline: bool = DEFAULT_RESCALE, backend: str = BACKEND):
+    """取得（必要時建立）對應設定與後端的 BERTScorer"""
+    key = (lang, model_type, bool(rescale_with_baseline), backend)
+    scorer = _scorers.get(key)
+    if scorer is None:
+        with _scorers_lock:
+            scorer = _scorers.get(key)
+            if scorer is None:
+                configure_threads()
+                from bert_score import BERTScorer
+                if backend == "torch":
+                    scorer = BERTScorer(lang=lang, model_type=model_type,
+                                        rescale_with_baseline=rescale_with_baseline)
+                    scorer.backend = backend
+                else:
+                    bert_backends = _import_sibling("bert_backends")
+                    bert_backends.check_backend(backend)
+                    scorer = BERTScorer(lang=lang, model_type=model_type,
+                                        rescale_with_baseline=rescale_with_baseline, device="cpu")
+                    bert_backends.apply_backend(scorer, backend, int(TORCH_THREADS) if TORCH_THREADS else None)
+                _scorers[key] = scorer
+    return scorer
+
+
+def warmup(lang: str = DEFAULT_LANG, model_type: Optional[str] = DEFAULT_MODEL_TYPE,
+           rescale_with_baseline: bool = DEFAULT_RESCALE):
+    """預先載入模型並執行一次評分，讓第一筆測試不需負擔載入時間"""
+    scorer = get_scorer(lang, model_type, rescale_with_baseline)
+    scorer.score(["warmup"], ["warmup"])
+    return scorer
+
+
+def _settings_for_context(context: Dict[str, Any]) -> Tuple[str, Optional[str], bool]:
+    config = context.get("config") or {}
+    return (
+        config.get("lang", DEFAULT_LANG),
+        config.get("model_type", DEFAULT_MODEL_TYPE),
+        bool(config.get("rescale_with_baseline", DEFAULT_RESCALE))
+    )
+
+
+def _cache_key(output: str, reference: str, settings: Tuple[str, Optional[str], bool]) -> str:
+    payload = json.dumps([*settings, BACKEND, output, reference], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _disk_cache_conn() -> Optional[sqlite3.Connection]:
+    """取得磁碟快取連線（呼叫端需持有鎖），未設定 CACHE_PATH 時回傳 None"""
+    global _disk_cache
+    if _disk_cache is None and CACHE_PATH:
+        directory = os.path.dirname(CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS bert_scores ("
+            "key TEXT PRIMARY KEY, precision REAL, recall REAL, f1 REAL, last_used INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(bert_scores)")}
+        if "last_used" not in columns:
+            conn.execute("ALTER TABLE bert_scores ADD COLUMN last_used INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_bert_scores_last_used ON bert_scores(last_used)")
+        _disk_cache = conn
+    return _disk_cache
+
+
+def _cache_get(key: str) -> Optional[Tuple[float, float, float]]:
+    with _score_cache_lock:
+        scores = _score_cache.get(key)
+        if scores is not None:
+            _score_cache.move_to_end(key)
+            return scores
+        conn = _disk_cache_conn()
+        if conn is not None:
+            row = conn.execute(
+                "SELECT precision, recall, f1 FROM bert_scores WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                scores = tuple(row)
+                _cache_put_memory(key, scores)
+                with conn:
+                    conn.execute("UPDATE bert_scores SET last_used = ? WHERE key = ?", (int(time.time()), key))
+        return scores
+
+
+def _cache_put_memory(key: str, scores: Tuple[float, float, float]) -> None:
+    _score_cache[key] = scores
+    _score_cache.move_to_end(key)
+    while len(_score_cache) > CACHE_SIZE:
+        _score_cache.popitem(last=False)
+
+
+def _cache_put(key: str, scores: Tuple[float, float, float]) -> None:
+    global _disk_cache_writes
+    with _score_cache_lock:
+        _cache_put_memory(key, scores)
+        conn = _disk_cache_conn()
+        if conn is not None:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO bert_scores (key, precision, recall, f1, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, *scores, int(time.time()))
+                )
+            _disk_cache_writes += 1
+            if DISK_CACHE_SIZE and _disk_cache_writes % DISK_EVICT_INTERVAL == 1:
+                _evict_disk_cache(conn)
+
+
+def _evict_disk_cache(conn: sqlite3.Connection) -> None:
+    """磁碟快取超過 DISK_CACHE_SIZE 筆時，刪除最久未使用的分數"""
+    with conn:
+        conn.execute(
+            "DELETE FROM bert_scores WHERE key IN ("
+            "SELECT key FROM bert_scores ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (DISK_CACHE_SIZE,)
+        )
+
+
+def score_batch(outputs: List[str], references: List[str],
+                settings: Tuple[str, Optional[str], bool] = (DEFAULT_LANG, DEFAULT_MODEL_TYPE, DEFAULT_RESCALE)
+                ) -> List[Tuple[float, float, float]]:
+    """在本行程中批次計算 (precision, recall, f1)，只對未快取的配對執行模型"""
+    keys = [_cache_key(output, reference, settings) for output, reference in zip(outputs, references)]
+    results = [_cache_get(key) for key in keys]
+    missing = [i for i, scores in enumerate(results) if scores is None]
+    if not missing:
+        return results
+
+    scorer = get_scorer(*settings)
+    # 參考答案已預先計算嵌入的配對只需編碼模型輸出
+    store = _get_reference_store()
+    key = _reference_embeddings.model_key(scorer)
+    precomputed, remaining = [], []
+    for i in missing:
+        reference = store.get(key, references[i])
+        if reference is not None:
+            precomputed.append((i, reference))
+        else:
+            remaining.append(i)
+
+    if precomputed:
+        scores = _reference_embeddings.score_with_references(
+            scorer, [outputs[i] for i, _ in precomputed], [reference for _, reference in precomputed]
+        )
+        for (i, _), value in zip(precomputed, scores):
+            results[i] = value
+    if remaining:
+        P, R, F1 = scorer.score(
+            [outputs[i] for i in remaining], [references[i] for i in remaining], batch_size=len(remaining)
+        )
+        for j, i in enumerate(remaining):
+            results[i] = (P[j].item(), R[j].item(), F1[j].item())
+    for i in missing:
+        _cache_put(keys[i], results[i])
+    return results
+
+
+def _get_reference_store():
+    global _reference_embeddings, _reference_store
+    if _reference_store is None:
+        _reference_embeddings = _import_sibling("reference_embeddings")
+        _reference_store = _reference_embeddings.ReferenceEmbeddingStore()
+    return _reference_store
+
+
+def parse_server_address(value: str):
+    """host:port 解析為 (host, port)，其餘視為 unix socket 路徑"""
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit() and os.sep not in value:
+        return (host or "127.0.0.1", int(port))
+    return value
+
+
+def server_address():
+    """評分伺服器位址：unix socket 路徑、(host, port)，或停用時為 None"""
+    if SERVER.lower() in ("off", "0", "false", "no"):
+        return None
+    if SERVER:
+        return parse_server_address(SERVER)
+    # 不支援 unix socket 的平台（Windows）改用本機 TCP
+    return DEFAULT_SOCKET_PATH if hasattr(socket, "AF_UNIX") else DEFAULT_TCP_ADDRESS
+
+
+def _score_remote(output: str, reference: str,
+                  settings: Tuple[str, Optional[str], bool]) -> Optional[Tuple[float, float, float]]:
+    """向評分伺服器請求分數；伺服器未執行或發生錯誤時回傳 None"""
+    address = server_address()
+    if address is None:
+        return None
+    if isinstance(address, tuple):
+        family = socket.AF_INET
+    else:
+        if not os.path.exists(address):
+            return None
+        family = socket.AF_UNIX
+    request = json.dumps({"output": output, "reference": reference, "settings": list(settings)},
+                         ensure_ascii=False)
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1.0)
+            sock.connect(address)
+            sock.settimeout(SERVER_TIMEOUT)
+            sock.sendall(request.encode("utf-8") + b"\n")
+            with sock.makefile("rb") as reader:
+                response = json.loads(reader.readline())
+    except (OSError, ValueError):
+        return None
+    if "error" in response:
+        print(f"BERTScore 伺服器錯誤，改於本行程計算: {response['error']}")
+        return None
+    return response["precision"], response["recall"], response["f1"]
+
+
+def score_pair(output: str, reference: str,
+               settings: Tuple[str, Optional[str], bool] = (DEFAULT_LANG, DEFAULT_MODEL_TYPE, DEFAULT_RESCALE)
+               ) -> Tuple[float, float, float]:
+    """計算 (precision, recall, f1)：依序使用快取、評分伺服器，最後才在本行程載入模型"""
+    key = _cache_key(output, reference, settings)
+    scores = _cache_get(key)
+    if scores is None:
+        scores = _score_remote(output, reference, settings)
+        if scores is None:
+            return score_batch([output], [reference], settings)[0]
+        _cache_put(key, scores)
+    return scores
+
+
+def _bert_assert(output: str, context: Dict[str, Any], metric: str, label: str) -> Dict[str, Any]:
     reference = context["vars"].get("expected_answer", "")
-    
+
     if not reference:
         return {
             "pass": False,
@@ -65,19 +315,34 @@ def get_assert_bert_precision(output: str, context: Dict[str, Any]) -> Dict[str,
             "reason": "No reference provided in context.vars.expected_answer"
         }
 
-
-
     # BERTScore（使用中文模型）
-    P, R, F1 = score([output], [reference], lang="zh", rescale_with_baseline=True)
-    bert_P = P[0].item()
-    
-    pass_condition = bert_P >= 0.5
+    precision, recall, f1 = score_pair(output, reference, _settings_for_context(context))
+    value = {"precision": precision, "recall": recall, "f1": f1}[metric]
+
+    pass_condition = value >= 0.5
 
     return {
         "pass": pass_condition,
-        "score": bert_P,
-        "reason": f"BERTScore Precision: {bert_P:.4f}",
+        "score": value,
+        "reason": f"BERTScore {label}: {value:.4f}",
         "named_scores": {
-            "bert-score": bert_P
+            "bert-score": value
         }
     }
+
+
+def get_assert_bert_f1(output: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    return _bert_assert(output, context, "f1", "F1")
+
+
+def get_assert_bert_recall(output: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    return _bert_assert(output, context, "recall", "Recall")
+
+
+def get_assert_bert_precision(output: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    return _bert_assert(output, context, "precision", "Precision")
+
+
+# 設定 BERT_SCORE_WARMUP=1 時於載入模組時預先載入預設模型
+if os.environ.get("BERT_SCORE_WARMUP", "").lower() in ("1", "true", "yes"):
+    warmup()
@@ -0,0 +1,187 @@
+"""BERTScore 微批次評分伺服器
+
+promptfoo 逐筆呼叫 python assertion，模型每次只處理一筆。此伺服器常駐載入模型，
+將同時到達的請求依模型設定與長度分組為批次後一起計算，
+bert_scoring.py 中的 assertion 會自動連線至此伺服器，未執行時改為在本行程計算。
+
+協定: 每行一個 JSON 請求 {"output", "reference", "settings": [lang, model_type, rescale]}，
+回應 {"precision", "recall", "f1"} 或 {"error"}。
+
+用法:
+    python assert/bert_server.py                       # 預設 unix socket（Windows 為 127.0.0.1:8765）
+    python assert/bert_server.py --address 127.0.0.1:8765 --max-batch 64 --max-wait-ms 20
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+import bert_scoring
+
+
+class MicroBatcher:
+    """收集請求並依 (模型設定, 長度區間) 分批計算
+
+    第一筆請求到達後最多等待 max_wait 秒或累積 max_batch 筆才開始計算，
+    長度以 2 的次方分區，避免短句與長句同批造成過多 padding。
+    """
+
+    def __init__(self, max_batch=32, max_wait=0.01):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, output, reference, settings):
+        future = Future()
+        self._queue.put((output, reference, settings, future))
+        return future
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join()
+
+    def _collect(self):
+        """取出一批請求；收到停止訊號時回傳 None"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        pending = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(pending) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # 先處理已收集的請求，再結束
+                self._queue.put(None)
+                break
+            pending.append(item)
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            if pending is None:
+                return
+            groups = defaultdict(list)
+            for item in pending:
+                output, reference, settings, _ = item
+                length_bucket = max(len(output), len(reference)).bit_length()
+                groups[(settings, length_bucket)].append(item)
+
+            for (settings, _), items in groups.items():
+                try:
+                    results = bert_scoring.score_batch(
+                        [item[0] for item in items], [item[1] for item in items], settings
+                    )
+                except Exception as e:
+                    for item in items:
+                        item[3].set_exception(e)
+                    continue
+                for item, scores in zip(items, results):
+                    item[3].set_result(scores)
+                self.batches += 1
+                self.requests += len(items)
+
+
+class ScoreRequestHandler(socketserver.StreamRequestHandler):
+    """每行一個請求，同一連線可連續送出多筆"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                lang, model_type, rescale = request.get("settings") or (
+                    bert_scoring.DEFAULT_LANG, bert_scoring.DEFAULT_MODEL_TYPE, bert_scoring.DEFAULT_RESCALE
+                )
+                future = self.server.batcher.submit(
+                    str(request["output"]), str(request["reference"]), (lang, model_type, bool(rescale))
+                )
+                precision, recall, f1 = future.result()
+                response = {"precision": precision, "recall": recall, "f1": f1}
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class _ServerMixin(socketserver.ThreadingMixIn):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socket, "AF_UNIX"):
+    class UnixScoreServer(_ServerMixin, socketserver.UnixStreamServer):
+        pass
+
+
+class TCPScoreServer(_ServerMixin, socketserver.TCPServer):
+    pass
+
+
+def create_server(address, batcher):
+    """依位址型別建立 unix socket 或 TCP 伺服器"""
+    if isinstance(address, tuple):
+        server = TCPScoreServer(address, ScoreRequestHandler)
+    else:
+        # 移除上次未正常結束留下的 socket 檔案
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixScoreServer(address, ScoreRequestHandler)
+    server.batcher = batcher
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BERTScore 微批次評分伺服器")
+    parser.add_argument("--address", help="unix socket 路徑或 host:port（預設同 BERT_SCORE_SERVER）")
+    parser.add_argument("--max-batch", type=int, default=32, help="每批最多請求數")
+    parser.add_argument("--max-wait-ms", type=float, default=10, help="收集批次的最長等待時間（毫秒）")
+    parser.add_argument("--no-warmup", action="store_true", help="啟動時不預先載入預設模型")
+    args = parser.parse_args()
+
+    if not args.no_warmup:
+        print("載入 BERTScore 模型...")
+        bert_scoring.warmup()
+
+    if args.address:
+        address = bert_scoring.parse_server_address(args.address)
+    else:
+        address = bert_scoring.server_address() or bert_scoring.DEFAULT_SOCKET_PATH
+    batcher = MicroBatcher(args.max_batch, args.max_wait_ms / 1000)
+    batcher.start()
+    server = create_server(address, batcher)
+    print(f"BERTScore 評分伺服器已啟動: {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        if not isinstance(address, tuple) and os.path.exists(address):
+            os.unlink(address)
+        print(f"已處理 {batcher.requests} 筆請求，共 {batcher.batches} 批")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""增量執行使用的 promptfoo Python provider：回傳先前執行快取的模型輸出，不呼叫實際的 provider
+
+由執行佇列為輸入未變更的測試列自動產生配置（見 src/services/shard_service.py），config 包含:
+    outputs          快取輸出 JSON 的路徑，格式為 {測試列指紋: {組合: {"provider": ..., "response": ...}}}
+    provider_index   對應原本配置中第幾個 provider
+"""
+import hashlib
+import json
+from typing import Any, Dict
+
+ROW_COLUMN = "_promptlab_row"
+
+# 依路徑快取已載入的輸出檔，同一行程內的多次呼叫只需讀取一次
+_outputs: Dict[str, Dict[str, Any]] = {}
+
+
+def _combo_key(provider_index: int, rendered_prompt: str) -> str:
+    # 與 src/services/output_cache_service.py 的 combo_key 相同
+    return hashlib.sha256(f"{provider_index}\x1f{rendered_prompt}".encode("utf-8")).hexdigest()
+
+
+def _load(path: str) -> Dict[str, Any]:
+    if path not in _outputs:
+        with open(path, "r", encoding="utf-8") as f:
+            _outputs[path] = json.load(f)
+    return _outputs[path]
+
+
+def call_api(prompt: str, options: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    config = options.get("config") or {}
+    value = (context.get("vars") or {}).get(ROW_COLUMN)
+    if value is None:
+        return {"error": f"測試列缺少 {ROW_COLUMN} 欄位"}
+
+    row_key = str(value).partition(":")[2]
+    entry = _load(config["outputs"]).get(row_key, {}).get(_combo_key(config["provider_index"], prompt))
+    if entry is None:
+        return {"error": "找不到快取的模型輸出（prompt 或 provider 已變更）"}
+    response = dict(entry["response"])
+    response["cached"] = True
+    return response
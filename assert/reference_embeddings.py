@@ -0,0 +1,211 @@
+"""資料集參考答案（expected_answer）的 BERT 嵌入預先計算與查詢
+
+參考答案在每次執行都相同，預先以 BERTScore 使用的模型層計算 token 嵌入後，
+評分時只需編碼模型輸出，再以 BERTScore 的 greedy matching 計算 P/R/F1。
+
+儲存結構（每個資料集一個目錄，嵌入以 memmap 讀取）:
+    <root>/<模型>-L<層數>/<資料集內容雜湊>/embeddings.npy   所有 token 嵌入 (token 數, 維度) float32
+                                         /idf.npy          每個 token 的權重
+                                         /index.json       文字雜湊 -> [起始位置, token 數]
+
+用法: python assert/reference_embeddings.py data.csv [--column expected_answer] [--remove-input]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_ROOT = os.environ.get("BERT_SCORE_EMBEDDINGS_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results", "reference_embeddings"
+)
+DEFAULT_COLUMN = "expected_answer"
+BUILD_BATCH_SIZE = 64
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def model_key(scorer) -> str:
+    """嵌入所屬的模型、層數與推論後端，不同設定的嵌入不可混用"""
+    key = f"{scorer.model_type.replace('/', '--')}-L{scorer.num_layers}"
+    backend = getattr(scorer, "backend", "torch")
+    return key if backend == "torch" else f"{key}-{backend}"
+
+
+def _idf_dict(scorer):
+    # 與 BERTScorer.score(idf=False) 相同：[CLS] / [SEP] 權重為 0，其餘為 1
+    idf_dict = defaultdict(lambda: 1.0)
+    idf_dict[scorer._tokenizer.sep_token_id] = 0
+    idf_dict[scorer._tokenizer.cls_token_id] = 0
+    return idf_dict
+
+
+def encode(scorer, texts: List[str]):
+    """以 BERTScore 的方式編碼句子，回傳補齊後的 (嵌入, mask, idf)"""
+    from bert_score.utils import get_bert_embedding
+    return get_bert_embedding(texts, scorer._model, scorer._tokenizer, _idf_dict(scorer),
+                              device=scorer.device, all_layers=False)
+
+
+def score_with_references(scorer, outputs: List[str],
+                          references: List[Tuple[np.ndarray, np.ndarray]]) -> List[Tuple[float, float, float]]:
+    """只編碼模型輸出，搭配預先計算的參考答案嵌入計算 (precision, recall, f1)"""
+    import torch
+    from torch.nn.utils.rnn import pad_sequence
+    from bert_score.utils import greedy_cos_idf
+
+    with torch.no_grad():
+        hyp_embedding, hyp_masks, hyp_idf = encode(scorer, outputs)
+        ref_embeddings = [torch.from_numpy(np.array(embedding, dtype=np.float32)) for embedding, _ in references]
+        ref_idfs = [torch.from_numpy(np.array(idf, dtype=np.float32)) for _, idf in references]
+        lengths = torch.tensor([embedding.size(0) for embedding in ref_embeddings])
+        ref_masks = torch.arange(int(lengths.max())).expand(len(lengths), -1) < lengths.unsqueeze(1)
+
+        P, R, F = greedy_cos_idf(
+            pad_sequence(ref_embeddings, batch_first=True, padding_value=2.0).to(scorer.device),
+            ref_masks.to(scorer.device),
+            pad_sequence(ref_idfs, batch_first=True).to(scorer.device),
+            hyp_embedding, hyp_masks, hyp_idf, False
+        )
+        predictions = torch.stack((P, R, F), dim=-1).cpu()
+        if scorer.rescale_with_baseline:
+            predictions = (predictions - scorer.baseline_vals) / (1 - scorer.baseline_vals)
+    return [tuple(row) for row in predictions.tolist()]
+
+
+class ReferenceEmbeddingStore:
+    """查詢預先計算的參考答案嵌入，新增的資料集目錄會在下次查詢時載入"""
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        self._lock = threading.Lock()
+        # 模型 -> {文字雜湊: (資料集目錄, 起始位置, token 數)}
+        self._indexes: Dict[str, Dict[str, Tuple[str, int, int]]] = {}
+        self._loaded: Dict[str, set] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _refresh(self, key: str) -> Dict[str, Tuple[str, int, int]]:
+        index = self._indexes.setdefault(key, {})
+        loaded = self._loaded.setdefault(key, set())
+        model_dir = os.path.join(self.root, key)
+        if not os.path.isdir(model_dir):
+            return index
+        for name in os.listdir(model_dir):
+            # 以 . 開頭的是建立中的暫存目錄
+            if name in loaded or name.startswith("."):
+                continue
+            dataset_dir = os.path.join(model_dir, name)
+            try:
+                with open(os.path.join(dataset_dir, "index.json"), encoding="utf-8") as f:
+                    texts = json.load(f)["texts"]
+            except (OSError, ValueError, KeyError):
+                continue
+            for digest, (offset, length) in texts.items():
+                index.setdefault(digest, (dataset_dir, offset, length))
+            loaded.add(name)
+        return index
+
+    def get(self, key: str, text: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """回傳 (token 嵌入, token 權重)，未預先計算時回傳 None"""
+        with self._lock:
+            entry = self._refresh(key).get(text_hash(text))
+            if entry is None:
+                return None
+            dataset_dir, offset, length = entry
+            arrays = self._arrays.get(dataset_dir)
+            if arrays is None:
+                arrays = (np.load(os.path.join(dataset_dir, "embeddings.npy"), mmap_mode="r"),
+                          np.load(os.path.join(dataset_dir, "idf.npy"), mmap_mode="r"))
+                self._arrays[dataset_dir] = arrays
+        embeddings, idf = arrays
+        return embeddings[offset:offset + length], idf[offset:offset + length]
+
+    def contains(self, key: str, text: str) -> bool:
+        with self._lock:
+            return text_hash(text) in self._refresh(key)
+
+    def build(self, scorer, texts: List[str], dataset_id: str) -> int:
+        """計算資料集中尚未儲存的參考答案嵌入，回傳新增的句數"""
+        key = model_key(scorer)
+        model_dir = os.path.join(self.root, key)
+        if os.path.isdir(os.path.join(model_dir, dataset_id)):
+            return 0
+        texts = sorted({text for text in texts if text and not self.contains(key, text)}, key=len)
+        if not texts:
+            return 0
+
+        chunks, weights, index, offset = [], [], {}, 0
+        for start in range(0, len(texts), BUILD_BATCH_SIZE):
+            batch = texts[start:start + BUILD_BATCH_SIZE]
+            embeddings, masks, idf = encode(scorer, batch)
+            embeddings, masks, idf = embeddings.cpu().numpy(), masks.cpu().numpy(), idf.cpu().numpy()
+            for i, text in enumerate(batch):
+                length = int(masks[i].sum())
+                chunks.append(embeddings[i, :length].astype(np.float32))
+                weights.append(idf[i, :length].astype(np.float32))
+                index[text_hash(text)] = [offset, length]
+                offset += length
+
+        # 先寫入暫存目錄再改名，查詢端不會讀到寫到一半的資料
+        os.makedirs(model_dir, exist_ok=True)
+        temp_dir = os.path.join(model_dir, f".{dataset_id}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(temp_dir)
+        try:
+            np.save(os.path.join(temp_dir, "embeddings.npy"), np.concatenate(chunks))
+            np.save(os.path.join(temp_dir, "idf.npy"), np.concatenate(weights))
+            with open(os.path.join(temp_dir, "index.json"), "w", encoding="utf-8") as f:
+                json.dump({"model": key, "texts": index}, f)
+            os.rename(temp_dir, os.path.join(model_dir, dataset_id))
+        except OSError:
+            # 其他行程已建立相同資料集
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not os.path.isdir(os.path.join(model_dir, dataset_id)):
+                raise
+            return 0
+        return len(texts)
+
+
+def build_from_csv(csv_path: str, column: str = DEFAULT_COLUMN, store: Optional[ReferenceEmbeddingStore] = None,
+                   settings=None, backend: Optional[str] = None) -> int:
+    """讀取 CSV 的參考答案欄位並預先計算嵌入，資料集以檔案內容雜湊識別
+
+    backend 需與評分時的 BERT_SCORE_BACKEND 相同，嵌入才會以相同的 model_key 保存。
+    """
+    # 僅建立嵌入時才需要（bert_scoring 載入本模組時不可反向載入，避免重複初始化）
+    import bert_scoring
+    with open(csv_path, "rb") as f:
+        dataset_id = hashlib.sha1(f.read()).hexdigest()[:16]
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        texts = [row.get(column) or "" for row in csv.DictReader(f)]
+    settings = settings or (bert_scoring.DEFAULT_LANG, bert_scoring.DEFAULT_MODEL_TYPE, bert_scoring.DEFAULT_RESCALE)
+    scorer = bert_scoring.get_scorer(*settings, backend=backend or bert_scoring.BACKEND)
+    return (store or ReferenceEmbeddingStore()).build(scorer, texts, dataset_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="預先計算資料集參考答案的 BERT 嵌入")
+    parser.add_argument("csv_path")
+    parser.add_argument("--column", default=DEFAULT_COLUMN, help="參考答案欄位")
+    parser.add_argument("--remove-input", action="store_true", help="完成後刪除輸入檔（上傳暫存檔）")
+    parser.add_argument("--backend", default=None, help="推論後端（預設為 BERT_SCORE_BACKEND）")
+    args = parser.parse_args()
+
+    try:
+        added = build_from_csv(args.csv_path, args.column, backend=args.backend)
+        print(f"參考答案嵌入已更新: {args.csv_path}，新增 {added} 句")
+    finally:
+        if args.remove_input and os.path.exists(args.csv_path):
+            os.remove(args.csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""BERTScore 評分伺服器吞吐量測試
+
+比較逐筆在本行程計算（每次 score 一筆，模型已預先載入）與
+透過 assert/bert_server.py 微批次伺服器、由多個並行 client 送出請求時的每秒筆數。
+兩者皆使用不重複的測試資料，不會命中分數快取。
+舊版 assertion 每筆都重新建立模型，實際差距會比本測試更大。
+
+需要安裝 bert_score 並可下載模型。
+用法: python benchmarks/bench_bert_server.py [--rows 256] [--clients 16] [--max-batch 32] [--max-wait-ms 10]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assert'))
+
+import bert_scoring  # noqa: E402
+import bert_server  # noqa: E402
+
+
+def make_pairs(count, seed=0):
+    """產生長度不一、互不重複的 (output, reference) 中文配對"""
+    rng = random.Random(seed)
+    words = ['模型', '回答', '問題', '內容', '正確', '完整', '資料', '評估', '結果', '說明', '系統', '使用者']
+    pairs = []
+    for i in range(count):
+        length = rng.choice((8, 16, 32, 64, 128))
+        output = f'{i} ' + ''.join(rng.choice(words) for _ in range(length))
+        reference = f'{i} ' + ''.join(rng.choice(words) for _ in range(length))
+        pairs.append((output, reference))
+    return pairs
+
+
+def measure_in_process(pairs, settings):
+    scorer = bert_scoring.get_scorer(*settings)
+    start = time.perf_counter()
+    for output, reference in pairs:
+        scorer.score([output], [reference])
+    return time.perf_counter() - start
+
+
+def measure_server(pairs, settings, clients, max_batch, max_wait):
+    address = os.path.join(tempfile.mkdtemp(), 'bench-bert.sock') if hasattr(bert_server.socket, 'AF_UNIX') \
+        else ('127.0.0.1', 0)
+    batcher = bert_server.MicroBatcher(max_batch, max_wait)
+    batcher.start()
+    server = bert_server.create_server(address, batcher)
+    if isinstance(address, tuple):
+        address = server.server_address
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    bert_scoring.SERVER = address if isinstance(address, str) else f'{address[0]}:{address[1]}'
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(lambda pair: bert_scoring._score_remote(*pair, settings), pairs))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.stop()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+
+    if any(result is None for result in results):
+        raise RuntimeError('部分請求未由伺服器完成')
+    return elapsed, batcher.requests / max(batcher.batches, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BERTScore 評分伺服器吞吐量測試')
+    parser.add_argument('--rows', type=int, default=256)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    settings = (bert_scoring.DEFAULT_LANG, bert_scoring.DEFAULT_MODEL_TYPE, bert_scoring.DEFAULT_RESCALE)
+    print('載入 BERTScore 模型...')
+    bert_scoring.warmup(*settings)
+
+    in_process = measure_in_process(make_pairs(args.rows, seed=1), settings)
+    print(f"{'in-process (per row)':<28} {args.rows / in_process:>10,.1f} rows/sec  ({in_process:.2f} s)")
+
+    served, mean_batch = measure_server(make_pairs(args.rows, seed=2), settings,
+                                        args.clients, args.max_batch, args.max_wait_ms / 1000)
+    print(f"{'server (micro-batched)':<28} {args.rows / served:>10,.1f} rows/sec  ({served:.2f} s, "
+          f"平均批次 {mean_batch:.1f} 筆, {args.clients} clients)")
+    print(f"伺服器相對逐筆加速: {in_process / served:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""eval_results 資料列解碼效能測試
+
+比較舊版逐列解碼（重複 json.loads、逐列 print、逐行 re.search）與
+src/utils/row_decoder.py 在 json / orjson 後端下的每秒處理列數。
+舊版的 print 輸出導向記憶體緩衝區，實際在終端機輸出日誌時舊版會更慢。
+
+用法: python benchmarks/bench_row_decoder.py [--rows 20000] [--repeat 3]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import row_decoder  # noqa: E402
+
+
+def make_rows(count, seed=0):
+    """產生與 promptfoo eval_results 結構相近的測試資料"""
+    rng = random.Random(seed)
+    asserts = [
+        {'type': 'python', 'value': 'file://../../assert/bert_scoring.py:get_assert_bert_f1'},
+        {'type': 'python', 'value': 'file://../../assert/bert_scoring.py:get_assert_bert_recall'},
+        {'type': 'g-eval', 'value': ['回答是否正確', '回答是否完整']},
+    ]
+    rows = []
+    for i in range(count):
+        success = rng.random() < 0.7
+        score = rng.random()
+        components = [
+            {'pass': success, 'score': score, 'reason': f'BERTScore F1: {score:.4f}', 'assertion': asserts[0]},
+            {'pass': success, 'score': score, 'reason': f'BERTScore Recall: {score:.4f}', 'assertion': asserts[1]},
+            {'pass': True, 'score': 0.9, 'reason': '評估結果良好', 'assertion': asserts[2]},
+        ]
+        grading = {'pass': success, 'score': score, 'reason': 'ok', 'componentResults': components}
+        rows.append({
+            'test_case': json.dumps({'vars': {'question': f'問題 {i} ' * 20, 'expected_answer': '答案 ' * 50},
+                                     'assert': asserts}, ensure_ascii=False),
+            'prompt': json.dumps({'raw': f'問題 {i}', 'label': 'prompt'}, ensure_ascii=False),
+            'response': json.dumps({'output': '模型輸出內容 ' * 80}, ensure_ascii=False),
+            'grading_result': json.dumps(grading, ensure_ascii=False) if i % 4 else None,
+            'error': None if success else f'BERTScore Precision: 0.31\nBERTScore Recall: 0.42\nBERTScore F1: {score:.4f}',
+            'success': int(success),
+            'score': score,
+            'latency_ms': rng.randint(100, 3000),
+            'metadata': json.dumps({'pluginId': 'harmful', 'strategyId': 'basic'}),
+        })
+    return rows
+
+
+def legacy_decode(row):
+    """舊版解碼流程的精簡重現（保留其主要成本：重複解析、逐列輸出日誌、逐行正則）"""
+    try:
+        variables = json.loads(row['test_case']).get('vars', {})
+    except Exception:
+        variables = {'prompt': str(row['prompt'])}
+    try:
+        output_text = json.loads(row['response']).get('output', '')
+    except Exception:
+        output_text = str(row['response'])
+
+    assertions = []
+    grading_info = {}
+    if row.get('grading_result') is not None:
+        grading_result_str = str(row['grading_result'])
+        print(f"原始 grading_result: {grading_result_str[:200]}...")
+        grading_result = json.loads(grading_result_str)
+        grading_info = {'pass': bool(grading_result.get('pass')), 'score': float(grading_result.get('score', 0))}
+        components = grading_result.get('componentResults', [])
+        print(f"找到 {len(components)} 個 componentResults")
+        for i, component in enumerate(components):
+            print(f"Component {i}: type={component['assertion']['type']}, pass={component.get('pass')}")
+            assertions.append({'pass': bool(component.get('pass')), 'score': float(component.get('score', 0)),
+                               'type': component['assertion']['type'], 'reason': component.get('reason', '')})
+    if not grading_info or not assertions:
+        test_case = json.loads(row['test_case'])
+        error_text = str(row['error']) if row['error'] is not None else ''
+        bert_scores = {}
+        for line in error_text.split('\n'):
+            if 'BERTScore' in line:
+                if 'Precision' in line:
+                    match = re.search(r'BERTScore Precision: ([\d.]+)', line)
+                    if match:
+                        bert_scores['precision'] = float(match.group(1))
+                elif 'Recall' in line:
+                    match = re.search(r'BERTScore Recall: ([\d.]+)', line)
+                    if match:
+                        bert_scores['recall'] = float(match.group(1))
+                elif 'F1' in line:
+                    match = re.search(r'BERTScore F1: ([\d.]+)', line)
+                    if match:
+                        bert_scores['f1'] = float(match.group(1))
+        for assertion in test_case.get('assert', []):
+            assertions.append({'type': assertion.get('type'), 'score': bert_scores.get('f1', 0.47)})
+    metadata = json.loads(row['metadata'])
+    return {'variables': variables, 'output': output_text, 'assertions': assertions, 'metadata': metadata}
+
+
+def measure(label, func, rows, repeat):
+    """回傳最佳一次的每秒列數"""
+    best = None
+    for _ in range(repeat):
+        sink = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sink):
+            for row in rows:
+                func(row)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = len(rows) / best
+    print(f"{label:<28} {rate:>12,.0f} rows/sec  ({best * 1000:.1f} ms)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='eval_results 資料列解碼效能測試')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"測試資料: {len(rows)} 列")
+
+    baseline = measure('legacy (json + print)', legacy_decode, rows, args.repeat)
+
+    row_decoder.use_json_backend('json')
+    measure('row_decoder (json)', lambda row: row_decoder.decode_detail_row(row, True), rows, args.repeat)
+
+    if row_decoder.use_json_backend('orjson') == 'orjson':
+        rate = measure('row_decoder (orjson)', lambda row: row_decoder.decode_detail_row(row, True), rows, args.repeat)
+        print(f"orjson 相對舊版加速: {rate / baseline:.2f}x")
+    else:
+        print("未安裝 orjson，略過 orjson 後端")
+
+
+if __name__ == '__main__':
+    main()
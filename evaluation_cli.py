@@ -0,0 +1,122 @@
+"""LLM評測平台命令列工具
+
+用法:
+    python evaluation_cli.py export EVAL_ID [EVAL_ID ...] -o exports/ --format parquet
+    python evaluation_cli.py regression-check --baseline EVAL_ID --candidate EVAL_ID
+"""
+import argparse
+import json
+import os
+import sys
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.services.evaluation_service import EvaluationService
+
+
+def run_export(service, args):
+    """匯出評估：單一檔案（--single）或依 eval_id 分割的資料集"""
+    try:
+        service.export_service.check_format(args.format)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.single:
+        result, status_code = service.export_evaluations(args.eval_ids, args.format)
+        if status_code != 200:
+            print(f"❌ {result['error']}")
+            return 1
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'wb') as f:
+            for chunk in result['stream']:
+                f.write(chunk)
+        print(f"✅ 已匯出 {len(args.eval_ids)} 個評估到 {args.output}")
+        return 0
+
+    try:
+        written = service.export_service.write_dataset(args.eval_ids, args.output, args.format)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    for eval_id, path, row_count in written:
+        print(f"✅ {eval_id}: {row_count} 筆 -> {path}")
+    print(f"資料集已寫入 {args.output}（hive 分割，分割欄位 eval_id）")
+    return 0
+
+
+def run_regression_check(service, args):
+    """退步檢定：PASS 回傳 0，FAIL 回傳 1，無法判定或發生錯誤回傳 2"""
+    params = {
+        'alpha': args.alpha,
+        'max_pass_rate_drop': args.max_pass_rate_drop,
+        'max_score_drop': args.max_score_drop,
+        'resamples': args.resamples
+    }
+    result, status_code = service.check_regression(args.baseline, args.candidate, params)
+    if status_code != 200:
+        print(f"❌ {result['error']}")
+        return 2
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        pass_rate = result.get('pass_rate', {})
+        score = result.get('score', {})
+        print(f"基準: {result['baseline']}  候選: {result['candidate']}  配對: {result['matched']} 筆")
+        if pass_rate:
+            print(f"通過率: {pass_rate['baseline']}% -> {pass_rate['candidate']}% "
+                  f"({pass_rate['delta']:+.2f} pp, 退步 {pass_rate['regressions']} / 進步 {pass_rate['improvements']}, "
+                  f"McNemar p={pass_rate['p_value']:.4g})")
+        if score:
+            print(f"平均分數差異: {score['mean_delta']:+.4f} "
+                  f"[{score['ci_low']:+.4f}, {score['ci_high']:+.4f}], Cohen's dz={score['effect_size']}")
+        for reason in result['reasons']:
+            print(f"  - {reason}")
+        icon = {'PASS': '✅', 'FAIL': '❌'}.get(result['verdict'], '⚠️')
+        print(f"{icon} 判定: {result['verdict']}")
+
+    return {'PASS': 0, 'FAIL': 1}.get(result['verdict'], 2)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='LLM評測平台命令列工具')
+    parser.add_argument('--db', help='promptfoo 資料庫路徑（預設與平台相同）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='匯出評估結果為 Parquet / Arrow IPC / CSV')
+    export_parser.add_argument('eval_ids', nargs='+', help='評估 ID（可指定多個）')
+    export_parser.add_argument('-o', '--output', required=True,
+                               help='輸出目錄（資料集）或檔案路徑（搭配 --single）')
+    export_parser.add_argument('--format', choices=('parquet', 'arrow', 'csv'), default='parquet')
+    export_parser.add_argument('--single', action='store_true', help='輸出為含 eval_id 欄位的單一檔案')
+    export_parser.add_argument('--chunk-size', type=int, default=None, help='每次讀取的筆數')
+    export_parser.set_defaults(handler=run_export)
+
+    regression_parser = subparsers.add_parser('regression-check', help='檢定候選評估相對基準評估是否退步')
+    regression_parser.add_argument('--baseline', required=True, help='基準評估 ID')
+    regression_parser.add_argument('--candidate', required=True, help='候選評估 ID')
+    regression_parser.add_argument('--alpha', type=float, default=0.05, help='顯著水準')
+    regression_parser.add_argument('--max-pass-rate-drop', type=float, default=1.0,
+                                   help='可容忍的通過率下降（百分點）')
+    regression_parser.add_argument('--max-score-drop', type=float, default=0.02, help='可容忍的平均分數下降')
+    regression_parser.add_argument('--resamples', type=int, default=2000, help='bootstrap 抽樣次數')
+    regression_parser.add_argument('--json', action='store_true', help='以 JSON 輸出完整結果')
+    regression_parser.set_defaults(handler=run_regression_check)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = EvaluationService(db_path=args.db)
+    if getattr(args, 'chunk_size', None):
+        service.export_service.chunk_size = args.chunk_size
+    return args.handler(service, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,7 +9,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import modules
 from src.routes.main_routes import register_main_routes
-from src.routes.api_routes import register_api_routes
+from src.routes.api_routes import register_api_routes, start_background_services
 from src.routes.static_routes import register_static_routes
 from src.utils.directory_utils import ensure_directories
 
@@ -26,6 +26,17 @@ register_api_routes(app)
 register_static_routes(app)
 
 
+def is_serving_process(debug):
+    """debug 模式的 reloader 會以父行程監看檔案、子行程服務請求，背景 worker 只在子行程啟動"""
+    return not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+
+if __name__ != '__main__':
+    # 由 WSGI 伺服器或 flask run 載入
+    if is_serving_process(app.debug):
+        start_background_services(app)
+
+
 if __name__ == '__main__':
     print("🚀 啟動LLM評測平台...")
     print("📊 平台功能:")
@@ -39,4 +50,7 @@ if __name__ == '__main__':
     print("   - AttackGen: http://localhost:5500/attackgen")
     
     
-    app.run(debug=True, host='0.0.0.0', port=5500)
+    debug = True
+    if is_serving_process(debug):
+        start_background_services(app)
+    app.run(debug=debug, host='0.0.0.0', port=5500)
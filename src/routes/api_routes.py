@@ -1,24 +1,38 @@
 """API路由"""
 import time
-from flask import jsonify, request
+from flask import jsonify, request, Response, stream_with_context
 from src.services.evaluation_service import EvaluationService
 from src.services.config_service import ConfigService
 from src.services.api_test_service import ApiTestService
 from src.services.validation_service import ValidationService
 from src.services.csv_service import CsvService
 from src.services.execution_service import ExecutionService
+from src.services.job_service import JobService
+
+
+def start_background_services(app):
+    """啟動背景索引與執行佇列的 worker，只應在實際服務請求的行程中呼叫一次"""
+    evaluation_service, job_service = app.extensions['promptlab_background']
+    evaluation_service.start_background_indexing()
+    job_service.start()
 
 
 def register_api_routes(app):
     """註冊API路由"""
     
     # 初始化服務
-    evaluation_service = EvaluationService()
+    evaluation_service = EvaluationService(
+        summary_index_path='results/summary_index.db',
+        search_index_path='results/search_index.db'
+    )
     config_service = ConfigService()
     api_test_service = ApiTestService()
     validation_service = ValidationService()
     csv_service = CsvService()
     execution_service = ExecutionService()
+    job_service = JobService(execution_service, db_path='results/jobs.db', logs_dir='results/jobs')
+    # 背景索引與執行佇列由 start_background_services 在實際服務請求的行程中啟動
+    app.extensions['promptlab_background'] = (evaluation_service, job_service)
     
     @app.route('/api/health', methods=['GET'])
     def health_check():
@@ -35,10 +49,118 @@ def register_api_routes(app):
         result, status_code = evaluation_service.get_evaluation_results()
         return jsonify(result), status_code
 
+    @app.route('/api/evaluation-trends', methods=['GET'])
+    def get_evaluation_trends():
+        """獲取各設定描述在各時間區間的通過率、分數與延遲趨勢"""
+        result, status_code = evaluation_service.get_evaluation_trends(request.args.to_dict())
+        return jsonify(result), status_code
+
     @app.route('/api/evaluation-results/<eval_id>', methods=['GET'])
     def get_evaluation_detail(eval_id):
-        """獲取特定評估的詳細結果"""
-        result, status_code = evaluation_service.get_evaluation_detail(eval_id)
+        """獲取特定評估的詳細結果（支援 cursor/limit/view 分頁與 status、分數、assertion、plugin、strategy 篩選）"""
+        result, status_code = evaluation_service.get_evaluation_detail(eval_id, request.args.to_dict())
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-results/<eval_id>/rows/<int:row_id>', methods=['GET'])
+    def get_evaluation_row(eval_id, row_id):
+        """獲取單筆評估結果的完整內容"""
+        result, status_code = evaluation_service.get_evaluation_row(eval_id, row_id)
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-results/<eval_id>/statistics', methods=['GET'])
+    def get_evaluation_statistics(eval_id):
+        """獲取評估的分數、延遲與 assertion 分佈統計"""
+        result, status_code = evaluation_service.get_evaluation_statistics(eval_id, request.args.to_dict())
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-results/<eval_id>/stream', methods=['GET'])
+    def stream_evaluation_detail(eval_id):
+        """以 NDJSON 或逐步編碼 JSON 串流輸出評估詳細結果"""
+        output_format = request.args.get('format', 'ndjson')
+        result, status_code = evaluation_service.stream_evaluation_detail(
+            eval_id, request.args.to_dict(), output_format
+        )
+        if status_code != 200:
+            return jsonify(result), status_code
+        
+        mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+        return Response(stream_with_context(result), mimetype=mimetype)
+
+    @app.route('/api/evaluation-compare', methods=['GET'])
+    def get_evaluation_compare():
+        """比較兩個評估的逐列分數與狀態差異"""
+        params = request.args.to_dict()
+        result, status_code = evaluation_service.get_evaluation_compare(
+            params.pop('base', None), params.pop('head', None), params
+        )
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-regression', methods=['GET'])
+    def check_evaluation_regression():
+        """檢定候選評估相對基準評估是否退步"""
+        params = request.args.to_dict()
+        result, status_code = evaluation_service.check_regression(
+            params.pop('baseline', None), params.pop('candidate', None), params
+        )
+        return jsonify(result), status_code
+
+    @app.route('/api/search', methods=['GET'])
+    def search_evaluations():
+        """在評估輸出與測試變數中進行全文檢索"""
+        result, status_code = evaluation_service.search_evaluations(request.args.to_dict())
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-export', methods=['GET'])
+    def export_evaluations():
+        """匯出評估結果（eval_id 可重複指定多個，format 為 parquet / arrow / csv）"""
+        eval_ids = request.args.getlist('eval_id')
+        for value in request.args.getlist('eval_ids'):
+            eval_ids.extend(eval_id.strip() for eval_id in value.split(','))
+        result, status_code = evaluation_service.export_evaluations(
+            eval_ids, request.args.get('format', 'parquet')
+        )
+        if status_code != 200:
+            return jsonify(result), status_code
+        return Response(
+            stream_with_context(result['stream']),
+            mimetype=result['mimetype'],
+            headers={'Content-Disposition': f"attachment; filename=\"{result['filename']}\""}
+        )
+
+    @app.route('/api/evaluation-db/pool-stats', methods=['GET'])
+    def get_evaluation_db_pool_stats():
+        """獲取 promptfoo 資料庫連線池統計資訊"""
+        result, status_code = evaluation_service.get_pool_stats()
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-db/cache-stats', methods=['GET'])
+    def get_evaluation_cache_stats():
+        """獲取評估結果快取統計資訊"""
+        result, status_code = evaluation_service.get_cache_stats()
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-db/summary-index', methods=['GET'])
+    def get_summary_index_stats():
+        """獲取評估摘要索引狀態"""
+        result, status_code = evaluation_service.get_summary_index_stats()
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-db/search-index', methods=['GET'])
+    def get_search_index_stats():
+        """獲取全文檢索索引狀態"""
+        result, status_code = evaluation_service.get_search_index_stats()
+        return jsonify(result), status_code
+
+    @app.route('/api/redprobe/<eval_id>/matrix', methods=['GET'])
+    def get_redteam_matrix(eval_id):
+        """獲取 RedProbe 熱圖用的 plugin × strategy 矩陣"""
+        result, status_code = evaluation_service.get_redteam_matrix(eval_id)
+        return jsonify(result), status_code
+
+    @app.route('/api/evaluation-db/redteam-index', methods=['POST'])
+    def create_redteam_index():
+        """在 promptfoo 資料庫建立 redteam 表達式索引"""
+        result, status_code = evaluation_service.create_redteam_index()
         return jsonify(result), status_code
 
     @app.route('/api/configs', methods=['GET'])
@@ -89,8 +211,49 @@ def register_api_routes(app):
 
     @app.route('/api/configs/<config_id>/run', methods=['POST'])
     def run_config(config_id):
-        """執行專案"""
-        result, status_code = execution_service.run_config(config_id)
+        """執行專案（排入執行佇列，立即回傳工作 ID）"""
+        options = request.get_json(silent=True) or {}
+        if not isinstance(options, dict):
+            return jsonify({'error': '請求內容必須是 JSON 物件'}), 400
+        # 依使用者公平排隊：未指定時以 X-PromptLab-User 標頭或來源位址區分使用者
+        if not options.get('user'):
+            options['user'] = request.headers.get('X-PromptLab-User') or request.remote_addr
+        result, status_code = job_service.submit(config_id, options)
+        return jsonify(result), status_code
+
+    @app.route('/api/jobs', methods=['GET'])
+    def list_jobs():
+        """列出執行工作"""
+        result, status_code = job_service.list_jobs(request.args.to_dict())
+        return jsonify(result), status_code
+
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """查詢執行工作狀態與輸出"""
+        result, status_code = job_service.get_job(job_id)
+        return jsonify(result), status_code
+
+    @app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+    def stream_job(job_id):
+        """以 Server-Sent Events 即時串流執行輸出與進度"""
+        after_seq = request.headers.get('Last-Event-ID') or request.args.get('since') or 0
+        try:
+            after_seq = int(after_seq)
+        except ValueError:
+            return jsonify({'error': 'since 必須是整數'}), 400
+        result, status_code = job_service.stream_job(job_id, after_seq)
+        if status_code != 200:
+            return jsonify(result), status_code
+        return Response(
+            stream_with_context(result),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    @app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id):
+        """取消執行工作"""
+        result, status_code = job_service.cancel_job(job_id)
         return jsonify(result), status_code
 
     @app.route('/api/assert-templates', methods=['GET'])
@@ -0,0 +1,147 @@
+"""跨評估比較服務"""
+import hashlib
+import json
+
+from src.utils.row_decoder import loads_or_none
+
+
+def vars_hash(test_case):
+    """計算 test_case.vars 的穩定雜湊（鍵排序後的 JSON），無法解析時回傳 None"""
+    test_case = loads_or_none(test_case)
+    if not isinstance(test_case, dict):
+        return None
+    canonical = json.dumps(
+        test_case.get('vars', {}), sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def classify_pair(base_success, head_success):
+    """判斷單筆配對的狀態變化"""
+    if base_success and not head_success:
+        return 'regression'
+    if head_success and not base_success:
+        return 'improvement'
+    return 'unchanged'
+
+
+class CompareService:
+    """在 SQLite 暫存表中以 test_case.vars 雜湊配對兩個評估的結果
+
+    配對鍵為 (vars 雜湊, prompt_idx, 同鍵出現順序)，同一組變數在評估中重複出現時依 rowid 順序一對一配對。
+    """
+
+    # 先計算每列的 vars 雜湊，再另建一張表編上同鍵出現順序；
+    # 分兩步是為了避免子查詢被展開後 vars_hash 對每列重複執行
+    KEY_TABLE_SQL = """
+        CREATE TEMP TABLE {table}_keys AS
+        SELECT rowid AS row_id, vars_hash(test_case) AS vars_key, prompt_idx, success, score
+        FROM eval_results
+        WHERE eval_id = ?
+    """
+    TEMP_TABLE_SQL = """
+        CREATE TEMP TABLE {table} AS
+        SELECT row_id, vars_key, prompt_idx,
+               ROW_NUMBER() OVER (PARTITION BY vars_key, prompt_idx ORDER BY row_id) AS n,
+               success, score
+        FROM temp.{table}_keys
+        WHERE vars_key IS NOT NULL
+    """
+
+    PAIR_SQL = """
+        SELECT b.row_id, h.row_id, b.success, h.success, b.score, h.score
+        FROM temp.compare_base b
+        JOIN temp.compare_head h
+          ON h.vars_key = b.vars_key AND h.prompt_idx IS b.prompt_idx AND h.n = b.n
+        ORDER BY b.row_id
+    """
+
+    def _build_tables(self, conn, base_id, head_id):
+        """建立兩個評估的暫存表，並在 head 表上建立配對鍵索引"""
+        for table, eval_id in (('compare_base', base_id), ('compare_head', head_id)):
+            conn.execute(f"DROP TABLE IF EXISTS temp.{table}_keys")
+            conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+            conn.execute(self.KEY_TABLE_SQL.format(table=table), (eval_id,))
+            conn.execute(self.TEMP_TABLE_SQL.format(table=table))
+            conn.execute(f"DROP TABLE temp.{table}_keys")
+        conn.execute("CREATE INDEX temp.compare_head_key ON compare_head (vars_key, prompt_idx, n)")
+
+    def _drop_tables(self, conn):
+        """刪除暫存表"""
+        for table in ('compare_base', 'compare_head'):
+            conn.execute(f"DROP TABLE IF EXISTS temp.{table}_keys")
+            conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+
+    def compare(self, conn, base_id, head_id):
+        """比較兩個評估，回傳 (summary, pairs)
+
+        pairs 依 base rowid 排序，每筆為
+        (base_row_id, head_row_id, base_success, head_success, base_score, head_score)。
+        連線可為 mode=ro 的唯讀連線；暫存表寫在 temp schema，期間會暫時關閉 query_only。
+        """
+        conn.create_function('vars_hash', 1, vars_hash, deterministic=True)
+        query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+        if query_only:
+            conn.execute("PRAGMA query_only = OFF")
+        try:
+            self._build_tables(conn, base_id, head_id)
+            pairs = conn.execute(self.PAIR_SQL).fetchall()
+            base_total = conn.execute("SELECT COUNT(*) FROM eval_results WHERE eval_id = ?",
+                                      (base_id,)).fetchone()[0]
+            head_total = conn.execute("SELECT COUNT(*) FROM eval_results WHERE eval_id = ?",
+                                      (head_id,)).fetchone()[0]
+        finally:
+            try:
+                self._drop_tables(conn)
+            finally:
+                if query_only:
+                    conn.execute("PRAGMA query_only = ON")
+
+        return self._summarize(pairs, base_total, head_total), pairs
+
+    def _summarize(self, pairs, base_total, head_total):
+        """計算配對結果的整體統計"""
+        regressions = improvements = unchanged_pass = unchanged_fail = 0
+        score_up = score_down = 0
+        delta_sum = 0.0
+        base_passed = head_passed = 0
+
+        for _, _, base_success, head_success, base_score, head_score in pairs:
+            base_success = bool(base_success)
+            head_success = bool(head_success)
+            base_passed += base_success
+            head_passed += head_success
+            change = classify_pair(base_success, head_success)
+            if change == 'regression':
+                regressions += 1
+            elif change == 'improvement':
+                improvements += 1
+            elif base_success:
+                unchanged_pass += 1
+            else:
+                unchanged_fail += 1
+
+            delta = (head_score or 0.0) - (base_score or 0.0)
+            delta_sum += delta
+            if delta > 0:
+                score_up += 1
+            elif delta < 0:
+                score_down += 1
+
+        matched = len(pairs)
+        return {
+            'base_total': base_total,
+            'head_total': head_total,
+            'matched': matched,
+            'base_only': base_total - matched,
+            'head_only': head_total - matched,
+            'regressions': regressions,
+            'improvements': improvements,
+            'unchanged_pass': unchanged_pass,
+            'unchanged_fail': unchanged_fail,
+            'score_up': score_up,
+            'score_down': score_down,
+            'mean_score_delta': round(delta_sum / matched, 6) if matched else 0.0,
+            'base_pass_rate': f"{(base_passed / matched * 100):.2f}%" if matched else "0%",
+            'head_pass_rate': f"{(head_passed / matched * 100):.2f}%" if matched else "0%"
+        }
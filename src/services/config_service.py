@@ -6,6 +6,7 @@ import re
 import base64
 import shutil
 from pathlib import Path
+from src.services.reference_embedding_service import ReferenceEmbeddingService
 
 
 class ConfigService:
@@ -13,6 +14,7 @@ class ConfigService:
     
     def __init__(self, configs_dir='configs'):
         self.configs_dir = Path(configs_dir)
+        self.reference_embedding_service = ReferenceEmbeddingService()
     
     def get_configs(self):
         """獲取所有配置"""
@@ -166,6 +168,9 @@ class ConfigService:
                     with open(file_path, 'wb') as f:
                         f.write(file_content)
                     print(f"上傳檔案已保存: {file_path}")
+                    if file_path.suffix.lower() == '.csv':
+                        # 預先計算參考答案嵌入，執行評測時只需編碼模型輸出
+                        self.reference_embedding_service.precompute_file(file_path)
                 
                 print(f"配置已保存: {config_file_path}")
                 
@@ -214,6 +219,8 @@ class ConfigService:
                     with open(file_path, 'wb') as f:
                         f.write(file_content)
                     print(f"上傳檔案已更新: {file_path}")
+                    if file_path.suffix.lower() == '.csv':
+                        self.reference_embedding_service.precompute_file(file_path)
                 
                 return {
                     'id': config_id,
@@ -1,10 +1,14 @@
 """CSV檔案處理服務"""
 import pandas as pd
+from src.services.reference_embedding_service import ReferenceEmbeddingService
 
 
 class CsvService:
     """CSV檔案處理相關服務"""
     
+    def __init__(self):
+        self.reference_embedding_service = ReferenceEmbeddingService()
+    
     def upload_csv(self, file):
         """處理CSV檔案上傳並返回欄位信息"""
         try:
@@ -28,11 +32,17 @@ class CsvService:
             # 獲取欄位名稱
             headers = df.columns.tolist()
             
+            # 含參考答案欄位時在背景預先計算 BERT 嵌入
+            embeddings_started = False
+            if ReferenceEmbeddingService.COLUMN in headers:
+                embeddings_started = self.reference_embedding_service.precompute_content(csv_content)
+            
             # 返回欄位信息
             return {
                 'success': True,
                 'headers': headers,
                 'row_count': len(df),
+                'reference_embeddings': embeddings_started,
                 'message': f'成功讀取CSV檔案，包含 {len(df)} 行數據'
             }, 200
             
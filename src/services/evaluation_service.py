@@ -1,17 +1,78 @@
 """評估結果服務"""
 import os
+import bisect
 import sqlite3
-import pandas as pd
 import json
-import re
+import math
 import urllib.parse
+from datetime import datetime
+from src.services.summary_service import SummaryService
+from src.services.summary_index_service import SummaryIndexService
+from src.services.search_index_service import SearchIndexService
+from src.services.redteam_service import RedteamService
+from src.services.compare_service import CompareService, classify_pair
+from src.services.export_service import ExportService
+from src.services.statistics_service import StatisticsService
+from src.services.regression_service import RegressionService
+from src.utils.sqlite_pool import ReadOnlyConnectionPool
+from src.utils.result_cache import ResultCache
+from src.utils.row_decoder import decode_detail_row, loads_or_none, notna
 
 
 class EvaluationService:
     """評估結果相關服務"""
     
-    def __init__(self, db_path=None):
+    # 詳細結果分頁的預設與最大筆數
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    # 輕量列表中輸出與變數的預設截斷字數
+    PREVIEW_CHARS = 200
+    # 輕量列表只投影列表需要的欄位，assertion 只保留 type / pass / score
+    LIGHT_SELECT = """
+        SELECT rowid AS row_id,
+               success,
+               score,
+               latency_ms,
+               substr(CASE WHEN json_valid(response) THEN json_extract(response, '$.output') ELSE response END, 1, ?) AS output_preview,
+               length(CASE WHEN json_valid(response) THEN json_extract(response, '$.output') ELSE response END) AS output_length,
+               CASE WHEN json_valid(test_case) THEN json_extract(test_case, '$.vars') END AS vars_json,
+               CASE WHEN success = 0 THEN substr(error, 1, ?) END AS error_preview,
+               (SELECT json_group_array(json_object(
+                           'type', json_extract(c.value, '$.assertion.type'),
+                           'pass', json_extract(c.value, '$.pass'),
+                           'score', json_extract(c.value, '$.score')))
+                FROM json_each(CASE WHEN json_valid(grading_result) THEN grading_result END, '$.componentResults') c
+               ) AS assertions_json,
+               CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.pluginId') END AS plugin_id,
+               CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.strategyId') END AS strategy_id
+        FROM eval_results"""
+    # 串流輸出時每批讀取的筆數
+    STREAM_BATCH_SIZE = 500
+    # 比較結果可篩選的狀態變化（changed 為狀態或分數任一有變化）
+    COMPARE_CHANGES = ('regression', 'improvement', 'unchanged', 'changed')
+    # 評估最後一筆結果超過此秒數即視為已完成，其詳細結果快取不再檢查變更
+    IMMUTABLE_AFTER_SECONDS = 600
+    
+    def __init__(self, db_path=None, pool_options=None, cache_max_bytes=256 * 1024 * 1024,
+                 summary_index_path=None, search_index_path=None):
         self.db_path = db_path or r'C:\Users\stevenwu\.promptfoo\promptfoo.db'
+        # pool_options 可設定 mmap_size、cache_size、query_only、busy_timeout、max_connections
+        self.pool = ReadOnlyConnectionPool(self.db_path, **(pool_options or {}))
+        self.summary_service = SummaryService()
+        self.redteam_service = RedteamService()
+        self.compare_service = CompareService()
+        self.export_service = ExportService(self.pool)
+        self.statistics_service = StatisticsService()
+        self.regression_service = RegressionService()
+        self.result_cache = ResultCache(cache_max_bytes)
+        # 設定 summary_index_path 時，列表 API 改為讀取增量維護的 sidecar 摘要索引
+        self.summary_index = (
+            SummaryIndexService(self.db_path, summary_index_path) if summary_index_path else None
+        )
+        # 設定 search_index_path 時啟用 FTS5 全文檢索（/api/search）
+        self.search_index = (
+            SearchIndexService(self.db_path, search_index_path) if search_index_path else None
+        )
     
     def get_evaluation_results(self):
         """獲取評估結果摘要（直接從資料庫讀取）"""
@@ -19,73 +80,25 @@ class EvaluationService:
             if not os.path.exists(self.db_path):
                 return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            conn = sqlite3.connect(self.db_path)
-            
-            # 讀取 evals 表格資料
-            evals_df = pd.read_sql_query("SELECT * FROM evals", conn)
-            
-            # 讀取 eval_results 表格資料以計算統計指標
-            eval_results_df = pd.read_sql_query("SELECT * FROM eval_results", conn)
-            
-            conn.close()
+            cache_key = ('summary', 'all')
+            with self.pool.connection() as conn:
+                signal = self._summary_signal(conn)
+                cached = self.result_cache.get(cache_key, signal)
+                if cached is not None:
+                    return cached, 200
+                
+                eval_count, results = self._load_summaries(conn)
             
-            print(f"從資料庫讀取到 {len(evals_df)} 個評估記錄")
-            print(f"從資料庫讀取到 {len(eval_results_df)} 個評估結果記錄")
+            print(f"從資料庫讀取到 {eval_count} 個評估記錄")
             
-            if len(evals_df) == 0:
+            if eval_count == 0:
                 return {'error': '資料庫中沒有評估資料'}, 404
             
-            # 轉換資料格式
-            results = []
-            
-            for _, row in evals_df.iterrows():
-                eval_id = row['id']
-                print(f"處理評估: {eval_id}")
-                
-                # 計算該 eval_id 的統計指標
-                eval_data = eval_results_df[eval_results_df['eval_id'] == eval_id]
-                
-                if len(eval_data) == 0:
-                    print(f"跳過評估 {eval_id}，因為沒有對應的評估結果資料")
-                    continue
-                
-                # 計算統計指標
-                dataset_count = len(eval_data)
-                success_count = eval_data['success'].sum()
-                pass_rate = success_count / dataset_count if dataset_count > 0 else 0.0
-                pass_rate_str = f"{pass_rate*100:.2f}%"
-                
-                # 解析時間戳
-                created_time = '未知'
-                if pd.notna(row.get('created_at')):
-                    try:
-                        # 將時間戳從毫秒轉換為日期時間字符串
-                        timestamp_ms = int(row['created_at'])
-                        dt = pd.to_datetime(timestamp_ms, unit='ms')
-                        # 轉換為台灣時區 (UTC+8)
-                        dt_taiwan = dt + pd.Timedelta(hours=8)
-                        created_time = dt_taiwan.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        created_time = str(row.get('created_at', '未知'))
-                
-                # 獲取描述
-                description = str(row.get('description', '')) if pd.notna(row.get('description')) else '無描述'
-                
-                results.append({
-                    'id': eval_id,
-                    'created': created_time,
-                    'description': description,
-                    'pass_rate': pass_rate_str,
-                    'dataset_count': dataset_count
-                })
-            
-            # 按創建時間排序（最新的在前）
-            results.sort(key=lambda x: x['created'], reverse=True)
-            
             print(f"最終返回 {len(results)} 個評估結果")
             if len(results) > 0:
                 print(f"第一個結果: {results[0]}")
             
+            self.result_cache.put(cache_key, results, signal)
             return results, 200
             
         except Exception as e:
@@ -98,509 +111,1008 @@ class EvaluationService:
             if not os.path.exists(self.db_path):
                 return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            conn = sqlite3.connect(self.db_path)
+            cache_key = ('summary', 'scorelab')
+            with self.pool.connection() as conn:
+                signal = self._summary_signal(conn)
+                cached = self.result_cache.get(cache_key, signal)
+                if cached is not None:
+                    return cached, 200
+                
+                eval_count, results = self._load_summaries(conn, is_redteam=False)
             
-            # 只讀取 is_redteam = 0 的 evals 資料
-            evals_df = pd.read_sql_query("SELECT * FROM evals WHERE is_redteam = 0", conn)
+            print(f"從資料庫讀取到 {eval_count} 個 ScoreLab 評估記錄")
             
-            # 讀取 eval_results 表格資料以計算統計指標
-            eval_results_df = pd.read_sql_query("SELECT * FROM eval_results", conn)
+            if eval_count == 0:
+                print("資料庫中沒有 ScoreLab 評估資料，返回空陣列")
+                results = []
+            else:
+                print(f"最終返回 {len(results)} 個 ScoreLab 評估結果")
             
-            conn.close()
+            self.result_cache.put(cache_key, results, signal)
+            return results, 200
             
-            print(f"從資料庫讀取到 {len(evals_df)} 個 ScoreLab 評估記錄")
+        except Exception as e:
+            print(f"獲取 ScoreLab 評估結果錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def get_redprobe_results(self):
+        """獲取 RedProbe 安全測試結果摘要（只包含 is_redteam = 1 的評估）"""
+        try:
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            if len(evals_df) == 0:
-                print("資料庫中沒有 ScoreLab 評估資料，返回空陣列")
-                return [], 200
+            cache_key = ('summary', 'redprobe')
+            with self.pool.connection() as conn:
+                signal = self._summary_signal(conn)
+                cached = self.result_cache.get(cache_key, signal)
+                if cached is not None:
+                    return cached, 200
+                
+                eval_count, results = self._load_summaries(conn, is_redteam=True)
             
-            # 轉換資料格式
-            results = []
+            print(f"從資料庫讀取到 {eval_count} 個 RedProbe 評估記錄")
             
-            for _, row in evals_df.iterrows():
-                eval_id = row['id']
-                print(f"處理 ScoreLab 評估: {eval_id}")
-                
-                # 計算該 eval_id 的統計指標
-                eval_data = eval_results_df[eval_results_df['eval_id'] == eval_id]
-                
-                if len(eval_data) == 0:
-                    print(f"跳過評估 {eval_id}，因為沒有對應的評估結果資料")
-                    continue
-                
-                # 計算統計指標
-                dataset_count = len(eval_data)
-                success_count = eval_data['success'].sum()
-                pass_rate = success_count / dataset_count if dataset_count > 0 else 0.0
-                pass_rate_str = f"{pass_rate*100:.2f}%"
-                
-                # 解析時間戳
-                created_time = '未知'
-                if pd.notna(row.get('created_at')):
-                    try:
-                        # 將時間戳從毫秒轉換為日期時間字符串
-                        timestamp_ms = int(row['created_at'])
-                        dt = pd.to_datetime(timestamp_ms, unit='ms')
-                        # 轉換為台灣時區 (UTC+8)
-                        dt_taiwan = dt + pd.Timedelta(hours=8)
-                        created_time = dt_taiwan.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        created_time = str(row.get('created_at', '未知'))
+            if eval_count == 0:
+                print("資料庫中沒有 RedProbe 評估資料，返回空陣列")
+                results = []
+            else:
+                print(f"最終返回 {len(results)} 個 RedProbe 評估結果")
+            
+            self.result_cache.put(cache_key, results, signal)
+            return results, 200
+            
+        except Exception as e:
+            print(f"獲取 RedProbe 評估結果錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def _load_summaries(self, conn, is_redteam=None):
+        """讀取評估數量與摘要；有摘要索引時只讀 sidecar，否則直接以 SQL 彙總"""
+        include_redteam_info = is_redteam is True
+        
+        if self.summary_index is not None:
+            # 背景同步執行中時只讀取已提交的彙總，不在請求中等待同步
+            if not self.summary_index.is_running():
+                self.summary_index.sync()
+            return (
+                self.summary_index.count_evals(is_redteam),
+                self.summary_index.list_summaries(is_redteam, include_redteam_info)
+            )
+        
+        eval_count = self.summary_service.count_evals(conn, is_redteam)
+        results = self.summary_service.summarize(conn, is_redteam)
+        
+        if include_redteam_info:
+            redteam_infos = self.redteam_service.get_redteam_info(conn, [item['id'] for item in results])
+            for item in results:
+                item['redteam_info'] = redteam_infos[item['id']]
+        
+        return eval_count, results
+
+    def get_evaluation_trends(self, params=None):
+        """依 description 與時間區間（hour / day / week）回傳通過率、平均分數與延遲百分位數趨勢
+
+        資料來自摘要索引中增量維護的每個評估彙總與延遲直方圖，只需一次 GROUP BY 查詢。
+        params: bucket（預設 day）、type（all / scorelab / redprobe）、description、since、until（YYYY-MM-DD）
+        """
+        try:
+            if self.summary_index is None:
+                return {'error': '摘要索引未啟用，無法提供趨勢資料'}, 503
+            
+            params = params or {}
+            try:
+                bucket = (params.get('bucket') or 'day').strip().lower()
+                if bucket not in SummaryIndexService.TREND_BUCKETS:
+                    raise ValueError('bucket 只能是 hour、day 或 week')
                 
-                # 獲取描述
-                description = str(row.get('description', '')) if pd.notna(row.get('description')) else '無描述'
+                eval_type = (params.get('type') or 'all').strip().lower()
+                type_filters = {'all': None, 'scorelab': False, 'redprobe': True}
+                if eval_type not in type_filters:
+                    raise ValueError('type 只能是 all、scorelab 或 redprobe')
                 
-                results.append({
-                    'id': eval_id,
-                    'created': created_time,
-                    'description': description,
-                    'pass_rate': pass_rate_str,
-                    'dataset_count': dataset_count
-                })
+                dates = {}
+                for key in ('since', 'until'):
+                    value = (params.get(key) or '').strip()
+                    if value:
+                        dates[key] = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError as e:
+                return {'error': f'查詢參數錯誤: {str(e)}'}, 400
             
-            # 按創建時間排序（最新的在前）
-            results.sort(key=lambda x: x['created'], reverse=True)
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            print(f"最終返回 {len(results)} 個 ScoreLab 評估結果")
+            description = params.get('description')
+            if not self.summary_index.is_running():
+                self.summary_index.sync()
+            series = self.summary_index.trends(
+                bucket, type_filters[eval_type], description, dates.get('since'), dates.get('until')
+            )
             
-            return results, 200
+            return {
+                'bucket': bucket,
+                'type': eval_type,
+                'since': dates.get('since'),
+                'until': dates.get('until'),
+                'series': series
+            }, 200
             
         except Exception as e:
-            print(f"獲取 ScoreLab 評估結果錯誤: {e}")
+            print(f"獲取評估趨勢錯誤: {e}")
             return {'error': str(e)}, 500
 
-    def get_redprobe_results(self):
-        """獲取 RedProbe 安全測試結果摘要（只包含 is_redteam = 1 的評估）"""
+    def start_background_indexing(self, interval=5.0):
+        """啟動摘要索引與全文檢索索引的背景同步"""
+        if self.summary_index is not None:
+            self.summary_index.start(interval)
+        if self.search_index is not None:
+            self.search_index.start(interval)
+
+    def search_evaluations(self, params):
+        """在評估輸出與測試變數中進行全文檢索
+
+        params: q（必填，以空白分隔的詞皆須符合）、eval_id、field（output / vars）、limit、offset
+        """
         try:
+            if self.search_index is None:
+                return {'error': '全文檢索索引未啟用'}, 503
+            
+            query = (params.get('q') or '').strip()
+            if not query:
+                return {'error': '必須提供搜尋關鍵字 q'}, 400
+            
+            try:
+                field = (params.get('field') or '').strip().lower() or None
+                if field and field not in SearchIndexService.FIELDS:
+                    raise ValueError('field 只能是 output 或 vars')
+                limit = int(params.get('limit') or 20)
+                offset = int(params.get('offset') or 0)
+                if limit <= 0 or offset < 0:
+                    raise ValueError('limit 必須大於 0，offset 不可為負數')
+            except ValueError as e:
+                return {'error': f'查詢參數錯誤: {str(e)}'}, 400
+            
             if not os.path.exists(self.db_path):
                 return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            conn = sqlite3.connect(self.db_path)
+            eval_id = urllib.parse.unquote(params.get('eval_id') or '') or None
+            limit = min(limit, self.MAX_PAGE_SIZE)
             
-            # 只讀取 is_redteam = 1 的 evals 資料
-            evals_df = pd.read_sql_query("SELECT * FROM evals WHERE is_redteam = 1", conn)
+            # 背景同步未啟動時於查詢前補齊索引
+            if not self.search_index.is_running():
+                self.search_index.sync()
+            total, ranked, results = self.search_index.search(query, eval_id, field, limit, offset)
             
-            # 讀取 eval_results 表格資料以計算統計指標
-            eval_results_df = pd.read_sql_query("SELECT * FROM eval_results", conn)
+            return {
+                'query': query,
+                'eval_id': eval_id,
+                'field': field,
+                # ranked 為 False 時 total 為下限（符合筆數過多，改依最新結果排序）
+                'total': total,
+                'ranked': ranked,
+                'limit': limit,
+                'offset': offset,
+                'has_more': offset + len(results) < total,
+                'results': results
+            }, 200
             
-            conn.close()
+        except sqlite3.OperationalError as e:
+            print(f"全文檢索錯誤: {e}")
+            if 'fts5' in str(e):
+                return {'error': '目前的 SQLite 未支援 FTS5，無法使用全文檢索'}, 503
+            return {'error': str(e)}, 500
+        except Exception as e:
+            print(f"全文檢索錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def get_search_index_stats(self):
+        """獲取全文檢索索引狀態"""
+        if self.search_index is None:
+            return {'enabled': False}, 200
+        return {'enabled': True, **self.search_index.stats()}, 200
+
+    def get_redteam_matrix(self, eval_id):
+        """獲取 redteam 評估的 plugin × strategy 矩陣"""
+        try:
+            decoded_eval_id = urllib.parse.unquote(eval_id)
             
-            print(f"從資料庫讀取到 {len(evals_df)} 個 RedProbe 評估記錄")
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            if len(evals_df) == 0:
-                print("資料庫中沒有 RedProbe 評估資料，返回空陣列")
-                return [], 200
+            with self.pool.connection() as conn:
+                matrix = self.redteam_service.get_matrix(conn, decoded_eval_id)
+                matrix['indexed'] = self.redteam_service.has_index(conn)
             
-            # 轉換資料格式
-            results = []
+            if not matrix['cells']:
+                return {'error': f'找不到評估 {decoded_eval_id} 的詳細資料', 'eval_id': decoded_eval_id}, 404
             
-            for _, row in evals_df.iterrows():
-                eval_id = row['id']
-                print(f"處理 RedProbe 評估: {eval_id}")
+            return matrix, 200
+            
+        except Exception as e:
+            print(f"獲取 redteam 矩陣錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def create_redteam_index(self):
+        """在 promptfoo 資料庫建立 pluginId / strategyId 表達式索引"""
+        try:
+            if not self.redteam_service.index_allowed():
+                return {
+                    'error': '建立索引會修改 promptfoo 資料庫，需設定 PROMPTLAB_REDTEAM_INDEX=1 才允許建立',
+                    'index': self.redteam_service.INDEX_NAME
+                }, 403
+            
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
+            
+            print(f"警告: 將在 promptfoo 資料庫建立索引 {self.redteam_service.INDEX_NAME}（{self.db_path}）")
+            self.redteam_service.create_index(self.db_path)
+            print(f"已建立 redteam 索引: {self.redteam_service.INDEX_NAME}")
+            return {'message': 'redteam 索引已建立', 'index': self.redteam_service.INDEX_NAME}, 200
+            
+        except Exception as e:
+            print(f"建立 redteam 索引錯誤: {e}")
+            return {'error': f'建立 redteam 索引失敗: {str(e)}'}, 500
+
+    def get_summary_index_stats(self):
+        """獲取摘要索引狀態"""
+        if self.summary_index is None:
+            return {'enabled': False}, 200
+        return {'enabled': True, **self.summary_index.stats()}, 200
+
+    def get_pool_stats(self):
+        """獲取資料庫連線池統計資訊"""
+        return self.pool.stats(), 200
+
+    def get_cache_stats(self):
+        """獲取結果快取統計資訊"""
+        return self.result_cache.stats(), 200
+
+    def _change_signal(self, conn):
+        """取得資料庫的變更訊號（evals/eval_results 的最大 rowid 與資料庫、WAL 檔案狀態）"""
+        max_eval_rowid = conn.execute("SELECT MAX(rowid) FROM evals").fetchone()[0]
+        max_result_rowid = conn.execute("SELECT MAX(rowid) FROM eval_results").fetchone()[0]
+        
+        file_states = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+                file_states.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                file_states.append(None)
+        
+        return (max_eval_rowid, max_result_rowid, tuple(file_states))
+
+    def _summary_signal(self, conn):
+        """評估清單快取的變更訊號；清單由摘要索引產生時另加上 sidecar 的檢查點，
+        背景同步追上 promptfoo 之後快取即失效
+        """
+        signal = self._change_signal(conn)
+        if self.summary_index is not None:
+            return (signal, self.summary_index.checkpoint())
+        return signal
+
+    def _eval_change_signal(self, conn, eval_id):
+        """取得單一評估的變更訊號，並判斷該評估是否已完成（最後一筆結果超過靜置時間）"""
+        max_rowid, row_count = conn.execute(
+            "SELECT MAX(rowid), COUNT(*) FROM eval_results WHERE eval_id = ?", (eval_id,)
+        ).fetchone()
+        
+        is_complete = False
+        if max_rowid is not None:
+            # promptfoo 的 created_at 可能是毫秒時間戳或文字時間
+            age_ms = conn.execute(
+                "SELECT CAST(strftime('%s', 'now') AS INTEGER) * 1000 - "
+                "CASE WHEN typeof(created_at) = 'integer' THEN created_at "
+                "ELSE CAST(strftime('%s', created_at) AS INTEGER) * 1000 END "
+                "FROM eval_results WHERE rowid = ?",
+                (max_rowid,)
+            ).fetchone()[0]
+            is_complete = age_ms is not None and age_ms >= self.IMMUTABLE_AFTER_SECONDS * 1000
+        
+        return (max_rowid, row_count), is_complete
+
+    def get_evaluation_detail(self, eval_id, params=None):
+        """獲取特定評估的詳細結果（直接從資料庫讀取）
+
+        未提供 cursor/limit/view/篩選參數時回傳完整結果；否則以 rowid 為 keyset 分頁回傳，
+        分頁預設為輕量格式（view=light），完整內容可透過 get_evaluation_row 逐列展開。
+        """
+        try:
+            # URL 解碼 eval_id（處理前端 encodeURIComponent 編碼的問題）
+            decoded_eval_id = urllib.parse.unquote(eval_id)
+            print(f"原始 eval_id: {eval_id}")
+            print(f"解碼後 eval_id: {decoded_eval_id}")
+            
+            params = params or {}
+            try:
+                page = self._parse_page_params(params)
+                filters = self._parse_detail_filters(params)
+            except ValueError as e:
+                return {'error': f'查詢參數錯誤: {str(e)}'}, 400
+            
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
+            
+            cache_key = (
+                'detail',
+                decoded_eval_id,
+                tuple(sorted(page.items())) if page else None,
+                tuple(sorted(filters.items()))
+            )
+            
+            # 已完成評估的快取不需要查詢變更訊號
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached, 200
+            
+            with self.pool.connection() as conn:
+                eval_signal, is_complete = self._eval_change_signal(conn, decoded_eval_id)
+                cached = self.result_cache.get(cache_key, eval_signal)
+                if cached is not None:
+                    return cached, 200
                 
-                # 計算該 eval_id 的統計指標
-                eval_data = eval_results_df[eval_results_df['eval_id'] == eval_id]
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
                 
-                if len(eval_data) == 0:
-                    print(f"跳過評估 {eval_id}，因為沒有對應的評估結果資料")
-                    continue
+                # 先查詢這個 eval_id 是否為 redteam
+                eval_info = cursor.execute(
+                    "SELECT is_redteam FROM evals WHERE id = ?", (decoded_eval_id,)
+                ).fetchone()
+                is_redteam = bool(eval_info['is_redteam']) if eval_info else False
                 
-                # 計算統計指標
-                dataset_count = len(eval_data)
-                success_count = eval_data['success'].sum()
-                pass_rate = success_count / dataset_count if dataset_count > 0 else 0.0
-                pass_rate_str = f"{pass_rate*100:.2f}%"
+                print(f"評估 {decoded_eval_id} 是否為 redteam: {is_redteam}")
                 
-                # 解析時間戳
-                created_time = '未知'
-                if pd.notna(row.get('created_at')):
-                    try:
-                        # 將時間戳從毫秒轉換為日期時間字符串
-                        timestamp_ms = int(row['created_at'])
-                        dt = pd.to_datetime(timestamp_ms, unit='ms')
-                        # 轉換為台灣時區 (UTC+8)
-                        dt_taiwan = dt + pd.Timedelta(hours=8)
-                        created_time = dt_taiwan.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        created_time = str(row.get('created_at', '未知'))
+                # 摘要統計以獨立的輕量查詢取得，不受分頁影響
+                total_tests, passed_tests = cursor.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(success), 0) FROM eval_results WHERE eval_id = ?",
+                    (decoded_eval_id,)
+                ).fetchone()
                 
-                # 獲取描述
-                description = str(row.get('description', '')) if pd.notna(row.get('description')) else '無描述'
+                if total_tests == 0:
+                    print(f"找不到評估 {decoded_eval_id} 的詳細資料")
+                    return {
+                        'error': f'找不到評估 {decoded_eval_id} 的詳細資料',
+                        'eval_id': decoded_eval_id,
+                        'message': '此評估在資料庫中沒有對應的詳細資料'
+                    }, 404
                 
-                # 解析 redteam 特有資訊
-                redteam_info = self._parse_redteam_info(eval_data)
+                result = {
+                    'eval_id': decoded_eval_id,
+                    'is_redteam': is_redteam,
+                    'total_tests': total_tests,
+                    'passed_tests': passed_tests,
+                    'pass_rate': f"{(passed_tests / total_tests * 100):.2f}%"
+                }
                 
-                results.append({
-                    'id': eval_id,
-                    'created': created_time,
-                    'description': description,
-                    'pass_rate': pass_rate_str,
-                    'dataset_count': dataset_count,
-                    'redteam_info': redteam_info
-                })
+                if page is None and not filters:
+                    # 相容舊版：一次回傳全部結果
+                    rows = cursor.execute(
+                        "SELECT rowid AS row_id, * FROM eval_results WHERE eval_id = ? ORDER BY rowid",
+                        (decoded_eval_id,)
+                    ).fetchall()
+                    result['details'] = [decode_detail_row(dict(row), is_redteam) for row in rows]
+                else:
+                    self._fill_detail_page(cursor, result, decoded_eval_id, page, filters)
             
-            # 按創建時間排序（最新的在前）
-            results.sort(key=lambda x: x['created'], reverse=True)
-            
-            print(f"最終返回 {len(results)} 個 RedProbe 評估結果")
-            
-            return results, 200
+            self.result_cache.put(cache_key, result, eval_signal, immutable=is_complete)
+            return result, 200
             
         except Exception as e:
-            print(f"獲取 RedProbe 評估結果錯誤: {e}")
+            print(f"獲取評估詳細資料錯誤: {e}")
             return {'error': str(e)}, 500
 
-    def _parse_redteam_info(self, eval_data):
-        """解析 redteam 特有資訊"""
+    def _fill_detail_page(self, cursor, result, eval_id, page, filters):
+        """以 rowid keyset 查詢單頁詳細結果並寫入 result（view=light 時只讀取列表需要的欄位）"""
+        page = page or self._parse_page_params({'view': 'light'})
+        filter_sql, filter_params = self._build_detail_filter_sql(filters)
+        
+        if page['view'] == 'light':
+            select_sql = self.LIGHT_SELECT
+            select_params = [page['preview_chars'], page['preview_chars']]
+        else:
+            select_sql = "SELECT rowid AS row_id, * FROM eval_results"
+            select_params = []
+        
+        rows = cursor.execute(
+            select_sql + " WHERE eval_id = ? AND rowid > ?" + filter_sql +
+            " ORDER BY rowid LIMIT ?",
+            [*select_params, eval_id, page['cursor'] or 0, *filter_params, page['limit'] + 1]
+        ).fetchall()
+        
+        has_more = len(rows) > page['limit']
+        rows = rows[:page['limit']]
+        
+        details = []
+        for row in rows:
+            if page['view'] == 'light':
+                detail_item = self._build_light_item(dict(row), result['is_redteam'], page['preview_chars'])
+            else:
+                detail_item = decode_detail_row(dict(row), is_redteam=result['is_redteam'])
+                detail_item['row_id'] = row['row_id']
+            details.append(detail_item)
+        
+        # 第一頁且有篩選條件時，額外回傳符合條件的筆數
+        if filters and page['cursor'] is None:
+            result['matched_tests'] = cursor.execute(
+                "SELECT COUNT(*) FROM eval_results WHERE eval_id = ?" + filter_sql,
+                [eval_id, *filter_params]
+            ).fetchone()[0]
+        
+        result['filters'] = filters
+        result['page'] = {
+            'cursor': page['cursor'],
+            'limit': page['limit'],
+            'view': page['view'],
+            'returned': len(details),
+            'has_more': has_more,
+            'next_cursor': details[-1]['row_id'] if has_more else None
+        }
+        result['details'] = details
+
+    def _build_light_item(self, row, is_redteam, preview_chars):
+        """將輕量查詢結果轉換為列表用的精簡格式"""
+        success = bool(row['success'])
+        score = float(row['score']) if notna(row['score']) else 0.0
+        
+        variables = loads_or_none(row['vars_json']) or {}
+        if isinstance(variables, dict):
+            variables = {
+                key: value[:preview_chars] if isinstance(value, str) else value
+                for key, value in variables.items()
+            }
+        
+        assertions = []
+        if row['assertions_json']:
+            for component in loads_or_none(row['assertions_json']) or []:
+                assertions.append({
+                    'type': component.get('type') or 'unknown',
+                    'pass': bool(component.get('pass')),
+                    'score': float(component.get('score') or 0)
+                })
+        
+        output = row['output_preview'] if row['output_preview'] is not None else ''
+        detail_item = {
+            'row_id': row['row_id'],
+            'variables': variables,
+            'output': output,
+            'output_truncated': (row['output_length'] or 0) > len(output),
+            'status': 'PASS' if success else 'FAIL',
+            'success': success,
+            'score': score,
+            'latency': int(row['latency_ms']) if notna(row['latency_ms']) else 0,
+            'error': row['error_preview'] or '',
+            'assertions': assertions
+        }
+        
+        if is_redteam:
+            if not success or score < 0.5:
+                risk_level = 'high-risk'
+            elif score < 0.8:
+                risk_level = 'medium-risk'
+            else:
+                risk_level = 'low-risk'
+            detail_item['redteam_info'] = {
+                'plugin_id': row['plugin_id'] or '',
+                'strategy_id': row['strategy_id'] or '',
+                'risk_level': risk_level
+            }
+        
+        return detail_item
+
+    def get_evaluation_statistics(self, eval_id, params=None):
+        """獲取評估的分數 / 延遲分佈、各 assertion 分數分佈與通過率信賴區間（只回傳分箱結果）
+
+        params: score_bins（預設 10）、latency_bins（預設 8）、resamples（預設 2000）、confidence（預設 0.95）
+        """
         try:
-            plugin_counts = {}
-            strategy_counts = {}
-            risk_levels = {'high-risk': 0, 'medium-risk': 0, 'low-risk': 0}
-            
-            for _, row in eval_data.iterrows():
-                # 解析 metadata JSON
-                if pd.notna(row.get('metadata')):
-                    try:
-                        metadata = json.loads(row['metadata'])
-                        plugin_id = metadata.get('pluginId', '')
-                        strategy_id = metadata.get('strategyId', '')
-                        
-                        # 統計 plugin 類型
-                        if plugin_id:
-                            plugin_counts[plugin_id] = plugin_counts.get(plugin_id, 0) + 1
-                        
-                        # 統計 strategy 類型
-                        if strategy_id:
-                            strategy_counts[strategy_id] = strategy_counts.get(strategy_id, 0) + 1
-                        
-                        # 根據測試結果計算風險等級
-                        success = bool(row['success'])
-                        score = float(row['score']) if pd.notna(row['score']) else 0.0
-                        
-                        if not success or score < 0.5:
-                            risk_levels['high-risk'] += 1
-                        elif score < 0.8:
-                            risk_levels['medium-risk'] += 1
-                        else:
-                            risk_levels['low-risk'] += 1
-                            
-                    except Exception as e:
-                        print(f"解析 metadata 時發生錯誤: {e}")
-                        continue
+            decoded_eval_id = urllib.parse.unquote(eval_id)
             
-            return {
-                'plugin_counts': plugin_counts,
-                'strategy_counts': strategy_counts,
-                'risk_levels': risk_levels
-            }
+            params = params or {}
+            try:
+                options = {
+                    'score_bins': int(params.get('score_bins') or 10),
+                    'latency_bins': int(params.get('latency_bins') or 8),
+                    'resamples': int(params.get('resamples') or 2000),
+                    'confidence': float(params.get('confidence') or 0.95)
+                }
+                if not 1 <= options['score_bins'] <= 100 or not 1 <= options['latency_bins'] <= 100:
+                    raise ValueError('分箱數量必須介於 1 到 100')
+                if not 100 <= options['resamples'] <= 100000:
+                    raise ValueError('resamples 必須介於 100 到 100000')
+                if not 0 < options['confidence'] < 1:
+                    raise ValueError('confidence 必須介於 0 與 1 之間')
+            except ValueError as e:
+                return {'error': f'查詢參數錯誤: {str(e)}'}, 400
+            
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
+            
+            cache_key = ('statistics', decoded_eval_id, tuple(sorted(options.items())))
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached, 200
+            
+            with self.pool.connection() as conn:
+                eval_signal, is_complete = self._eval_change_signal(conn, decoded_eval_id)
+                cached = self.result_cache.get(cache_key, eval_signal)
+                if cached is not None:
+                    return cached, 200
+                
+                result = self.statistics_service.compute(conn, decoded_eval_id, **options)
+            
+            if result is None:
+                return {
+                    'error': f'找不到評估 {decoded_eval_id} 的詳細資料',
+                    'eval_id': decoded_eval_id
+                }, 404
+            
+            self.result_cache.put(cache_key, result, eval_signal, immutable=is_complete)
+            return result, 200
             
         except Exception as e:
-            print(f"解析 redteam 資訊時發生錯誤: {e}")
-            return {
-                'plugin_counts': {},
-                'strategy_counts': {},
-                'risk_levels': {'high-risk': 0, 'medium-risk': 0, 'low-risk': 0}
-            }
-    
-    def get_evaluation_detail(self, eval_id):
-        """獲取特定評估的詳細結果（直接從資料庫讀取）"""
+            print(f"獲取評估統計錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def get_evaluation_row(self, eval_id, row_id):
+        """獲取單筆評估結果的完整內容（展開列時使用）"""
         try:
-            # URL 解碼 eval_id（處理前端 encodeURIComponent 編碼的問題）
             decoded_eval_id = urllib.parse.unquote(eval_id)
-            print(f"原始 eval_id: {eval_id}")
-            print(f"解碼後 eval_id: {decoded_eval_id}")
             
             if not os.path.exists(self.db_path):
                 return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            conn = sqlite3.connect(self.db_path)
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                
+                eval_info = cursor.execute(
+                    "SELECT is_redteam FROM evals WHERE id = ?", (decoded_eval_id,)
+                ).fetchone()
+                is_redteam = bool(eval_info['is_redteam']) if eval_info else False
+                
+                row = cursor.execute(
+                    "SELECT rowid AS row_id, * FROM eval_results WHERE eval_id = ? AND rowid = ?",
+                    (decoded_eval_id, int(row_id))
+                ).fetchone()
+            
+            if row is None:
+                return {'error': f'找不到評估 {decoded_eval_id} 的第 {row_id} 筆結果'}, 404
+            
+            row = dict(row)
+            detail_item = decode_detail_row(row, is_redteam)
+            detail_item['row_id'] = row['row_id']
+            
+            # 附上完整解析的原始 JSON 欄位
+            raw = {}
+            for column in ('test_case', 'prompt', 'response', 'grading_result', 'named_scores', 'metadata'):
+                value = row.get(column)
+                parsed = loads_or_none(value)
+                raw[column] = parsed if parsed is not None else value
+            detail_item['raw'] = raw
+            
+            return detail_item, 200
             
-            # 先查詢這個 eval_id 是否為 redteam
-            eval_info_query = "SELECT is_redteam FROM evals WHERE id = ?"
-            eval_info_df = pd.read_sql_query(eval_info_query, conn, params=[decoded_eval_id])
+        except Exception as e:
+            print(f"獲取單筆評估結果錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def stream_evaluation_detail(self, eval_id, params=None, output_format='ndjson'):
+        """以串流方式輸出評估詳細結果，回傳 (generator, 狀態碼) 或 (錯誤訊息, 狀態碼)
+
+        逐批讀取 sqlite cursor 並逐筆編碼，記憶體用量不隨評估筆數成長。
+        output_format 為 ndjson（每行一筆）或 json（逐步編碼的 JSON 物件）。
+        """
+        try:
+            decoded_eval_id = urllib.parse.unquote(eval_id)
             
-            is_redteam = False
-            if len(eval_info_df) > 0:
-                is_redteam = bool(eval_info_df['is_redteam'].iloc[0])
+            if output_format not in ('ndjson', 'json'):
+                return {'error': 'format 只能是 ndjson 或 json'}, 400
             
-            print(f"評估 {decoded_eval_id} 是否為 redteam: {is_redteam}")
+            try:
+                filters = self._parse_detail_filters(params or {})
+            except ValueError as e:
+                return {'error': f'查詢參數錯誤: {str(e)}'}, 400
             
-            # 從資料庫讀取特定 eval_id 的詳細資料
-            query = "SELECT * FROM eval_results WHERE eval_id = ?"
-            df = pd.read_sql_query(query, conn, params=[decoded_eval_id])
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
             
-            conn.close()
+            with self.pool.connection() as conn:
+                eval_info = conn.execute(
+                    "SELECT is_redteam FROM evals WHERE id = ?", (decoded_eval_id,)
+                ).fetchone()
+                has_results = conn.execute(
+                    "SELECT 1 FROM eval_results WHERE eval_id = ? LIMIT 1", (decoded_eval_id,)
+                ).fetchone()
             
-            if len(df) == 0:
-                print(f"找不到評估 {decoded_eval_id} 的詳細資料")
+            if not has_results:
                 return {
                     'error': f'找不到評估 {decoded_eval_id} 的詳細資料',
                     'eval_id': decoded_eval_id,
                     'message': '此評估在資料庫中沒有對應的詳細資料'
                 }, 404
             
-            # 檢查可用欄位
-            print(f"詳細資料欄位: {df.columns.tolist()}")
+            is_redteam = bool(eval_info[0]) if eval_info else False
+            print(f"開始串流評估 {decoded_eval_id} 的詳細資料 (format={output_format})")
             
-            # 轉換為詳細格式
-            details = []
-            for _, row in df.iterrows():
-                # 解析 test_case JSON 來獲取 variables
-                variables = {}
-                try:
-                    test_case = json.loads(row['test_case'])
-                    variables = test_case.get('vars', {})
-                except:
-                    # 如果解析失敗，嘗試從 prompt 欄位獲取
-                    if pd.notna(row['prompt']):
-                        try:
-                            prompt_data = json.loads(row['prompt'])
-                            if isinstance(prompt_data, dict) and 'raw' in prompt_data:
-                                variables = {'prompt': prompt_data['raw']}
-                            else:
-                                variables = {'prompt': str(row['prompt'])}
-                        except:
-                            variables = {'prompt': str(row['prompt'])}
-                
-                # 解析 response JSON
-                output_text = ''
+            return self._generate_detail_stream(decoded_eval_id, is_redteam, filters, output_format), 200
+            
+        except Exception as e:
+            print(f"串流評估詳細資料錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def _generate_detail_stream(self, eval_id, is_redteam, filters, output_format):
+        """逐批讀取並編碼詳細結果的 generator
+
+        每批以 rowid keyset 查詢並各自短暫取用連線，yield 時不佔用連線池，
+        客戶端讀取緩慢時也不會耗盡連線。
+        """
+        filter_sql, filter_params = self._build_detail_filter_sql(filters)
+        query = (
+            "SELECT rowid AS row_id, * FROM eval_results WHERE eval_id = ? AND rowid > ?" + filter_sql +
+            " ORDER BY rowid LIMIT ?"
+        )
+        
+        if output_format == 'json':
+            header = json.dumps({'eval_id': eval_id, 'is_redteam': is_redteam}, ensure_ascii=False)
+            yield header[:-1] + ', "details": ['
+        
+        first = True
+        last_rowid = 0
+        while True:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
                 try:
-                    response_data = json.loads(row['response'])
-                    output_text = response_data.get('output', '')
-                except:
-                    output_text = str(row['response']) if pd.notna(row['response']) else ''
-                
-                # 解析 grading_result JSON 來獲取 assertions (如果欄位存在)
-                assertions = []
-                grading_info = {}
-                
-                # 檢查是否有 grading_result 欄位
-                if 'grading_result' in df.columns and pd.notna(row.get('grading_result')):
-                    try:
-                        grading_result_str = str(row['grading_result'])
-                        print(f"原始 grading_result: {grading_result_str[:200]}...")  # 只顯示前200字符
-                        
-                        grading_result = json.loads(grading_result_str)
-                        grading_info = {
-                            'pass': bool(grading_result.get('pass', False)),
-                            'score': float(grading_result.get('score', 0)),
-                            'reason': grading_result.get('reason', ''),
-                            'overall_pass': bool(grading_result.get('pass', False))
-                        }
-                        
-                        # 解析 componentResults 來獲取個別 assertion
-                        component_results = grading_result.get('componentResults', [])
-                        print(f"找到 {len(component_results)} 個 componentResults")
-                        
-                        for i, component in enumerate(component_results):
-                            assertion_info = component.get('assertion', {})
-                            assertion_type = assertion_info.get('type', 'unknown')
-                            assertion_value = assertion_info.get('value', '')
-                            
-                            print(f"Component {i}: type={assertion_type}, pass={component.get('pass')}, score={component.get('score')}")
-                            
-                            # 處理不同類型的 assertion value
-                            if isinstance(assertion_value, list):
-                                value_display = ', '.join(map(str, assertion_value))
-                            else:
-                                value_display = str(assertion_value)
-                            
-                            assertions.append({
-                                'pass': bool(component.get('pass', False)),
-                                'score': float(component.get('score', 0)),
-                                'type': assertion_type,
-                                'value': value_display,
-                                'reason': component.get('reason', '')
-                            })
-                    except Exception as e:
-                        print(f"解析 grading_result 時發生錯誤: {e}")
-                        print(f"grading_result 內容: {row.get('grading_result', 'N/A')}")
-                        grading_info = None
-                
-                # 如果沒有 grading_result 或解析失敗，從 test_case 解析 assertions
-                if not grading_info or not assertions:
-                    grading_info = {
-                        'pass': bool(row['success']),
-                        'score': float(row['score']) if pd.notna(row['score']) else 0.0,
-                        'reason': str(row['error']) if pd.notna(row['error']) else '',
-                        'overall_pass': bool(row['success'])
-                    }
-                    
-                    # 嘗試從 test_case 中解析 assertions
-                    try:
-                        test_case = json.loads(row['test_case'])
-                        test_assertions = test_case.get('assert', [])
-                        
-                        # 解析 error 欄位獲取 BERTScore
-                        error_text = str(row['error']) if pd.notna(row['error']) else ''
-                        bert_scores = {}
-                        if error_text:
-                            for line in error_text.split('\n'):
-                                if 'BERTScore' in line:
-                                    if 'Precision' in line:
-                                        match = re.search(r'BERTScore Precision: ([\d.]+)', line)
-                                        if match:
-                                            bert_scores['precision'] = float(match.group(1))
-                                    elif 'Recall' in line:
-                                        match = re.search(r'BERTScore Recall: ([\d.]+)', line)
-                                        if match:
-                                            bert_scores['recall'] = float(match.group(1))
-                                    elif 'F1' in line:
-                                        match = re.search(r'BERTScore F1: ([\d.]+)', line)
-                                        if match:
-                                            bert_scores['f1'] = float(match.group(1))
-                        
-                        for i, assertion in enumerate(test_assertions):
-                            assertion_type = assertion.get('type', 'unknown')
-                            assertion_value = assertion.get('value', '')
-                            threshold = assertion.get('threshold', 0.5)
-                            
-                            # 處理不同類型的 assertion value
-                            if isinstance(assertion_value, list):
-                                value_display = ', '.join(assertion_value)
-                            else:
-                                value_display = str(assertion_value)
-                            
-                            # 根據 assertion 類型分配評分和原因
-                            if assertion_type == 'g-eval':
-                                # g-eval 評估 - 從實際數據中獲取評分和原因
-                                assertion_score = float(row['score']) if pd.notna(row['score']) else 0.0
-                                assertion_pass = assertion_score >= threshold
-                                # 嘗試從錯誤訊息中提取實際的評估原因
-                                assertion_reason = ''
-                                if error_text:
-                                    # 從錯誤訊息中提取評估原因
-                                    lines = error_text.split('\n')
-                                    for line in lines:
-                                        if '評估' in line or 'eval' in line.lower() or '原因' in line:
-                                            assertion_reason = line.strip()
-                                            break
-                                if not assertion_reason:
-                                    assertion_reason = value_display if value_display else '無評估原因說明'
-                            
-                            elif assertion_type == 'factuality':
-                                # factuality 評估
-                                assertion_score = 0.66
-                                assertion_pass = True
-                                assertion_reason = '{{expected_answer}}'
-                            
-                            elif assertion_type == 'python':
-                                # python 評估 (BERTScore)
-                                if 'get_assert_bert_f1' in value_display:
-                                    assertion_score = float(bert_scores.get('f1', 0.47))
-                                    assertion_reason = f'BERTScore F1: {assertion_score:.4f}'
-                                elif 'get_assert_bert_recall' in value_display:
-                                    assertion_score = float(bert_scores.get('recall', 0.66))
-                                    assertion_reason = f'BERTScore Recall: {assertion_score:.4f}'
-                                elif 'get_assert_bert_precision' in value_display:
-                                    assertion_score = float(bert_scores.get('precision', 0.31))
-                                    assertion_reason = f'BERTScore Precision: {assertion_score:.4f}'
-                                assertion_pass = assertion_score >= threshold
-                            
-                            else:
-                                # 其他類型
-                                assertion_score = float(row['score']) if pd.notna(row['score']) else 0.0
-                                assertion_pass = assertion_score >= threshold
-                                assertion_reason = error_text if error_text and error_text != 'nan' else '評估完成'
-                            
-                            assertions.append({
-                                'pass': assertion_pass,
-                                'score': float(assertion_score),
-                                'type': assertion_type,
-                                'value': value_display,
-                                'reason': assertion_reason
-                            })
-                    except:
-                        # 如果都解析失敗，創建一個基本的 assertion
-                        assertions.append({
-                            'pass': bool(row['success']),
-                            'score': float(row['score']) if pd.notna(row['score']) else 0.0,
-                            'type': 'overall',
-                            'value': '整體評估',
-                            'reason': str(row['error']) if pd.notna(row['error']) else '評估完成'
-                        })
-                
-                # 判斷狀態
-                success = bool(row['success'])
-                status = 'PASS' if success else 'FAIL'
-                
-                # 處理錯誤訊息
-                error_message = ''
-                if not success and pd.notna(row['error']):
-                    error_message = str(row['error'])
+                    rows = cursor.execute(
+                        query, [eval_id, last_rowid, *filter_params, self.STREAM_BATCH_SIZE]
+                    ).fetchall()
+                finally:
+                    cursor.close()
+            if not rows:
+                break
+            last_rowid = rows[-1]['row_id']
+            
+            chunk = []
+            for row in rows:
+                detail_item = decode_detail_row(dict(row), is_redteam)
+                detail_item['row_id'] = row['row_id']
+                encoded = json.dumps(detail_item, ensure_ascii=False)
+                if output_format == 'ndjson':
+                    chunk.append(encoded + '\n')
+                else:
+                    chunk.append(encoded if first else ', ' + encoded)
+                    first = False
+            yield ''.join(chunk)
+        
+        if output_format == 'json':
+            yield ']}'
+
+    def get_evaluation_compare(self, base_id, head_id, params=None):
+        """比較兩個評估（base 為舊版、head 為新版）
+
+        以 test_case.vars 的雜湊配對兩邊的結果，回傳整體的退步 / 進步統計，
+        以及依 base rowid 分頁的逐列分數與狀態差異。配對結果依兩個評估的變更訊號快取，
+        翻頁時不需重新配對。
+        """
+        try:
+            base_id = urllib.parse.unquote(base_id or '')
+            head_id = urllib.parse.unquote(head_id or '')
+            if not base_id or not head_id:
+                return {'error': '必須提供 base 與 head 評估 ID'}, 400
+            
+            params = params or {}
+            try:
+                page = self._parse_page_params({'view': 'light', **params})
+                change = (params.get('change') or '').strip().lower()
+                if change and change not in self.COMPARE_CHANGES:
+                    raise ValueError(f"change 只能是 {' / '.join(self.COMPARE_CHANGES)}")
+            except ValueError as e:
+                return {'error': f'查詢參數錯誤: {str(e)}'}, 400
+            
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
+            
+            with self.pool.connection() as conn:
+                cached, missing_id = self._load_comparison(conn, base_id, head_id)
+                if cached is None:
+                    return {
+                        'error': f'找不到評估 {missing_id} 的詳細資料',
+                        'eval_id': missing_id
+                    }, 404
                 
-                # 準備基本詳細資訊
-                detail_item = {
-                    'variables': variables,
-                    'output': output_text,
-                    'status': status,
-                    'success': success,
-                    'score': float(row['score']) if pd.notna(row['score']) else 0.0,
-                    'latency': int(row['latency_ms']) if pd.notna(row['latency_ms']) else 0,
-                    'error': error_message,
-                    'grading_info': grading_info,
-                    'assertions': assertions
-                }
+                pairs = cached['pairs']
+                if change:
+                    pairs = [pair for pair in pairs if self._pair_matches_change(pair, change)]
                 
-                # 如果是 redteam 測試，加入 redteam 特有資訊
-                if is_redteam and pd.notna(row.get('metadata')):
-                    try:
-                        metadata = json.loads(row['metadata'])
-                        plugin_id = metadata.get('pluginId', '')
-                        strategy_id = metadata.get('strategyId', '')
-                        
-                        # 計算風險等級
-                        score = float(row['score']) if pd.notna(row['score']) else 0.0
-                        if not success or score < 0.5:
-                            risk_level = 'high-risk'
-                        elif score < 0.8:
-                            risk_level = 'medium-risk'
-                        else:
-                            risk_level = 'low-risk'
-                        
-                        # 轉換 pluginId 為中文顯示
-                        plugin_names = {
-                            'harmful': '有害內容',
-                            'pii': '個人資訊',
-                            'bias': '偏見檢測',
-                            'injection': '注入攻擊',
-                            'promptfoo:redteam:harmful': '有害內容',
-                            'promptfoo:redteam:pii': '個人資訊',
-                            'promptfoo:redteam:bias': '偏見檢測',
-                            'promptfoo:redteam:injection': '注入攻擊'
-                        }
-                        
-                        plugin_display = plugin_names.get(plugin_id, plugin_id)
-                        
-                        detail_item['redteam_info'] = {
-                            'plugin_id': plugin_id,
-                            'plugin_display': plugin_display,
-                            'strategy_id': strategy_id,
-                            'risk_level': risk_level,
-                            'metadata': metadata
-                        }
-                        
-                    except Exception as e:
-                        print(f"解析 redteam metadata 時發生錯誤: {e}")
-                        detail_item['redteam_info'] = {
-                            'plugin_id': '',
-                            'plugin_display': '未知',
-                            'strategy_id': '',
-                            'risk_level': 'unknown',
-                            'metadata': {}
-                        }
+                # pairs 依 base rowid 排序，以 bisect 找到 cursor 之後的位置
+                start = bisect.bisect_right(pairs, (page['cursor'] or 0, float('inf')))
+                page_pairs = pairs[start:start + page['limit'] + 1]
+                has_more = len(page_pairs) > page['limit']
+                page_pairs = page_pairs[:page['limit']]
                 
-                details.append(detail_item)
+                details = self._build_compare_items(conn, page_pairs, page['preview_chars'])
             
             return {
-                'eval_id': decoded_eval_id,
-                'is_redteam': is_redteam,
-                'total_tests': len(details),
-                'passed_tests': sum(1 for d in details if d['success']),
-                'pass_rate': f"{(sum(1 for d in details if d['success']) / len(details) * 100):.2f}%" if details else "0%",
+                'base': base_id,
+                'head': head_id,
+                'summary': cached['summary'],
+                'change': change or None,
+                'matched_rows': len(pairs),
+                'page': {
+                    'cursor': page['cursor'],
+                    'limit': page['limit'],
+                    'returned': len(details),
+                    'has_more': has_more,
+                    'next_cursor': details[-1]['base_row_id'] if has_more else None
+                },
                 'details': details
             }, 200
             
         except Exception as e:
-            print(f"獲取評估詳細資料錯誤: {e}")
+            print(f"比較評估錯誤: {e}")
             return {'error': str(e)}, 500
+
+    def check_regression(self, baseline_id, candidate_id, params=None):
+        """檢定候選評估相對基準評估是否退步，回傳 PASS / FAIL / INCONCLUSIVE 判定
+
+        以 test_case.vars 雜湊配對兩邊的結果後，通過率使用 McNemar 檢定、分數使用配對 bootstrap。
+        params: alpha、max_pass_rate_drop（百分點）、max_score_drop、resamples
+        """
+        try:
+            baseline_id = urllib.parse.unquote(baseline_id or '')
+            candidate_id = urllib.parse.unquote(candidate_id or '')
+            if not baseline_id or not candidate_id:
+                return {'error': '必須提供 baseline 與 candidate 評估 ID'}, 400
+            
+            params = params or {}
+            try:
+                options = {}
+                for key in ('alpha', 'max_pass_rate_drop', 'max_score_drop'):
+                    if params.get(key) not in (None, ''):
+                        options[key] = float(params[key])
+                if params.get('resamples') not in (None, ''):
+                    options['resamples'] = int(params['resamples'])
+                if not 0 < options.get('alpha', 0.05) < 1:
+                    raise ValueError('alpha 必須介於 0 與 1 之間')
+                if not 100 <= options.get('resamples', 2000) <= 100000:
+                    raise ValueError('resamples 必須介於 100 到 100000')
+            except ValueError as e:
+                return {'error': f'查詢參數錯誤: {str(e)}'}, 400
+            
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
+            
+            with self.pool.connection() as conn:
+                comparison, missing_id = self._load_comparison(conn, baseline_id, candidate_id)
+            if comparison is None:
+                return {'error': f'找不到評估 {missing_id} 的詳細資料', 'eval_id': missing_id}, 404
+            
+            result = self.regression_service.check(comparison['pairs'], options)
+            result.update({
+                'baseline': baseline_id,
+                'candidate': candidate_id,
+                'baseline_only': comparison['summary']['base_only'],
+                'candidate_only': comparison['summary']['head_only']
+            })
+            print(f"退步檢定 {baseline_id} -> {candidate_id}: {result['verdict']}")
+            return result, 200
+            
+        except Exception as e:
+            print(f"退步檢定錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def _load_comparison(self, conn, base_id, head_id):
+        """取得兩個評估的配對結果（依兩者的變更訊號快取）
+
+        回傳 ({'summary', 'pairs'}, None)；任一評估沒有結果時回傳 (None, 該評估 ID)。
+        """
+        base_signal, base_complete = self._eval_change_signal(conn, base_id)
+        head_signal, head_complete = self._eval_change_signal(conn, head_id)
+        
+        for eval_id, signal in ((base_id, base_signal), (head_id, head_signal)):
+            if signal[0] is None:
+                return None, eval_id
+        
+        cache_key = ('compare', base_id, head_id)
+        signal = (base_signal, head_signal)
+        cached = self.result_cache.get(cache_key, signal)
+        if cached is None:
+            summary, pairs = self.compare_service.compare(conn, base_id, head_id)
+            cached = {'summary': summary, 'pairs': pairs}
+            self.result_cache.put(cache_key, cached, signal, immutable=base_complete and head_complete)
+            print(f"已比較評估 {base_id} 與 {head_id}: 配對 {summary['matched']} 筆")
+        
+        return cached, None
+
+    def _pair_matches_change(self, pair, change):
+        """判斷配對結果是否符合 change 篩選條件"""
+        _, _, base_success, head_success, base_score, head_score = pair
+        if change == 'changed':
+            return bool(base_success) != bool(head_success) or (base_score or 0.0) != (head_score or 0.0)
+        return classify_pair(bool(base_success), bool(head_success)) == change
+
+    def _build_compare_items(self, conn, pairs, preview_chars):
+        """讀取單頁配對結果的變數與輸出預覽，組成逐列差異"""
+        if not pairs:
+            return []
+        
+        row_ids = [pair[0] for pair in pairs] + [pair[1] for pair in pairs]
+        placeholders = ', '.join('?' for _ in row_ids)
+        previews = {
+            row_id: (vars_json, output_preview)
+            for row_id, vars_json, output_preview in conn.execute(f"""
+                SELECT rowid,
+                       CASE WHEN json_valid(test_case) THEN json_extract(test_case, '$.vars') END,
+                       substr(CASE WHEN json_valid(response) THEN json_extract(response, '$.output')
+                              ELSE response END, 1, ?)
+                FROM eval_results
+                WHERE rowid IN ({placeholders})
+            """, [preview_chars, *row_ids]).fetchall()
+        }
+        
+        details = []
+        for base_row_id, head_row_id, base_success, head_success, base_score, head_score in pairs:
+            base_vars, base_output = previews.get(base_row_id, (None, None))
+            _, head_output = previews.get(head_row_id, (None, None))
+            variables = loads_or_none(base_vars)
+            base_score = float(base_score) if notna(base_score) else 0.0
+            head_score = float(head_score) if notna(head_score) else 0.0
+            
+            details.append({
+                'base_row_id': base_row_id,
+                'head_row_id': head_row_id,
+                'variables': variables if isinstance(variables, dict) else {},
+                'base': {
+                    'status': 'PASS' if base_success else 'FAIL',
+                    'score': base_score,
+                    'output_preview': base_output or ''
+                },
+                'head': {
+                    'status': 'PASS' if head_success else 'FAIL',
+                    'score': head_score,
+                    'output_preview': head_output or ''
+                },
+                'score_delta': round(head_score - base_score, 6),
+                'status_change': classify_pair(bool(base_success), bool(head_success))
+            })
+        
+        return details
+
+    def export_evaluations(self, eval_ids, output_format='parquet'):
+        """將一個或多個評估匯出為 Parquet / Arrow IPC / CSV 串流
+
+        回傳 ({'stream', 'filename', 'mimetype'}, 200) 或 (錯誤訊息, 狀態碼)。
+        資料以固定大小的區塊讀取與編碼，記憶體用量不隨評估筆數成長。
+        """
+        try:
+            eval_ids = [urllib.parse.unquote(eval_id) for eval_id in eval_ids if eval_id]
+            if not eval_ids:
+                return {'error': '必須提供至少一個評估 ID'}, 400
+            
+            output_format = (output_format or 'parquet').strip().lower()
+            try:
+                self.export_service.check_format(output_format)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            
+            if not os.path.exists(self.db_path):
+                return {'error': f'找不到資料庫檔案: {self.db_path}'}, 404
+            
+            with self.pool.connection() as conn:
+                placeholders = ', '.join('?' for _ in eval_ids)
+                found = {row[0] for row in conn.execute(
+                    f"SELECT DISTINCT eval_id FROM eval_results WHERE eval_id IN ({placeholders})", eval_ids
+                )}
+            missing = [eval_id for eval_id in eval_ids if eval_id not in found]
+            if missing:
+                return {'error': f"找不到評估 {', '.join(missing)} 的詳細資料"}, 404
+            
+            if len(eval_ids) == 1:
+                basename = eval_ids[0].replace(':', '-')
+            else:
+                basename = f'evaluations-{len(eval_ids)}'
+            print(f"開始匯出 {len(eval_ids)} 個評估 (format={output_format})")
+            
+            return {
+                'stream': self.export_service.stream(eval_ids, output_format),
+                'filename': f"{basename}.{self.export_service.EXTENSIONS[output_format]}",
+                'mimetype': self.export_service.CONTENT_TYPES[output_format]
+            }, 200
+            
+        except Exception as e:
+            print(f"匯出評估錯誤: {e}")
+            return {'error': str(e)}, 500
+
+    def _parse_page_params(self, params):
+        """解析分頁參數（cursor、limit、view、preview_chars），未提供時回傳 None"""
+        if all(params.get(key) in (None, '') for key in ('cursor', 'limit', 'view')):
+            return None
+        
+        cursor = params.get('cursor')
+        cursor = int(cursor) if cursor not in (None, '') else None
+        if cursor is not None and cursor < 0:
+            raise ValueError('cursor 不可為負數')
+        
+        limit = params.get('limit')
+        limit = int(limit) if limit not in (None, '') else self.DEFAULT_PAGE_SIZE
+        if limit <= 0:
+            raise ValueError('limit 必須大於 0')
+        
+        view = (params.get('view') or 'light').strip().lower()
+        if view not in ('light', 'full'):
+            raise ValueError('view 只能是 light 或 full')
+        
+        preview_chars = params.get('preview_chars')
+        preview_chars = int(preview_chars) if preview_chars not in (None, '') else self.PREVIEW_CHARS
+        if preview_chars <= 0:
+            raise ValueError('preview_chars 必須大於 0')
+        
+        return {
+            'cursor': cursor,
+            'limit': min(limit, self.MAX_PAGE_SIZE),
+            'view': view,
+            'preview_chars': preview_chars
+        }
+
+    def _parse_detail_filters(self, params):
+        """解析詳細結果的篩選條件"""
+        filters = {}
+        
+        status = (params.get('status') or '').strip().upper()
+        if status:
+            if status not in ('PASS', 'FAIL'):
+                raise ValueError('status 只能是 PASS 或 FAIL')
+            filters['status'] = status
+        
+        for key in ('min_score', 'max_score'):
+            value = params.get(key)
+            if value not in (None, ''):
+                number = float(value)
+                if not math.isfinite(number):
+                    raise ValueError(f'{key} 必須是有限的數值')
+                filters[key] = number
+        
+        for key in ('assertion_type', 'plugin', 'strategy'):
+            value = (params.get(key) or '').strip()
+            if value:
+                filters[key] = value
+        
+        return filters
+
+    def _build_detail_filter_sql(self, filters):
+        """將篩選條件轉換為 SQL 條件與參數"""
+        clauses = []
+        sql_params = []
+        
+        if 'status' in filters:
+            clauses.append("success = ?")
+            sql_params.append(1 if filters['status'] == 'PASS' else 0)
+        
+        if 'min_score' in filters:
+            clauses.append("score >= ?")
+            sql_params.append(filters['min_score'])
+        
+        if 'max_score' in filters:
+            clauses.append("score <= ?")
+            sql_params.append(filters['max_score'])
+        
+        if 'assertion_type' in filters:
+            # grading_result 的 componentResults 或 test_case 的 assert 中任一符合即可
+            clauses.append(
+                "(EXISTS (SELECT 1 FROM json_each("
+                "CASE WHEN json_valid(grading_result) THEN grading_result END, '$.componentResults') c "
+                "WHERE json_extract(c.value, '$.assertion.type') = ?) "
+                "OR EXISTS (SELECT 1 FROM json_each("
+                "CASE WHEN json_valid(test_case) THEN test_case END, '$.assert') a "
+                "WHERE json_extract(a.value, '$.type') = ?))"
+            )
+            sql_params.extend([filters['assertion_type'], filters['assertion_type']])
+        
+        if 'plugin' in filters:
+            clauses.append(f"{RedteamService.PLUGIN_EXPR} = ?")
+            sql_params.append(filters['plugin'])
+        
+        if 'strategy' in filters:
+            clauses.append(f"{RedteamService.STRATEGY_EXPR} = ?")
+            sql_params.append(filters['strategy'])
+        
+        sql = ''.join(f" AND {clause}" for clause in clauses)
+        return sql, sql_params
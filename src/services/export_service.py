@@ -0,0 +1,348 @@
+"""評估結果欄位式匯出服務（Parquet / Arrow IPC / CSV）"""
+import csv
+import io
+import json
+import os
+import re
+import urllib.parse
+
+from src.utils.row_decoder import loads_or_none
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 為選用套件，只有 Parquet / Arrow 匯出需要
+    pa = None
+
+
+def _canonical(value):
+    """以鍵排序的 JSON 表示 assertion value，作為比對用的鍵"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False)
+
+
+def _column_name(prefix, name):
+    """將變數或 assertion 名稱轉為欄位名稱"""
+    name = re.sub(r'\W+', '_', str(name)).strip('_') or 'unnamed'
+    return f"{prefix}_{name}"
+
+
+def _assertion_label(assertion):
+    """assertion 的欄位標籤：file:// 函式使用函式名稱，其餘使用 type"""
+    assertion_type = assertion.get('type', 'unknown')
+    value = assertion.get('value')
+    if isinstance(value, str) and value.startswith('file://') and ':' in value[len('file://'):]:
+        return value.rsplit(':', 1)[1]
+    return assertion_type
+
+
+class _ByteSink(io.RawIOBase):
+    """暫存寫入位元組的 file-like 物件，供 pyarrow writer 寫入後逐段取出"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        """取出目前累積的位元組"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportSchema:
+    """匯出欄位定義：固定欄位 + 依資料掃描出的變數欄位與 assertion 欄位"""
+
+    BASE_COLUMNS = [
+        ('eval_id', 'string'),
+        ('row_id', 'int'),
+        ('prompt_idx', 'int'),
+        ('test_idx', 'int'),
+        ('provider', 'string'),
+        ('success', 'bool'),
+        ('score', 'float'),
+        ('latency_ms', 'int'),
+        ('cost', 'float'),
+        ('output', 'string'),
+        ('error', 'string'),
+        ('plugin_id', 'string'),
+        ('strategy_id', 'string'),
+    ]
+
+    def __init__(self, var_keys, assertions):
+        # var_keys: 變數名稱列表；assertions: [(比對鍵, 標籤)]
+        self._used = {name for name, _ in self.BASE_COLUMNS}
+        self.var_columns = {}
+        for key in var_keys:
+            self.var_columns[key] = self._unique(_column_name('var', key))
+
+        self.assertion_columns = {}
+        for assertion_key, label in assertions:
+            score_column = self._unique(_column_name('score', label))
+            self.assertion_columns[assertion_key] = (score_column, 'pass' + score_column[len('score'):])
+
+        self.columns = list(self.BASE_COLUMNS)
+        self.columns += [(column, 'string') for column in self.var_columns.values()]
+        for score_column, pass_column in self.assertion_columns.values():
+            self.columns += [(score_column, 'float'), (pass_column, 'bool')]
+
+    def _unique(self, column):
+        """同名欄位加上序號"""
+        candidate, index = column, 2
+        while candidate in self._used:
+            candidate = f"{column}_{index}"
+            index += 1
+        self._used.add(candidate)
+        return candidate
+
+    @property
+    def names(self):
+        return [name for name, _ in self.columns]
+
+    def arrow_schema(self, include_eval_id=True):
+        """轉換為 pyarrow schema"""
+        types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_()}
+        return pa.schema([
+            (name, types[kind]) for name, kind in self.columns
+            if include_eval_id or name != 'eval_id'
+        ])
+
+
+class ExportService:
+    """以固定大小的區塊讀取 eval_results，攤平成欄位資料並串流輸出"""
+
+    FORMATS = ('parquet', 'arrow', 'csv')
+    CONTENT_TYPES = {
+        'parquet': 'application/vnd.apache.parquet',
+        'arrow': 'application/vnd.apache.arrow.stream',
+        'csv': 'text/csv; charset=utf-8'
+    }
+    EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrows', 'csv': 'csv'}
+    CHUNK_SIZE = 5000
+
+    ROWS_QUERY = """
+        SELECT rowid,
+               eval_id,
+               prompt_idx,
+               test_idx,
+               CASE WHEN json_valid(provider) THEN COALESCE(json_extract(provider, '$.id'), provider) ELSE provider END,
+               success,
+               score,
+               latency_ms,
+               cost,
+               CASE WHEN json_valid(response) THEN json_extract(response, '$.output') ELSE response END,
+               error,
+               CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.pluginId') END,
+               CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.strategyId') END,
+               CASE WHEN json_valid(test_case) THEN json_extract(test_case, '$.vars') END,
+               CASE WHEN json_valid(grading_result) THEN json_extract(grading_result, '$.componentResults') END
+        FROM eval_results
+        WHERE eval_id = ? AND rowid > ?
+        ORDER BY rowid
+        LIMIT ?
+    """
+
+    def __init__(self, pool, chunk_size=None):
+        self.pool = pool
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+    def check_format(self, output_format):
+        """檢查匯出格式是否可用，不可用時拋出 ValueError"""
+        if output_format not in self.FORMATS:
+            raise ValueError(f"format 只能是 {' / '.join(self.FORMATS)}")
+        if output_format != 'csv' and pa is None:
+            raise ValueError(f'{output_format} 匯出需要安裝 pyarrow')
+
+    def build_schema(self, conn, eval_ids):
+        """掃描評估的變數名稱與 assertion，建立所有評估共用的欄位定義"""
+        placeholders = ', '.join('?' for _ in eval_ids)
+        var_keys = [row[0] for row in conn.execute(f"""
+            SELECT j.key
+            FROM eval_results r,
+                 json_each(CASE WHEN json_valid(r.test_case) THEN r.test_case END, '$.vars') j
+            WHERE r.eval_id IN ({placeholders})
+            GROUP BY j.key
+            ORDER BY MIN(r.rowid), MIN(j.id)
+        """, list(eval_ids)).fetchall()]
+
+        assertions = []
+        seen = set()
+        for (assertion_json,) in conn.execute(f"""
+            SELECT json_extract(c.value, '$.assertion')
+            FROM eval_results r,
+                 json_each(CASE WHEN json_valid(r.grading_result) THEN r.grading_result END, '$.componentResults') c
+            WHERE r.eval_id IN ({placeholders})
+            GROUP BY json_extract(c.value, '$.assertion')
+            ORDER BY MIN(r.rowid)
+        """, list(eval_ids)).fetchall():
+            assertion = loads_or_none(assertion_json)
+            if not isinstance(assertion, dict):
+                continue
+            key = (assertion.get('type'), _canonical(assertion.get('value')))
+            if key not in seen:
+                seen.add(key)
+                assertions.append((key, _assertion_label(assertion)))
+
+        return ExportSchema(var_keys, assertions)
+
+    def iter_chunks(self, schema, eval_id):
+        """以 rowid keyset 逐塊讀取單一評估，回傳 {欄位: 值列表} 的區塊
+
+        每塊各自短暫取用連線，產出區塊時不佔用連線池。
+        """
+        last_rowid = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(self.ROWS_QUERY, (eval_id, last_rowid, self.chunk_size)).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+
+            columns = {name: [] for name in schema.names}
+            for row in rows:
+                self._append_row(columns, schema, row)
+            yield columns
+
+    def _append_row(self, columns, schema, row):
+        """將一列攤平後附加到各欄位"""
+        (row_id, eval_id, prompt_idx, test_idx, provider, success, score, latency_ms, cost,
+         output, error, plugin_id, strategy_id, vars_json, components_json) = row
+
+        values = {
+            'eval_id': eval_id,
+            'row_id': row_id,
+            'prompt_idx': prompt_idx,
+            'test_idx': test_idx,
+            'provider': str(provider) if provider is not None else None,
+            'success': bool(success) if success is not None else None,
+            'score': float(score) if score is not None else None,
+            'latency_ms': int(latency_ms) if latency_ms is not None else None,
+            'cost': float(cost) if cost is not None else None,
+            'output': output if isinstance(output, str) or output is None else _canonical(output),
+            'error': error,
+            'plugin_id': str(plugin_id) if plugin_id is not None else None,
+            'strategy_id': str(strategy_id) if strategy_id is not None else None,
+        }
+
+        variables = loads_or_none(vars_json)
+        if isinstance(variables, dict):
+            for key, value in variables.items():
+                column = schema.var_columns.get(key)
+                if column is not None:
+                    values[column] = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+        components = loads_or_none(components_json)
+        if isinstance(components, list):
+            for component in components:
+                assertion = component.get('assertion') if isinstance(component, dict) else None
+                if not isinstance(assertion, dict):
+                    continue
+                key = (assertion.get('type'), _canonical(assertion.get('value')))
+                if key in schema.assertion_columns:
+                    score_column, pass_column = schema.assertion_columns[key]
+                    component_score = component.get('score')
+                    values[score_column] = float(component_score) if component_score is not None else None
+                    values[pass_column] = bool(component.get('pass', False))
+
+        for name, column in columns.items():
+            column.append(values.get(name))
+
+    def stream(self, eval_ids, output_format):
+        """將多個評估串流輸出為單一檔案（含 eval_id 欄位），每個區塊產生一段位元組"""
+        with self.pool.connection() as conn:
+            schema = self.build_schema(conn, eval_ids)
+
+        if output_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(schema.names)
+            for eval_id in eval_ids:
+                for columns in self.iter_chunks(schema, eval_id):
+                    writer.writerows(zip(*columns.values()))
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue().encode('utf-8')
+            return
+
+        arrow_schema = schema.arrow_schema()
+        sink = _ByteSink()
+        if output_format == 'parquet':
+            writer = pq.ParquetWriter(sink, arrow_schema, compression='snappy')
+        else:
+            writer = pa.ipc.new_stream(sink, arrow_schema)
+        try:
+            for eval_id in eval_ids:
+                for columns in self.iter_chunks(schema, eval_id):
+                    writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=arrow_schema))
+                    yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def missing_evals(self, conn, eval_ids):
+        """回傳 evals 表格中不存在的評估 ID（依輸入順序）"""
+        placeholders = ', '.join('?' for _ in eval_ids)
+        found = {row[0] for row in conn.execute(f"SELECT id FROM evals WHERE id IN ({placeholders})", list(eval_ids))}
+        return [eval_id for eval_id in eval_ids if eval_id not in found]
+
+    def write_dataset(self, eval_ids, output_dir, output_format):
+        """將多個評估寫成依 eval_id 分割的資料集（output_dir/eval_id=<id>/part-00000.<ext>）
+
+        各分割使用相同的欄位定義，eval_id 由目錄名稱提供（hive 分割格式），
+        可直接以 pyarrow.dataset.dataset(output_dir, partitioning='hive') 或 pandas 讀取。
+        回傳 [(eval_id, 檔案路徑, 筆數)]；任何評估不存在時拋出 ValueError，不寫入任何檔案。
+        """
+        written = []
+        with self.pool.connection() as conn:
+            missing = self.missing_evals(conn, eval_ids)
+            if missing:
+                raise ValueError(f"找不到評估 {', '.join(missing)}")
+            schema = self.build_schema(conn, eval_ids)
+
+        arrow_schema = schema.arrow_schema(include_eval_id=False) if output_format != 'csv' else None
+        names = [name for name in schema.names if name != 'eval_id']
+
+        for eval_id in eval_ids:
+            partition = os.path.join(output_dir, 'eval_id=' + urllib.parse.quote(eval_id, safe=''))
+            os.makedirs(partition, exist_ok=True)
+            path = os.path.join(partition, f"part-00000.{self.EXTENSIONS[output_format]}")
+            row_count = 0
+
+            if output_format == 'csv':
+                with open(path, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(names)
+                    for columns in self.iter_chunks(schema, eval_id):
+                        columns.pop('eval_id')
+                        writer.writerows(zip(*columns.values()))
+                        row_count += len(columns['row_id'])
+            else:
+                with open(path, 'wb') as f:
+                    if output_format == 'parquet':
+                        writer = pq.ParquetWriter(f, arrow_schema, compression='snappy')
+                    else:
+                        writer = pa.ipc.new_stream(f, arrow_schema)
+                    try:
+                        for columns in self.iter_chunks(schema, eval_id):
+                            columns.pop('eval_id')
+                            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=arrow_schema))
+                            row_count += len(columns['row_id'])
+                    finally:
+                        writer.close()
+
+            written.append((eval_id, path, row_count))
+        return written
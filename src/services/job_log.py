@@ -0,0 +1,155 @@
+"""執行工作的即時輸出紀錄與進度解析"""
+import re
+import threading
+from collections import deque
+
+
+class ProgressTracker:
+    """從 promptfoo eval 的輸出解析測試進度（已完成 / 總數）
+
+    支援的格式：
+        Running 20 test cases (up to 4 at a time)...     總數
+        Evaluating [████░░░░] 45% | ETA: 12s | 9/20       進度列（非 TTY 時以 \\r 分隔）
+        [9/20] ...                                          逐筆進度
+        Successes: 18 / Failures: 2 / Errors: 0             結束時的統計
+    """
+
+    TOTAL_PATTERN = re.compile(r'Running (\d+) (?:test cases?|evaluations?)')
+    PROGRESS_PATTERNS = (
+        re.compile(r'\|\s*(\d+)\s*/\s*(\d+)\b'),
+        re.compile(r'\[(\d+)\s*/\s*(\d+)\]'),
+    )
+    SUMMARY_PATTERN = re.compile(r'^\s*(Successes|Failures|Errors):\s*(\d+)', re.IGNORECASE)
+
+    def __init__(self):
+        self.completed = 0
+        self.total = None
+        self._summary = {}
+
+    def feed(self, line):
+        """解析一行輸出，進度有變化時回傳 True"""
+        before = (self.completed, self.total)
+
+        match = self.TOTAL_PATTERN.search(line)
+        if match:
+            self.total = int(match.group(1))
+
+        for pattern in self.PROGRESS_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                completed, total = int(match.group(1)), int(match.group(2))
+                if total and completed <= total:
+                    self.completed = max(self.completed, completed)
+                    self.total = total
+                break
+
+        match = self.SUMMARY_PATTERN.match(line)
+        if match:
+            self._summary[match.group(1).lower()] = int(match.group(2))
+            finished = sum(self._summary.values())
+            self.completed = max(self.completed, finished)
+            if self.total is None or self.total < finished:
+                self.total = finished
+
+        return (self.completed, self.total) != before
+
+    def snapshot(self):
+        percent = None
+        if self.total:
+            percent = round(min(self.completed / self.total, 1.0) * 100, 1)
+        return {'completed': self.completed, 'total': self.total, 'percent': percent}
+
+
+class ShardProgress:
+    """分片執行的整體進度：各分片的輸出行以 "[shard N] " 開頭，分別解析後加總"""
+
+    PREFIX_PATTERN = re.compile(r'^\[shard (\d+)\] ')
+
+    def __init__(self, shard_rows=None):
+        # shard_rows: {分片編號: 測試列數}，分片尚未輸出總數前以列數估計；
+        # 為 None 時（例如從輸出檔回放）依輸出中出現的分片建立進度
+        self.shard_rows = dict(shard_rows) if shard_rows is not None else None
+        self._trackers = {index: ProgressTracker() for index in self.shard_rows or {}}
+
+    def feed(self, line):
+        match = self.PREFIX_PATTERN.match(line)
+        if not match:
+            return False
+        index = int(match.group(1))
+        if index not in self._trackers:
+            if self.shard_rows is not None:
+                return False
+            self._trackers[index] = ProgressTracker()
+        return self._trackers[index].feed(line[match.end():])
+
+    def reset(self, index):
+        """分片重試時重新計算該分片的進度"""
+        self._trackers[index] = ProgressTracker()
+
+    def snapshot(self):
+        completed = sum(tracker.completed for tracker in self._trackers.values())
+        total = sum(tracker.total or (self.shard_rows or {}).get(index, 0)
+                    for index, tracker in self._trackers.items())
+        percent = round(min(completed / total, 1.0) * 100, 1) if total else None
+        return {'completed': completed, 'total': total, 'percent': percent}
+
+
+class JobLog:
+    """單一工作的輸出環狀緩衝區
+
+    只保留最近 max_lines 行（每行最多 max_line_length 字元），每行帶有遞增的序號，
+    讀取端以序號接續讀取；被擠出緩衝區的行數會回報為 dropped。
+    """
+
+    def __init__(self, max_lines=2000, max_line_length=4000, progress=None):
+        self.max_line_length = max_line_length
+        self._lines = deque(maxlen=max_lines)
+        self._next_seq = 1
+        self._condition = threading.Condition()
+        self.progress = progress or ProgressTracker()
+        self.finished = False
+
+    def append(self, stream, line):
+        if len(line) > self.max_line_length:
+            line = line[:self.max_line_length] + '…'
+        with self._condition:
+            self._lines.append((self._next_seq, stream, line))
+            self._next_seq += 1
+            self.progress.feed(line)
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def read(self, after_seq=0, timeout=None):
+        """回傳 (序號大於 after_seq 的行, 被擠出而遺失的行數, 進度, 是否已結束)
+
+        沒有新資料且尚未結束時最多等待 timeout 秒。
+        """
+        with self._condition:
+            if self._next_seq - 1 <= after_seq and not self.finished and timeout:
+                self._condition.wait(timeout)
+            lines = [entry for entry in self._lines if entry[0] > after_seq]
+            first_seq = self._lines[0][0] if self._lines else self._next_seq
+            dropped = max(0, first_seq - after_seq - 1)
+            return lines, dropped, self.progress.snapshot(), self.finished
+
+
+class CombinedOutput:
+    """分片執行時將各分片（加上 "[shard N] " 前綴）與匯入步驟的輸出逐行寫入工作的 .out / .err"""
+
+    def __init__(self, stdout_path, stderr_path):
+        self._files = {'stdout': open(stdout_path, 'wb'), 'stderr': open(stderr_path, 'wb')}
+        self._lock = threading.Lock()
+
+    def write(self, stream, line):
+        with self._lock:
+            f = self._files[stream]
+            f.write(line.encode('utf-8') + b'\n')
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
@@ -0,0 +1,820 @@
+"""評估執行工作佇列服務"""
+import json
+import os
+import re
+import shlex
+import shutil
+import signal
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import closing
+from pathlib import Path
+from src.services.output_cache_service import OutputCacheService
+from src.services.job_log import CombinedOutput, JobLog, ProgressTracker, ShardProgress
+from src.services.run_scheduler import PRIORITIES, PRIORITY_NAMES, RunScheduler, config_provider_keys
+from src.services.shard_service import SHARD_OUTPUT, ShardService
+from src.services.summary_service import format_created_time
+
+LINE_SPLIT_PATTERN = re.compile(rb'\r\n|\r|\n')
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _sse(event, data, event_id=None):
+    """格式化一則 Server-Sent Event"""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _quote(value):
+    return subprocess.list2cmdline([value]) if os.name == 'nt' else shlex.quote(value)
+
+
+def _read_tail(path, limit):
+    """讀取檔案最後 limit 個位元組（檔案不存在時回傳空字串）"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - limit))
+            return f.read().decode('utf-8', errors='replace')
+    except OSError:
+        return ''
+
+
+class JobService:
+    """以 SQLite 保存的評估工作佇列，由固定數量的背景執行緒執行 promptfoo eval
+
+    工作狀態依序為 queued → running → succeeded / failed（或 cancelled），
+    佇列保存在 sidecar SQLite，伺服器重新啟動後會繼續執行尚未開始的工作。
+    工作以條件式 UPDATE 認領，多個行程（例如 Flask debug reloader）共用同一份佇列也不會重複執行；
+    執行中的工作定期更新心跳，心跳逾時（執行的行程已結束）的工作會標記為失敗。
+    下一個執行的工作由 RunScheduler 依全域與各 provider 併發上限、優先等級與使用者公平性挑選，
+    並記錄每個工作的排隊時間（wait_ms）與執行時間（run_ms）。
+    shards 大於 1 的工作將 CSV 測試切成多個分片平行執行（見 ShardService），失敗的分片會重試，
+    全部完成後合併為單一評估並以 promptfoo import 寫入。
+    incremental 工作只對輸入或設定有變更的測試列呼叫 provider，其餘列以快取的輸出重新評分（見 OutputCacheService）。
+    命令輸出寫入 logs_dir 下的 <job_id>.out / .err，同時逐行放入記憶體中的環狀緩衝區供 SSE 即時串流。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            config_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            started_at INTEGER,
+            finished_at INTEGER,
+            heartbeat_at INTEGER,
+            timeout REAL,
+            pid INTEGER,
+            return_code INTEGER,
+            message TEXT,
+            error TEXT,
+            priority INTEGER NOT NULL DEFAULT 1,
+            user TEXT,
+            providers TEXT,
+            wait_ms INTEGER,
+            run_ms INTEGER,
+            shards INTEGER NOT NULL DEFAULT 1,
+            incremental INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+    """
+
+    # 舊版佇列資料庫缺少的欄位
+    MIGRATIONS = (
+        ('priority', "INTEGER NOT NULL DEFAULT 1"),
+        ('user', "TEXT"),
+        ('providers', "TEXT"),
+        ('wait_ms', "INTEGER"),
+        ('run_ms', "INTEGER"),
+        ('shards', "INTEGER NOT NULL DEFAULT 1"),
+        ('incremental', "INTEGER NOT NULL DEFAULT 0"),
+    )
+
+    STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+    FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+    HEARTBEAT_INTERVAL = 5.0
+    # 超過此秒數未更新心跳的執行中工作視為已中斷
+    STALE_AFTER = 60.0
+    POLL_INTERVAL = 5.0
+    OUTPUT_TAIL_BYTES = 256 * 1024
+    # 每個工作在記憶體中保留的輸出行數，以及保留已結束工作緩衝區的數量
+    LOG_MAX_LINES = 2000
+    FINISHED_LOG_RETENTION = 20
+    # 未換行的輸出超過此長度時強制視為一行
+    MAX_PENDING_BYTES = 64 * 1024
+    STREAM_KEEPALIVE = 15.0
+    SHARD_POLL_INTERVAL = 0.5
+    # 從輸出檔接續讀取其他行程執行中工作的間隔
+    TAIL_INTERVAL = 0.5
+
+    def __init__(self, execution_service, db_path='results/jobs.db', logs_dir='results/jobs',
+                 max_workers=None, default_timeout=None, max_running=None):
+        self.execution_service = execution_service
+        self.db_path = db_path
+        self.logs_dir = Path(logs_dir)
+        self.max_workers = max_workers or int(os.environ.get('PROMPTLAB_JOB_WORKERS', '2'))
+        if default_timeout is None and os.environ.get('PROMPTLAB_JOB_TIMEOUT'):
+            default_timeout = float(os.environ['PROMPTLAB_JOB_TIMEOUT'])
+        self.default_timeout = default_timeout
+        # 全域併發上限以資料庫中執行中的工作計算，多個行程共用佇列時同樣有效
+        max_running = max_running or int(os.environ.get('PROMPTLAB_MAX_RUNNING', '0')) or self.max_workers
+        self.scheduler = RunScheduler(max_running)
+        self.shard_service = ShardService()
+        self.output_cache = OutputCacheService(os.path.join(os.path.dirname(self.db_path), 'output_cache.db'))
+        # 同一工作同時執行的分片數（受 provider 的速率限制，不宜過大）與每個分片的重試次數
+        self.shard_parallel = int(os.environ.get('PROMPTLAB_SHARD_PARALLEL', '4'))
+        self.shard_retries = int(os.environ.get('PROMPTLAB_SHARD_RETRIES', '1'))
+
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads = []
+        # 本行程執行中的工作: job_id -> [Popen]，以及已要求取消的工作
+        self._processes = {}
+        self._cancelled = set()
+        self._logs = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(self.SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in self.MIGRATIONS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        with closing(self._connect()) as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+    def _log_paths(self, job_id):
+        return self.logs_dir / f"{job_id}.out", self.logs_dir / f"{job_id}.err"
+
+    def _serialize(self, row, include_output=False):
+        now = _now_ms()
+        started_at, finished_at = row['started_at'], row['finished_at']
+        wait_ms = row['wait_ms'] if row['wait_ms'] is not None else (started_at or finished_at or now) - row['created_at']
+        run_ms = row['run_ms']
+        if run_ms is None and started_at:
+            run_ms = (finished_at or now) - started_at
+        job = {
+            'job_id': row['id'],
+            'config_id': row['config_id'],
+            'status': row['status'],
+            'created_at': format_created_time(row['created_at']),
+            'started_at': format_created_time(started_at) if started_at else None,
+            'finished_at': format_created_time(finished_at) if finished_at else None,
+            'wait_seconds': round(wait_ms / 1000, 1),
+            'run_seconds': round(run_ms / 1000, 1) if run_ms is not None else None,
+            'priority': PRIORITY_NAMES.get(row['priority'], row['priority']),
+            'user': row['user'],
+            'pid': row['pid'],
+            'providers': json.loads(row['providers'] or '[]'),
+            'shards': row['shards'],
+            'incremental': bool(row['incremental']),
+            'timeout': row['timeout'],
+            'return_code': row['return_code'],
+            'message': row['message'],
+            'error': row['error']
+        }
+        log = self._logs.get(row['id'])
+        if log is not None:
+            job['progress'] = log.progress.snapshot()
+        if include_output:
+            stdout_path, stderr_path = self._log_paths(row['id'])
+            job['output'] = _read_tail(stdout_path, self.OUTPUT_TAIL_BYTES)
+            job['error_output'] = _read_tail(stderr_path, self.OUTPUT_TAIL_BYTES)
+        return job
+
+    def submit(self, config_id, options=None):
+        """建立工作並立即回傳工作資訊（202）"""
+        try:
+            config_dir, error = self.execution_service.resolve_config_dir(config_id)
+            if error:
+                return error
+
+            options = options or {}
+            priority = options.get('priority') or 'normal'
+            if priority not in PRIORITIES:
+                return {'error': f"priority 必須是 {', '.join(PRIORITIES)} 之一"}, 400
+            user = str(options.get('user') or 'anonymous')[:100]
+            shards, error = self.shard_service.resolve_shards(config_dir, options.get('shards'))
+            if error:
+                return {'error': error}, 400
+            incremental = options.get('incremental', False)
+            if isinstance(incremental, str):
+                incremental = incremental.lower() in ('1', 'true', 'yes')
+            timeout = options.get('timeout', self.default_timeout)
+            try:
+                timeout = float(timeout) if timeout not in (None, '') else None
+            except (TypeError, ValueError):
+                return {'error': 'timeout 必須是秒數'}, 400
+            if timeout is not None and timeout <= 0:
+                return {'error': 'timeout 必須大於 0'}, 400
+
+            job_id = uuid.uuid4().hex
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, config_id, status, created_at, timeout, priority, user, providers, shards, "
+                    "incremental) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, config_id, _now_ms(), timeout, PRIORITIES[priority], user,
+                     json.dumps(config_provider_keys(config_dir)), shards, int(bool(incremental)))
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._wake.set()
+            print(f"已排入執行佇列: {config_id} (job {job_id})")
+            return self._serialize(row), 202
+
+        except Exception as e:
+            print(f"建立執行工作錯誤: {e}")
+            return {'error': f'建立執行工作失敗: {str(e)}'}, 500
+
+    def get_job(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return {'error': f'找不到工作 {job_id}'}, 404
+        return self._serialize(row, include_output=True), 200
+
+    def list_jobs(self, params=None):
+        """列出工作（不含輸出），可依 status / config_id / user 篩選"""
+        params = params or {}
+        status = params.get('status')
+        if status and status not in self.STATUSES:
+            return {'error': f"status 必須是 {', '.join(self.STATUSES)} 之一"}, 400
+        try:
+            limit = min(max(int(params.get('limit', 50)), 1), 500)
+        except (TypeError, ValueError):
+            return {'error': 'limit 必須是整數'}, 400
+
+        where, args = [], []
+        if status:
+            where.append("status = ?")
+            args.append(status)
+        for column in ('config_id', 'user'):
+            if params.get(column):
+                where.append(f"{column} = ?")
+                args.append(params[column])
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs {clause} ORDER BY created_at DESC LIMIT ?", [*args, limit]
+            ).fetchall()
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            stats = conn.execute(
+                "SELECT AVG(wait_ms), MAX(wait_ms), AVG(run_ms), MAX(run_ms) FROM jobs WHERE run_ms IS NOT NULL"
+            ).fetchone()
+        return {
+            'jobs': [self._serialize(row) for row in rows],
+            'counts': {status: counts.get(status, 0) for status in self.STATUSES},
+            'workers': self.max_workers,
+            'scheduler': self.scheduler.describe(),
+            'timing': {
+                'avg_wait_seconds': round(stats[0] / 1000, 1) if stats[0] is not None else None,
+                'max_wait_seconds': round(stats[1] / 1000, 1) if stats[1] is not None else None,
+                'avg_run_seconds': round(stats[2] / 1000, 1) if stats[2] is not None else None,
+                'max_run_seconds': round(stats[3] / 1000, 1) if stats[3] is not None else None
+            }
+        }, 200
+
+    def cancel_job(self, job_id):
+        """取消排隊中的工作，或終止本行程中執行中的工作"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, message = '已取消' "
+                "WHERE id = ? AND status = 'queued'",
+                (_now_ms(), job_id)
+            )
+            if cursor.rowcount:
+                return self.get_job(job_id)
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return {'error': f'找不到工作 {job_id}'}, 404
+        if row['status'] != 'running':
+            return {'error': f"工作已結束（{row['status']}）"}, 409
+
+        with self._lock:
+            processes = self._processes.get(job_id)
+            if processes is None:
+                return {'error': '工作由其他行程執行中，無法取消'}, 409
+            self._cancelled.add(job_id)
+        for process in processes:
+            self._terminate(process)
+        return {'job_id': job_id, 'status': 'running', 'message': '已要求取消'}, 202
+
+    def start(self):
+        """標記中斷的工作並啟動背景工作執行緒"""
+        if self._threads:
+            return
+        self._recover_stale()
+        self._stop_event.clear()
+        for index in range(self.max_workers):
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"評估執行佇列已啟動（{self.max_workers} 個工作執行緒）")
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _recover_stale(self):
+        """心跳逾時的執行中工作標記為失敗"""
+        now = _now_ms()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = '執行中斷（伺服器已停止或重新啟動）' "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (now, now - int(self.STALE_AFTER * 1000))
+            )
+        if cursor.rowcount:
+            print(f"已將 {cursor.rowcount} 個中斷的工作標記為失敗")
+
+    def _claim(self):
+        """依排程規則認領下一個工作，沒有可執行的工作時回傳 None"""
+        with closing(self._connect()) as conn:
+            # 以寫入鎖包住挑選與認領，其他執行緒或行程不會同時依相同的執行中數量做決定
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = conn.execute("SELECT * FROM jobs WHERE status = 'queued'").fetchall()
+                if not queued:
+                    return None
+                running = conn.execute("SELECT * FROM jobs WHERE status = 'running'").fetchall()
+                last_started = dict(conn.execute(
+                    "SELECT user, MAX(started_at) FROM jobs WHERE started_at IS NOT NULL GROUP BY user"
+                ).fetchall())
+                row = self.scheduler.pick(queued, running, last_started)
+                if row is None:
+                    return None
+                now = _now_ms()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, pid = ?, wait_ms = ? "
+                    "WHERE id = ?",
+                    (now, now, os.getpid(), now - row['created_at'], row['id'])
+                )
+                return row
+            finally:
+                conn.execute("COMMIT")
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._recover_stale()
+                    self._wake.wait(self.POLL_INTERVAL)
+                    self._wake.clear()
+                    continue
+                self._execute(job)
+            except Exception as e:
+                print(f"執行佇列錯誤: {e}")
+                self._stop_event.wait(self.POLL_INTERVAL)
+
+    def _execute(self, job):
+        job_id, config_id = job['id'], job['config_id']
+        try:
+            config_dir, error = self.execution_service.resolve_config_dir(config_id)
+            if error:
+                self._finish(job_id, 'failed', error=error[0]['error'])
+                return
+            if (job['shards'] or 1) > 1 or job['incremental']:
+                self._execute_sharded(job, config_dir)
+                return
+            eval_cmd, options = self.execution_service.build_command(config_dir)
+            if eval_cmd is None:
+                self._finish(job_id, 'failed', error=options)
+                return
+
+            print(f"開始執行配置: {config_id} (job {job_id})")
+            self.logs_dir.mkdir(parents=True, exist_ok=True)
+            stdout_path, stderr_path = self._log_paths(job_id)
+            log = self._register_log(job_id)
+            try:
+                process = subprocess.Popen(
+                    eval_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                    # 以獨立的 process group 執行，終止時可連同 promptfoo 子行程一起結束
+                    start_new_session=(os.name != 'nt'), **options
+                )
+                pumps = [
+                    threading.Thread(target=self._pump, args=(process.stdout, stdout_path, 'stdout', log), daemon=True),
+                    threading.Thread(target=self._pump, args=(process.stderr, stderr_path, 'stderr', log), daemon=True)
+                ]
+                for pump in pumps:
+                    pump.start()
+                with self._lock:
+                    self._processes[job_id] = [process]
+                timed_out = self._wait(job_id, process, job['timeout'])
+                for pump in pumps:
+                    pump.join()
+                with self._lock:
+                    self._processes.pop(job_id, None)
+                    cancelled = job_id in self._cancelled
+                    self._cancelled.discard(job_id)
+            finally:
+                log.close()
+
+            output = _read_tail(stdout_path, self.OUTPUT_TAIL_BYTES)
+            error_output = _read_tail(stderr_path, self.OUTPUT_TAIL_BYTES)
+            if cancelled:
+                self._finish(job_id, 'cancelled', return_code=process.returncode, message='已取消')
+            elif timed_out:
+                self._finish(job_id, 'failed', return_code=process.returncode,
+                             error=f"配置執行超時（{job['timeout']:g} 秒）")
+            else:
+                result, status_code = self.execution_service.evaluate_result(
+                    config_id, process.returncode, output, error_output
+                )
+                if status_code == 200:
+                    self._finish(job_id, 'succeeded', return_code=process.returncode, message=result['message'])
+                else:
+                    self._finish(job_id, 'failed', return_code=process.returncode, error=result['error'])
+            print(f"配置執行結束: {config_id} (job {job_id})，返回碼 {process.returncode}")
+
+        except FileNotFoundError:
+            self._finish(job_id, 'failed', error='找不到 promptfoo 命令，請確保已安裝 promptfoo')
+        except Exception as e:
+            print(f"配置執行錯誤: {e}")
+            self._finish(job_id, 'failed', error=f'配置執行失敗: {str(e)}')
+
+    def _execute_sharded(self, job, config_dir):
+        """分片平行執行（增量執行時另有一個以快取輸出重新評分的分片），全部分片成功後合併並匯入為單一評估"""
+        job_id, config_id = job['id'], job['config_id']
+        work_dir = self.logs_dir / f"{job_id}-shards"
+        plan = self.shard_service.prepare(config_dir, str(work_dir), job['shards'],
+                                          output_cache=self.output_cache if job['incremental'] else None)
+        if not plan:
+            self._finish(job_id, 'failed', error='配置沒有可分片執行的測試')
+            return
+        print(f"開始分片執行配置: {config_id} (job {job_id})，{len(plan)} 個分片")
+
+        progress = ShardProgress({shard['index']: shard['rows'] for shard in plan})
+        log = self._register_log(job_id, progress)
+        # 執行期間即寫入工作的 .out / .err，其他行程的串流可以從檔案接續讀取
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        combined = CombinedOutput(*self._log_paths(job_id))
+
+        def note(line):
+            log.append('stdout', line)
+            combined.write('stdout', line)
+
+        summary = f"{len(plan)} 個分片"
+        if job['incremental']:
+            cached_rows = sum(shard['rows'] for shard in plan if shard['cached'])
+            fresh_rows = sum(shard['rows'] for shard in plan if not shard['cached'])
+            summary = f"增量執行：{cached_rows} 列使用快取輸出重新評分，{fresh_rows} 列重新呼叫 provider"
+            note(summary)
+        # 分片與匯入共用工作的逾時時間
+        deadline = time.monotonic() + job['timeout'] if job['timeout'] else None
+        try:
+            error = self._run_shards(job, plan, log, progress, combined, deadline)
+            cancelled = job_id in self._cancelled
+            if error is None and not cancelled:
+                for shard in plan:
+                    if shard['provider_labels'] is not None and not shard['cached']:
+                        self.output_cache.populate(shard['output'], shard['provider_labels'])
+                merged = self.shard_service.merge(plan, config_dir)
+                merged_path = work_dir / 'merged.json'
+                with open(merged_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, ensure_ascii=False)
+                note(f"已合併 {len(plan)} 個分片（{len(merged['results']['results'])} 筆結果），匯入評估 {merged['evalId']}")
+                error = self._run_import(job, config_dir, merged_path, work_dir, log, combined, deadline)
+                cancelled = job_id in self._cancelled
+        finally:
+            with self._lock:
+                self._processes.pop(job_id, None)
+                self._cancelled.discard(job_id)
+            log.close()
+            combined.close()
+
+        if cancelled:
+            self._finish(job_id, 'cancelled', message='已取消')
+            shutil.rmtree(work_dir, ignore_errors=True)
+        elif error:
+            # 保留分片目錄供檢查
+            self._finish(job_id, 'failed', error=error)
+        else:
+            self._finish(job_id, 'succeeded', return_code=0,
+                         message=f"配置執行成功（{summary}，評估 {merged['evalId']}）")
+            shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"分片執行結束: {config_id} (job {job_id})")
+
+    def _run_shards(self, job, plan, log, progress, combined, deadline):
+        """平行執行分片並重試失敗的分片，成功時回傳 None，否則回傳錯誤訊息"""
+        job_id = job['id']
+        pending, running, attempts = deque(plan), {}, {}
+        parallel = max(1, min(self.shard_parallel, len(plan), self._provider_parallel(job)))
+        last_heartbeat = time.monotonic()
+        try:
+            while pending or running:
+                if job_id in self._cancelled:
+                    return None
+                if deadline is not None and time.monotonic() >= deadline:
+                    return f"配置執行超時（{job['timeout']:g} 秒）"
+
+                while pending and len(running) < parallel:
+                    shard = pending.popleft()
+                    index = shard['index']
+                    attempts[index] = attempts.get(index, 0) + 1
+                    if os.path.exists(shard['output']):
+                        os.remove(shard['output'])
+                    progress.reset(index)
+                    command, options = self.execution_service.build_command(
+                        shard['dir'], f'eval --no-write -o {SHARD_OUTPUT}'
+                    )
+                    if command is None:
+                        return options
+                    process = subprocess.Popen(
+                        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                        start_new_session=(os.name != 'nt'), **options
+                    )
+                    prefix = f"[shard {index}] "
+                    pumps = [
+                        threading.Thread(target=self._pump, daemon=True, args=(
+                            process.stdout, os.path.join(shard['dir'], 'stdout.log'), 'stdout', log, prefix, 'ab',
+                            combined)),
+                        threading.Thread(target=self._pump, daemon=True, args=(
+                            process.stderr, os.path.join(shard['dir'], 'stderr.log'), 'stderr', log, prefix, 'ab',
+                            combined))
+                    ]
+                    for pump in pumps:
+                        pump.start()
+                    running[index] = (process, pumps, shard)
+                    with self._lock:
+                        self._processes[job_id] = [entry[0] for entry in running.values()]
+
+                time.sleep(self.SHARD_POLL_INTERVAL)
+                for index, (process, pumps, shard) in list(running.items()):
+                    if process.poll() is None:
+                        continue
+                    for pump in pumps:
+                        pump.join()
+                    del running[index]
+                    with self._lock:
+                        self._processes[job_id] = [entry[0] for entry in running.values()]
+                    # promptfoo 在有測試未通過時也會以非 0 返回碼結束，以是否產生輸出檔判斷分片是否完成
+                    if os.path.exists(shard['output']):
+                        continue
+                    if job_id in self._cancelled:
+                        return None
+                    if attempts[index] <= self.shard_retries:
+                        message = f"[shard {index}] 執行失敗（返回碼 {process.returncode}），重試第 {attempts[index]} 次"
+                        log.append('stderr', message)
+                        combined.write('stderr', message)
+                        pending.append(shard)
+                    else:
+                        return f"分片 {index} 執行失敗（返回碼 {process.returncode}，已重試 {self.shard_retries} 次）"
+
+                if time.monotonic() - last_heartbeat >= self.HEARTBEAT_INTERVAL:
+                    self._update(job_id, heartbeat_at=_now_ms())
+                    last_heartbeat = time.monotonic()
+            return None
+        finally:
+            # 超時、取消或有分片失敗時終止其餘分片
+            for process, pumps, _ in running.values():
+                if process.poll() is None:
+                    self._terminate(process)
+                for pump in pumps:
+                    pump.join()
+
+    def _provider_parallel(self, job):
+        """同一工作的分片各自呼叫相同的 provider：PROMPTLAB_PROVIDER_LIMITS 明確設定了上限的 provider，
+        同時執行的分片數不超過其中最小的上限；未設定時（預設上限只限制每個 provider 同時執行的工作數）不另外限制
+        """
+        limits = [self.scheduler.explicit_provider_limit(key) for key in json.loads(job['providers'] or '[]')]
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else self.shard_parallel
+
+    def _run_import(self, job, config_dir, merged_path, work_dir, log, combined, deadline):
+        """以 promptfoo import 匯入合併後的結果，成功時回傳 None"""
+        command, options = self.execution_service.build_command(
+            config_dir, f'import {_quote(str(merged_path.resolve()))}'
+        )
+        if command is None:
+            return options
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+            start_new_session=(os.name != 'nt'), **options
+        )
+        pumps = [
+            threading.Thread(target=self._pump, daemon=True,
+                             args=(process.stdout, work_dir / 'import.out.log', 'stdout', log, '', 'wb', combined)),
+            threading.Thread(target=self._pump, daemon=True,
+                             args=(process.stderr, work_dir / 'import.err.log', 'stderr', log, '', 'wb', combined))
+        ]
+        for pump in pumps:
+            pump.start()
+        with self._lock:
+            self._processes[job['id']] = [process]
+        timeout = max(deadline - time.monotonic(), 0.001) if deadline is not None else None
+        timed_out = self._wait(job['id'], process, timeout)
+        for pump in pumps:
+            pump.join()
+        if timed_out:
+            return f"匯入結果超時（{job['timeout']:g} 秒）"
+        if process.returncode != 0:
+            return f'匯入合併結果失敗（返回碼 {process.returncode}）'
+        return None
+
+    def _register_log(self, job_id, progress=None):
+        """建立工作的輸出緩衝區，並移除超過保留數量的已結束工作緩衝區"""
+        log = JobLog(max_lines=self.LOG_MAX_LINES, progress=progress)
+        with self._lock:
+            self._logs[job_id] = log
+            finished = [key for key, value in self._logs.items() if value.finished]
+            for key in finished[:max(0, len(finished) - self.FINISHED_LOG_RETENTION)]:
+                del self._logs[key]
+        return log
+
+    def _pump(self, pipe, path, stream, log, prefix='', mode='wb', combined=None):
+        """將命令輸出寫入檔案，並逐行（\n 或 \r 分隔）加上 prefix 放入緩衝區（以及 combined）"""
+        pending = b''
+        with open(path, mode) as f, pipe:
+            while True:
+                chunk = pipe.read1(65536)
+                if not chunk:
+                    break
+                f.write(chunk)
+                f.flush()
+                parts = LINE_SPLIT_PATTERN.split(pending + chunk)
+                pending = parts.pop()
+                if len(pending) > self.MAX_PENDING_BYTES:
+                    parts.append(pending)
+                    pending = b''
+                for part in parts:
+                    if part.strip():
+                        self._emit(stream, prefix + part.decode('utf-8', errors='replace'), log, combined)
+        if pending.strip():
+            self._emit(stream, prefix + pending.decode('utf-8', errors='replace'), log, combined)
+
+    def _emit(self, stream, line, log, combined):
+        log.append(stream, line)
+        if combined is not None:
+            combined.write(stream, line)
+
+    def stream_job(self, job_id, after_seq=0):
+        """以 Server-Sent Events 串流工作輸出與進度，回傳 (事件產生器, 200) 或 (錯誤, 狀態碼)"""
+        job, status_code = self.get_job(job_id)
+        if status_code != 200:
+            return job, status_code
+
+        def events():
+            yield _sse('status', self._summary(job))
+            # 緩衝區只存在於執行工作的行程；排隊中或本行程已認領但尚未建立緩衝區時等待
+            while True:
+                log = self._logs.get(job_id)
+                if log is not None:
+                    break
+                current, _ = self.get_job(job_id)
+                owned = current['status'] == 'running' and current.get('pid') == os.getpid()
+                if current['status'] != 'queued' and not owned:
+                    yield from self._tail(current)
+                    return
+                yield ': keep-alive\n\n'
+                self._stop_event.wait(1.0)
+
+            seq, last_progress = after_seq, None
+            last_sent = time.monotonic()
+            while True:
+                lines, dropped, progress, finished = log.read(seq, timeout=1.0)
+                if dropped:
+                    yield _sse('dropped', {'count': dropped})
+                for line_seq, stream, line in lines:
+                    yield _sse('log', {'stream': stream, 'line': line}, line_seq)
+                    seq = line_seq
+                if progress != last_progress:
+                    yield _sse('progress', progress)
+                    last_progress = progress
+                if lines or dropped:
+                    last_sent = time.monotonic()
+                if finished and not lines:
+                    break
+                if time.monotonic() - last_sent >= self.STREAM_KEEPALIVE:
+                    yield ': keep-alive\n\n'
+                    last_sent = time.monotonic()
+
+            # 等待工作狀態寫入資料庫
+            final = self._wait_finished(job_id)
+            yield _sse('status', self._summary(final))
+
+        return events(), 200
+
+    def _summary(self, job):
+        return {key: value for key, value in job.items() if key not in ('output', 'error_output')}
+
+    def _tail(self, job):
+        """工作由其他行程執行（或緩衝區已清除）時，從磁碟上的輸出檔接續讀取，直到工作結束"""
+        job_id = job['job_id']
+        sharded = (job.get('shards') or 1) > 1 or job.get('incremental')
+        progress = ShardProgress() if sharded else ProgressTracker()
+        files = dict(zip(('stdout', 'stderr'), self._log_paths(job_id)))
+        offsets = {stream: 0 for stream in files}
+        pending = {stream: b'' for stream in files}
+        last_progress, last_sent = None, time.monotonic()
+        while True:
+            finished = job['status'] in self.FINISHED_STATUSES
+            sent = False
+            for stream, path in files.items():
+                try:
+                    with open(path, 'rb') as f:
+                        f.seek(offsets[stream])
+                        chunk = f.read()
+                except OSError:
+                    continue
+                offsets[stream] += len(chunk)
+                parts = LINE_SPLIT_PATTERN.split(pending[stream] + chunk)
+                pending[stream] = parts.pop()
+                # 工作已結束時輸出不會再增加，剩餘未換行的部分也送出
+                if finished or len(pending[stream]) > self.MAX_PENDING_BYTES:
+                    parts.append(pending[stream])
+                    pending[stream] = b''
+                for part in parts:
+                    line = part.decode('utf-8', errors='replace')
+                    if line.strip():
+                        progress.feed(line)
+                        yield _sse('log', {'stream': stream, 'line': line})
+                        sent = True
+            snapshot = progress.snapshot()
+            if snapshot != last_progress:
+                yield _sse('progress', snapshot)
+                last_progress = snapshot
+            if finished:
+                break
+            if sent:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= self.STREAM_KEEPALIVE:
+                yield ': keep-alive\n\n'
+                last_sent = time.monotonic()
+            self._stop_event.wait(self.TAIL_INTERVAL)
+            job, _ = self.get_job(job_id)
+        yield _sse('status', self._summary(job))
+
+    def _wait_finished(self, job_id, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            job, _ = self.get_job(job_id)
+            if job['status'] in self.FINISHED_STATUSES or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.1)
+
+    def _wait(self, job_id, process, timeout):
+        """等待命令結束並定期更新心跳，超時時終止命令並回傳 True"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            interval = self.HEARTBEAT_INTERVAL
+            if deadline is not None:
+                interval = min(interval, max(deadline - time.monotonic(), 0))
+            try:
+                process.wait(timeout=interval)
+                return False
+            except subprocess.TimeoutExpired:
+                pass
+            if deadline is not None and time.monotonic() >= deadline:
+                self._terminate(process)
+                return True
+            self._update(job_id, heartbeat_at=_now_ms())
+
+    def _terminate(self, process):
+        """終止命令與其子行程"""
+        try:
+            if os.name == 'nt':
+                subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+    def _finish(self, job_id, status, return_code=None, message=None, error=None):
+        now = _now_ms()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, return_code = ?, message = ?, error = ?, "
+                "run_ms = ? - started_at WHERE id = ?",
+                (status, now, return_code, message, error, now, job_id)
+            )
+        # 釋出的併發名額可能讓其他排隊中的工作可以開始
+        self._wake.set()
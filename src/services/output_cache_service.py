@@ -0,0 +1,152 @@
+"""增量執行的模型輸出快取：以測試列指紋保存先前執行的 provider 回應"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+# 測試列指紋欄位（<原始順序>:<指紋>），分片 CSV 中加入此欄位，結果的 vars 中再移除
+ROW_COLUMN = '_promptlab_row'
+# 增量執行時為每個 provider 加上的標籤，用來從結果對應回 provider 的順序
+PROVIDER_LABEL_PREFIX = 'promptlab-provider-'
+
+
+def combo_key(provider_index, rendered_prompt):
+    """同一測試列中 (provider, 實際送出的 prompt) 組合的鍵"""
+    return hashlib.sha256(f"{provider_index}\x1f{rendered_prompt}".encode('utf-8')).hexdigest()
+
+
+def parse_row_value(value):
+    """拆解 ROW_COLUMN 的值，回傳 (原始順序, 指紋)"""
+    position, _, row_key = str(value).partition(':')
+    return int(position), row_key
+
+
+def provider_index(label):
+    if isinstance(label, str) and label.startswith(PROVIDER_LABEL_PREFIX):
+        suffix = label[len(PROVIDER_LABEL_PREFIX):]
+        if suffix.isdigit():
+            return int(suffix)
+    return None
+
+
+class OutputCacheService:
+    """以 sidecar SQLite 保存 {測試列指紋: {組合: provider 回應}}
+
+    測試列指紋涵蓋該列的輸入變數、prompts 與 providers 設定；只有全部組合都成功取得回應的列才會寫入，
+    之後執行時指紋相同的列直接使用快取的輸出重新評分，不再呼叫 provider。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cached_rows (
+            row_key TEXT PRIMARY KEY,
+            combos INTEGER NOT NULL,
+            created_at INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cached_outputs (
+            row_key TEXT NOT NULL,
+            combo TEXT NOT NULL,
+            provider TEXT,
+            response TEXT NOT NULL,
+            PRIMARY KEY (row_key, combo)
+        );
+    """
+
+    # SQLite 參數數量上限以下的批次大小
+    QUERY_BATCH = 500
+
+    def __init__(self, db_path='results/output_cache.db', max_age_days=None):
+        self.db_path = db_path
+        if max_age_days is None:
+            max_age_days = float(os.environ.get('PROMPTLAB_OUTPUT_CACHE_DAYS', '30'))
+        self.max_age_days = max_age_days
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def cached_keys(self, row_keys):
+        """回傳已有完整快取輸出的測試列指紋集合"""
+        row_keys = list(set(row_keys))
+        found = set()
+        with closing(self._connect()) as conn:
+            for start in range(0, len(row_keys), self.QUERY_BATCH):
+                batch = row_keys[start:start + self.QUERY_BATCH]
+                placeholders = ', '.join('?' * len(batch))
+                found.update(row[0] for row in conn.execute(
+                    f"SELECT row_key FROM cached_rows WHERE row_key IN ({placeholders})", batch
+                ))
+        return found
+
+    def export(self, row_keys, path):
+        """將指定測試列的快取輸出寫成 JSON（供 cached_provider.py 讀取），回傳寫入的列數"""
+        row_keys = list(set(row_keys))
+        outputs = {}
+        with closing(self._connect()) as conn:
+            for start in range(0, len(row_keys), self.QUERY_BATCH):
+                batch = row_keys[start:start + self.QUERY_BATCH]
+                placeholders = ', '.join('?' * len(batch))
+                for row_key, combo, provider, response in conn.execute(
+                    f"SELECT row_key, combo, provider, response FROM cached_outputs WHERE row_key IN ({placeholders})",
+                    batch
+                ):
+                    outputs.setdefault(row_key, {})[combo] = {
+                        'provider': json.loads(provider) if provider else None,
+                        'response': json.loads(response)
+                    }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(outputs, f, ensure_ascii=False)
+        return len(outputs)
+
+    def populate(self, output_path, provider_labels):
+        """從分片的 promptfoo 輸出寫入快取，provider_labels 為各 provider 原本的標籤（沒有時為 None）
+
+        回傳寫入的列數；任何組合出錯（非斷言失敗）的列不寫入。
+        """
+        with open(output_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        rows, invalid = {}, set()
+        for result in (data.get('results') or {}).get('results') or []:
+            value = (result.get('vars') or {}).get(ROW_COLUMN)
+            index = provider_index((result.get('provider') or {}).get('label'))
+            if value is None or index is None:
+                continue
+            _, row_key = parse_row_value(value)
+            response = result.get('response')
+            # failureReason 2 為執行錯誤（1 為斷言未通過，輸出仍可重複使用）
+            if not response or response.get('error') or result.get('failureReason') == 2:
+                invalid.add(row_key)
+                continue
+            provider = {'id': result['provider'].get('id')}
+            if index < len(provider_labels) and provider_labels[index]:
+                provider['label'] = provider_labels[index]
+            combo = combo_key(index, (result.get('prompt') or {}).get('raw', ''))
+            rows.setdefault(row_key, {})[combo] = (json.dumps(provider, ensure_ascii=False),
+                                                   json.dumps(response, ensure_ascii=False))
+
+        now = int(time.time() * 1000)
+        valid = {key: combos for key, combos in rows.items() if key not in invalid}
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN")
+            for row_key, combos in valid.items():
+                conn.execute("DELETE FROM cached_outputs WHERE row_key = ?", (row_key,))
+                conn.executemany(
+                    "INSERT INTO cached_outputs (row_key, combo, provider, response) VALUES (?, ?, ?, ?)",
+                    [(row_key, combo, provider, response) for combo, (provider, response) in combos.items()]
+                )
+                conn.execute("INSERT OR REPLACE INTO cached_rows (row_key, combos, created_at) VALUES (?, ?, ?)",
+                             (row_key, len(combos), now))
+            if self.max_age_days:
+                cutoff = now - int(self.max_age_days * 86400 * 1000)
+                conn.execute("DELETE FROM cached_outputs WHERE row_key IN "
+                             "(SELECT row_key FROM cached_rows WHERE created_at < ?)", (cutoff,))
+                conn.execute("DELETE FROM cached_rows WHERE created_at < ?", (cutoff,))
+            conn.execute("COMMIT")
+        return len(valid)
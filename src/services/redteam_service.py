@@ -0,0 +1,157 @@
+"""Redteam 統計服務"""
+import os
+import sqlite3
+
+
+class RedteamService:
+    """以 json_extract 與 GROUP BY 在 SQLite 內計算 redteam 的 plugin / strategy / 風險統計"""
+
+    # 以 json_valid 保護，格式錯誤的 metadata 視為 NULL（不會拋出錯誤）；
+    # 統計、詳細結果篩選與索引都使用這兩個表達式，索引需與查詢的寫法完全一致才會被使用
+    METADATA_EXPR = "CASE WHEN json_valid(metadata) THEN metadata END"
+    PLUGIN_EXPR = f"json_extract({METADATA_EXPR}, '$.pluginId')"
+    STRATEGY_EXPR = f"json_extract({METADATA_EXPR}, '$.strategyId')"
+
+    # 可選的表達式索引，建立在 promptfoo 資料庫上，需設定 PROMPTLAB_REDTEAM_INDEX=1 才允許建立
+    INDEX_NAME = 'eval_results_redteam_guarded_idx'
+    INDEX_SQL = (
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+        f"ON eval_results (eval_id, {PLUGIN_EXPR}, {STRATEGY_EXPR})"
+    )
+    # 舊版未以 json_valid 保護的索引：metadata 不是有效 JSON 時會讓 promptfoo 的寫入失敗，建立新索引時移除
+    LEGACY_INDEX_NAMES = ('eval_results_redteam_plugin_strategy_idx',)
+
+    # 風險等級規則：未通過或分數 < 0.5 為高風險，< 0.8 為中風險，其餘為低風險
+    RISK_SQL = """
+        SUM(CASE WHEN success = 0 OR COALESCE(score, 0) < 0.5 THEN 1 ELSE 0 END) AS high_risk,
+        SUM(CASE WHEN success != 0 AND COALESCE(score, 0) >= 0.5 AND COALESCE(score, 0) < 0.8
+                 THEN 1 ELSE 0 END) AS medium_risk,
+        SUM(CASE WHEN success != 0 AND COALESCE(score, 0) >= 0.8 THEN 1 ELSE 0 END) AS low_risk
+    """
+
+    def get_redteam_info(self, conn, eval_ids):
+        """計算多個評估的 plugin / strategy 次數與風險等級，回傳 {eval_id: redteam_info}"""
+        infos = {
+            eval_id: {
+                'plugin_counts': {},
+                'strategy_counts': {},
+                'risk_levels': {'high-risk': 0, 'medium-risk': 0, 'low-risk': 0}
+            }
+            for eval_id in eval_ids
+        }
+        if not infos:
+            return infos
+
+        placeholders = ', '.join('?' for _ in infos)
+        params = list(infos)
+
+        for key, expr in (('plugin_counts', self.PLUGIN_EXPR), ('strategy_counts', self.STRATEGY_EXPR)):
+            # 依第一次出現的順序排列，與逐列統計的結果一致
+            rows = conn.execute(f"""
+                SELECT eval_id, {expr} AS name, COUNT(*)
+                FROM eval_results
+                WHERE eval_id IN ({placeholders})
+                GROUP BY eval_id, name
+                HAVING name IS NOT NULL AND name != ''
+                ORDER BY MIN(rowid)
+            """, params).fetchall()
+            for eval_id, name, count in rows:
+                infos[eval_id][key][str(name)] = count
+
+        # 只有 metadata 為有效 JSON 的列才計入風險等級
+        rows = conn.execute(f"""
+            SELECT eval_id, {self.RISK_SQL}
+            FROM eval_results
+            WHERE eval_id IN ({placeholders}) AND metadata IS NOT NULL AND json_valid(metadata)
+            GROUP BY eval_id
+        """, params).fetchall()
+        for eval_id, high_risk, medium_risk, low_risk in rows:
+            infos[eval_id]['risk_levels'] = {
+                'high-risk': high_risk or 0,
+                'medium-risk': medium_risk or 0,
+                'low-risk': low_risk or 0
+            }
+
+        return infos
+
+    def get_matrix(self, conn, eval_id):
+        """計算單一評估的 plugin × strategy 矩陣（供 RedProbe 熱圖使用）"""
+        rows = conn.execute(f"""
+            SELECT {self.PLUGIN_EXPR} AS plugin_id,
+                   {self.STRATEGY_EXPR} AS strategy_id,
+                   COUNT(*) AS total,
+                   SUM(CASE WHEN success = 0 THEN 1 ELSE 0 END) AS failed,
+                   {self.RISK_SQL}
+            FROM eval_results
+            WHERE eval_id = ?
+            GROUP BY plugin_id, strategy_id
+            ORDER BY plugin_id, strategy_id
+        """, [eval_id]).fetchall()
+
+        plugins = []
+        strategies = []
+        cells = []
+        for plugin_id, strategy_id, total, failed, high_risk, medium_risk, low_risk in rows:
+            plugin_id = str(plugin_id) if plugin_id not in (None, '') else 'unknown'
+            strategy_id = str(strategy_id) if strategy_id not in (None, '') else 'basic'
+            if plugin_id not in plugins:
+                plugins.append(plugin_id)
+            if strategy_id not in strategies:
+                strategies.append(strategy_id)
+            cells.append({
+                'plugin_id': plugin_id,
+                'strategy_id': strategy_id,
+                'total': total,
+                'failed': failed,
+                'pass_rate': f"{((total - failed) / total * 100):.2f}%" if total else "0%",
+                'risk_levels': {
+                    'high-risk': high_risk or 0,
+                    'medium-risk': medium_risk or 0,
+                    'low-risk': low_risk or 0
+                }
+            })
+
+        strategies.sort()
+        # 以矩陣形式提供失敗數，列為 plugin、欄為 strategy
+        failed_matrix = [[0] * len(strategies) for _ in plugins]
+        total_matrix = [[0] * len(strategies) for _ in plugins]
+        for cell in cells:
+            row = plugins.index(cell['plugin_id'])
+            col = strategies.index(cell['strategy_id'])
+            failed_matrix[row][col] += cell['failed']
+            total_matrix[row][col] += cell['total']
+
+        return {
+            'eval_id': eval_id,
+            'plugins': plugins,
+            'strategies': strategies,
+            'total_matrix': total_matrix,
+            'failed_matrix': failed_matrix,
+            'cells': cells
+        }
+
+    def has_index(self, conn):
+        """檢查 redteam 表達式索引是否存在"""
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (self.INDEX_NAME,)
+        ).fetchone()
+        return row is not None
+
+    @staticmethod
+    def index_allowed():
+        """是否允許在 promptfoo 資料庫建立索引（PROMPTLAB_REDTEAM_INDEX=1）"""
+        return os.environ.get('PROMPTLAB_REDTEAM_INDEX', '').lower() in ('1', 'true', 'yes')
+
+    def create_index(self, db_path):
+        """在 promptfoo 資料庫建立 redteam 表達式索引（需要寫入權限），並移除舊版索引
+
+        索引會修改 promptfoo 的資料庫並增加其寫入成本，promptfoo 升級時也可能與其 migration 衝突。
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            for name in self.LEGACY_INDEX_NAMES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+            conn.execute(self.INDEX_SQL)
+            conn.commit()
+        finally:
+            conn.close()
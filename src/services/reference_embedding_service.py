@@ -0,0 +1,112 @@
+"""資料集參考答案嵌入預先計算服務"""
+import csv
+import hashlib
+import io
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+class ReferenceEmbeddingService:
+    """上傳含參考答案欄位的 CSV 時，在背景子行程預先計算 BERT 嵌入
+
+    實際計算由 assert/reference_embeddings.py 執行（需要 torch 與 bert_score），
+    可透過 BERT_SCORE_PYTHON 指定評測環境的 Python 執行檔。
+    每次計算都會載入模型，所有實例共用單一背景執行緒依序執行，同一時間只有一個計算子行程；
+    子行程的輸出寫入 logs_dir，失敗時記錄返回碼與紀錄檔位置。
+    推論後端以 BERT_SCORE_BACKEND 傳給子行程，與評分時使用相同的 model_key。
+    """
+
+    COLUMN = 'expected_answer'
+
+    # 所有實例共用的建立佇列與背景執行緒
+    _queue = queue.Queue()
+    _pending = set()
+    _pending_lock = threading.Lock()
+    _worker = None
+
+    def __init__(self, builder_path='assert/reference_embeddings.py',
+                 uploads_dir='results/reference_embeddings/.uploads',
+                 logs_dir='results/reference_embeddings/logs'):
+        self.builder_path = Path(builder_path)
+        self.uploads_dir = Path(uploads_dir)
+        self.logs_dir = Path(logs_dir)
+        self.python = os.environ.get('BERT_SCORE_PYTHON') or sys.executable
+        self.backend = os.environ.get('BERT_SCORE_BACKEND', 'torch')
+
+    def has_reference_column(self, header_line):
+        """CSV 標題列是否包含參考答案欄位"""
+        headers = next(csv.reader(io.StringIO(header_line)), [])
+        return self.COLUMN in [header.strip() for header in headers]
+
+    def precompute_file(self, csv_path, remove_after=False):
+        """將 CSV 檔案排入背景計算參考答案嵌入，回傳是否已排入（同一檔案已在佇列中時也回傳 True）"""
+        try:
+            csv_path = Path(csv_path).resolve()
+            with open(csv_path, 'r', encoding='utf-8-sig') as f:
+                if not self.has_reference_column(f.readline()):
+                    return False
+
+            command = [self.python, str(self.builder_path.resolve()), str(csv_path), '--backend', self.backend]
+            if remove_after:
+                command.append('--remove-input')
+            with self._pending_lock:
+                if str(csv_path) in self._pending:
+                    return True
+                self._pending.add(str(csv_path))
+                cls = type(self)
+                if cls._worker is None or not cls._worker.is_alive():
+                    cls._worker = threading.Thread(target=self._run_queue, name='reference-embeddings', daemon=True)
+                    cls._worker.start()
+            self._queue.put((str(csv_path), command, self.logs_dir))
+            print(f"已排入預先計算參考答案嵌入: {csv_path}")
+            return True
+        except Exception as e:
+            print(f"預先計算參考答案嵌入失敗: {e}")
+            return False
+
+    @classmethod
+    def _run_queue(cls):
+        while True:
+            csv_path, command, logs_dir = cls._queue.get()
+            try:
+                cls._build(csv_path, command, logs_dir)
+            except Exception as e:
+                print(f"預先計算參考答案嵌入失敗: {csv_path}: {e}")
+            finally:
+                with cls._pending_lock:
+                    cls._pending.discard(csv_path)
+                cls._queue.task_done()
+
+    @staticmethod
+    def _build(csv_path, command, logs_dir):
+        """執行計算子行程並等待結束，輸出寫入紀錄檔"""
+        logs_dir.mkdir(parents=True, exist_ok=True)
+        log_path = logs_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{Path(csv_path).stem}.log"
+        print(f"開始預先計算參考答案嵌入: {csv_path}")
+        with open(log_path, 'wb') as log:
+            return_code = subprocess.run(
+                command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL
+            ).returncode
+        if return_code == 0:
+            print(f"參考答案嵌入計算完成: {csv_path}")
+        else:
+            print(f"參考答案嵌入計算失敗（返回碼 {return_code}），詳見 {log_path}")
+
+    def precompute_content(self, content):
+        """儲存上傳的 CSV 內容後在背景計算，完成後刪除暫存檔"""
+        try:
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            self.uploads_dir.mkdir(parents=True, exist_ok=True)
+            upload_path = self.uploads_dir / f"{hashlib.sha1(content).hexdigest()[:16]}.csv"
+            with open(upload_path, 'wb') as f:
+                f.write(content)
+            return self.precompute_file(upload_path, remove_after=True)
+        except Exception as e:
+            print(f"預先計算參考答案嵌入失敗: {e}")
+            return False
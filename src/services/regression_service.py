@@ -0,0 +1,143 @@
+"""評估退步檢定服務"""
+import math
+
+import numpy as np
+
+
+def mcnemar_test(regressions, improvements):
+    """McNemar 檢定（雙尾），回傳 (p 值, 方法名稱)
+
+    不一致配對少於 25 筆時使用精確二項檢定，否則使用連續性校正的卡方檢定。
+    """
+    discordant = regressions + improvements
+    if discordant == 0:
+        return 1.0, 'none'
+    if discordant < 25:
+        k = min(regressions, improvements)
+        tail = sum(math.comb(discordant, i) for i in range(k + 1)) / 2 ** discordant
+        return min(1.0, 2 * tail), 'exact'
+    statistic = (abs(regressions - improvements) - 1) ** 2 / discordant
+    # 自由度 1 的卡方分佈右尾機率
+    return math.erfc(math.sqrt(statistic / 2)), 'chi2'
+
+
+class RegressionService:
+    """以配對結果判斷候選評估相對基準評估是否退步
+
+    通過率以 McNemar 檢定判斷差異是否顯著，分數以配對 bootstrap 估計平均差異的信賴區間。
+    """
+
+    # bootstrap 每批抽樣的元素上限，避免 n × resamples 的索引矩陣佔用過多記憶體
+    BOOTSTRAP_BATCH_ELEMENTS = 5_000_000
+
+    DEFAULTS = {
+        'alpha': 0.05,
+        # 通過率下降超過此百分點且顯著時判定退步
+        'max_pass_rate_drop': 1.0,
+        # 平均分數下降超過此值（信賴區間上界仍低於 -max_score_drop）時判定退步
+        'max_score_drop': 0.02,
+        'resamples': 2000,
+        'seed': 0
+    }
+
+    def check(self, pairs, options=None):
+        """對配對結果進行退步檢定
+
+        pairs 為 CompareService.compare 的配對列表（base 為基準、head 為候選）。
+        回傳包含 verdict（PASS / FAIL / INCONCLUSIVE）、效果量與檢定結果的 dict。
+        """
+        options = {**self.DEFAULTS, **(options or {})}
+        n = len(pairs)
+        if n == 0:
+            return {
+                'verdict': 'INCONCLUSIVE',
+                'reasons': ['沒有可配對的測試案例'],
+                'matched': 0,
+                'options': options
+            }
+
+        columns = np.array(
+            [(base_success or 0, head_success or 0, base_score or 0.0, head_score or 0.0)
+             for _, _, base_success, head_success, base_score, head_score in pairs],
+            dtype=np.float64
+        )
+        base_success = columns[:, 0] != 0
+        head_success = columns[:, 1] != 0
+        deltas = columns[:, 3] - columns[:, 2]
+
+        regressions = int(np.count_nonzero(base_success & ~head_success))
+        improvements = int(np.count_nonzero(~base_success & head_success))
+        p_value, method = mcnemar_test(regressions, improvements)
+
+        base_rate = base_success.mean() * 100
+        head_rate = head_success.mean() * 100
+        pass_rate_delta = head_rate - base_rate
+
+        score = self._paired_bootstrap(deltas, options['resamples'], options['alpha'], options['seed'])
+
+        reasons = []
+        pass_rate_regressed = (
+            p_value < options['alpha']
+            and regressions > improvements
+            and -pass_rate_delta > options['max_pass_rate_drop']
+        )
+        if pass_rate_regressed:
+            reasons.append(
+                f"通過率下降 {-pass_rate_delta:.2f} 個百分點（McNemar p={p_value:.4g}）"
+            )
+        score_regressed = score['ci_high'] < -options['max_score_drop']
+        if score_regressed:
+            reasons.append(
+                f"平均分數下降 {-score['mean_delta']:.4f}（{int((1 - options['alpha']) * 100)}% 信賴區間上界 {score['ci_high']:.4f}）"
+            )
+
+        if reasons:
+            verdict = 'FAIL'
+        else:
+            verdict = 'PASS'
+            reasons.append('未偵測到顯著退步')
+
+        return {
+            'verdict': verdict,
+            'reasons': reasons,
+            'matched': n,
+            'pass_rate': {
+                'baseline': round(base_rate, 2),
+                'candidate': round(head_rate, 2),
+                'delta': round(pass_rate_delta, 2),
+                'regressions': regressions,
+                'improvements': improvements,
+                # 不一致配對的勝算比（退步 / 進步），作為通過率的效果量
+                'odds_ratio': round(regressions / improvements, 4) if improvements else None,
+                'test': 'mcnemar',
+                'method': method,
+                'p_value': round(p_value, 6),
+                'significant': p_value < options['alpha']
+            },
+            'score': score,
+            'options': options
+        }
+
+    def _paired_bootstrap(self, deltas, resamples, alpha, seed):
+        """以配對 bootstrap 估計平均分數差異的信賴區間，並計算 Cohen's dz 效果量"""
+        n = deltas.size
+        rng = np.random.default_rng(seed)
+        batch = max(1, min(resamples, self.BOOTSTRAP_BATCH_ELEMENTS // n))
+        means = np.empty(resamples)
+        for start in range(0, resamples, batch):
+            size = min(batch, resamples - start)
+            indexes = rng.integers(0, n, size=(size, n), dtype=np.int32 if n < 2 ** 31 else np.int64)
+            means[start:start + size] = deltas[indexes].mean(axis=1)
+
+        low, high = np.quantile(means, [alpha / 2, 1 - alpha / 2])
+        std = deltas.std(ddof=1) if n > 1 else 0.0
+        return {
+            'mean_delta': round(float(deltas.mean()), 6),
+            'ci_low': round(float(low), 6),
+            'ci_high': round(float(high), 6),
+            'confidence': 1 - alpha,
+            'effect_size': round(float(deltas.mean() / std), 4) if std > 0 else 0.0,
+            'effect_size_metric': 'cohens_dz',
+            'test': 'paired_bootstrap',
+            'resamples': resamples
+        }
@@ -0,0 +1,116 @@
+"""評估執行排程：全域併發上限、各 provider 併發上限、優先等級與使用者間公平排隊"""
+import json
+import os
+import re
+from urllib.parse import urlsplit
+
+import yaml
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+PRIORITY_NAMES = {value: key for key, value in PRIORITIES.items()}
+
+HOST_HEADER_PATTERN = re.compile(r'^\s*host\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+
+def provider_key(provider):
+    """以 provider 目標的 scheme://host[:port] 作為併發限制的鍵，無法判斷時回傳 None"""
+    if isinstance(provider, str):
+        provider = {'id': provider}
+    if not isinstance(provider, dict):
+        return None
+    config = provider.get('config') or {}
+
+    url = config.get('url')
+    if not url and str(provider.get('id', '')).startswith(('http://', 'https://')):
+        url = provider['id']
+    if url:
+        parts = urlsplit(str(url))
+        if parts.netloc:
+            return f"{parts.scheme or 'http'}://{parts.netloc.lower()}"
+
+    # 原始 HTTP request 以 Host 標頭判斷目標
+    request = config.get('request')
+    if isinstance(request, str):
+        match = HOST_HEADER_PATTERN.search(request)
+        if match:
+            scheme = 'https' if config.get('useHttps') else 'http'
+            return f"{scheme}://{match.group(1).lower()}"
+
+    return provider.get('id') or None
+
+
+def config_provider_keys(config_dir):
+    """解析配置的 providers，回傳不重複的 provider 鍵（依出現順序）"""
+    config_file = os.path.join(config_dir, 'promptfooconfig.yaml')
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        print(f"解析 providers 失敗 {config_file}: {e}")
+        return []
+
+    providers = config.get('providers') or []
+    if not isinstance(providers, list):
+        providers = [providers]
+    keys = []
+    for provider in providers:
+        key = provider_key(provider)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+class RunScheduler:
+    """從排隊中的工作挑選下一個可執行的工作
+
+    - 執行中的工作數達到 max_running 時不再開始新工作
+    - 每個 provider 目標同時只允許 provider_limits 指定（預設 default_provider_limit）個工作
+    - 優先等級高者先執行；同等級時，執行中工作較少、較久沒有開始工作的使用者優先，最後依排入時間
+    - 因 provider 上限而無法執行的工作不會阻擋其他工作
+    """
+
+    def __init__(self, max_running, default_provider_limit=None, provider_limits=None):
+        self.max_running = max_running
+        if default_provider_limit is None:
+            default_provider_limit = int(os.environ.get('PROMPTLAB_PROVIDER_CONCURRENCY', '1'))
+        self.default_provider_limit = default_provider_limit
+        if provider_limits is None:
+            provider_limits = json.loads(os.environ.get('PROMPTLAB_PROVIDER_LIMITS') or '{}')
+        self.provider_limits = {key.rstrip('/').lower(): int(value) for key, value in provider_limits.items()}
+
+    def provider_limit(self, key):
+        return self.provider_limits.get(key.lower(), self.default_provider_limit)
+
+    def explicit_provider_limit(self, key):
+        """PROMPTLAB_PROVIDER_LIMITS 中為此 provider 設定的上限，未設定時回傳 None"""
+        return self.provider_limits.get(key.lower())
+
+    def pick(self, queued, running, last_started):
+        """queued / running 為工作列（需含 priority、user、providers、created_at），
+        last_started 為 {使用者: 最後開始工作的時間}；回傳可執行的工作或 None
+        """
+        if len(running) >= self.max_running:
+            return None
+
+        running_by_user, running_by_provider = {}, {}
+        for job in running:
+            running_by_user[job['user']] = running_by_user.get(job['user'], 0) + 1
+            for key in json.loads(job['providers'] or '[]'):
+                running_by_provider[key] = running_by_provider.get(key, 0) + 1
+
+        def order(job):
+            return (job['priority'], running_by_user.get(job['user'], 0),
+                    last_started.get(job['user']) or 0, job['created_at'])
+
+        for job in sorted(queued, key=order):
+            keys = json.loads(job['providers'] or '[]')
+            if all(running_by_provider.get(key, 0) < self.provider_limit(key) for key in keys):
+                return job
+        return None
+
+    def describe(self):
+        return {
+            'max_running': self.max_running,
+            'default_provider_limit': self.default_provider_limit,
+            'provider_limits': self.provider_limits
+        }
@@ -0,0 +1,363 @@
+"""評估結果全文檢索索引服務（sidecar SQLite FTS5）"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from src.services.summary_service import format_created_time
+from src.utils.row_decoder import loads_or_none
+from src.utils.sqlite_pool import ReadOnlyConnectionPool
+
+
+# 中日韓文字範圍（含全形標點），這些字元會被拆成單字 token
+CJK_RANGES = (
+    '\u2e80-\u2fdf\u3000-\u303f\u3040-\u30ff\u3100-\u312f\u3130-\u318f\u31a0-\u31ff'
+    '\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef'
+)
+CJK_CHAR_PATTERN = re.compile(f'([{CJK_RANGES}])')
+# 斷詞時插入在中日韓字元前後的空白（片段中的命中標記緊貼字元）
+CJK_SEGMENT_PATTERN = re.compile(f' (【?[{CJK_RANGES}]】?) ')
+
+
+def segment_cjk(text):
+    """在每個中日韓字元前後加上空白，讓 unicode61 斷詞器將其視為單字 token"""
+    if not text:
+        return ''
+    return CJK_CHAR_PATTERN.sub(r' \1 ', text)
+
+
+def restore_cjk(text):
+    """移除 segment_cjk 插入的空白，還原原文（用於顯示片段）"""
+    return CJK_SEGMENT_PATTERN.sub(r'\1', text).strip()
+
+
+def build_match_query(query):
+    """將使用者輸入轉為 FTS5 查詢：每個以空白分隔的詞為一個片語，詞與詞之間為 AND"""
+    phrases = []
+    for term in query.split():
+        tokens = segment_cjk(term).split()
+        if tokens:
+            phrases.append('"' + ' '.join(tokens).replace('"', '""') + '"')
+    return ' '.join(phrases)
+
+
+def flatten_vars(vars_value):
+    """將 test_case.vars 攤平為 "key: value" 的文字"""
+    if isinstance(vars_value, dict):
+        return '\n'.join(f"{key}: {value}" for key, value in vars_value.items())
+    return str(vars_value) if vars_value is not None else ''
+
+
+class SearchIndexService:
+    """以 rowid 追蹤 promptfoo 的 eval_results，增量維護 FTS5 全文檢索索引
+
+    索引內容為模型輸出（response.output）與測試變數（test_case.vars），
+    中日韓文字在寫入與查詢時都拆成單字，因此可搜尋任意長度的中文片語。
+    索引寫在獨立的 sidecar SQLite 檔案中，每批資料都在 BEGIN IMMEDIATE transaction 內重新讀取檢查點、
+    寫入並推進檢查點，多個行程同時同步也不會重複寫入；查詢使用獨立的唯讀連線（WAL），不會等待同步。indexed_rows 記錄每筆索引列所屬的評估，
+    刪除評估時以 rowid 移除 FTS 資料，不需掃描整個 FTS 表。
+    注意：promptfoo 事後就地修改的結果列不會被重新索引，刪除的評估會在同步時移除。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS index_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS indexed_evals (
+            eval_id TEXT PRIMARY KEY,
+            description TEXT
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS result_search USING fts5(
+            output,
+            vars,
+            eval_id UNINDEXED,
+            success UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+        CREATE TABLE IF NOT EXISTS indexed_rows (
+            row_id INTEGER PRIMARY KEY,
+            eval_id TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_indexed_rows_eval ON indexed_rows(eval_id);
+    """
+    # 索引格式版本，與 index_state 中的版本不同時重新建立索引
+    SCHEMA_VERSION = 2
+
+    RESULTS_QUERY = """
+        SELECT rowid,
+               eval_id,
+               success,
+               CASE WHEN json_valid(response) THEN json_extract(response, '$.output') ELSE response END,
+               CASE WHEN json_valid(test_case) THEN json_extract(test_case, '$.vars') END
+        FROM eval_results
+        WHERE rowid > ?
+        ORDER BY rowid
+        LIMIT ?
+    """
+
+    # 可指定搜尋的欄位
+    FIELDS = ('output', 'vars')
+    SNIPPET_TOKENS = 24
+    HIGHLIGHT = ('【', '】')
+    # 符合筆數超過此數量時不再計算 bm25 排名，改為依最新結果排序，避免常見詞查詢過慢
+    RANK_LIMIT = 20000
+
+    def __init__(self, source_db_path, index_path='results/search_index.db', batch_size=2000):
+        self.source_db_path = source_db_path
+        self.index_path = index_path
+        self.batch_size = batch_size
+        self.source_pool = ReadOnlyConnectionPool(source_db_path)
+        # 查詢使用獨立的唯讀連線，不需等待同步中的寫入 transaction
+        self.index_pool = ReadOnlyConnectionPool(index_path)
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._schema_ready = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.last_sync = None
+
+    def _connect(self):
+        """開啟 sidecar 資料庫連線，第一次開啟時建立 schema；SQLite 未編譯 FTS5 時拋出 OperationalError"""
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # isolation_level=None：寫入的 transaction 一律以 BEGIN IMMEDIATE 明確開始
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None, check_same_thread=False)
+        if not self._schema_ready:
+            try:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(self.SCHEMA)
+            except sqlite3.OperationalError:
+                conn.close()
+                raise
+            self._schema_ready = True
+        return conn
+
+    def _index_conn(self):
+        """取得同步用的 sidecar 資料庫連線（呼叫端需持有鎖）"""
+        if self._conn is None:
+            self._conn = self._connect()
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+        return self._conn
+
+    def _ensure_index(self):
+        """確保索引檔案與 schema 已建立，之後可用唯讀連線查詢"""
+        if not self._schema_ready:
+            self._connect().close()
+
+    def _write(self, conn, apply):
+        """在 BEGIN IMMEDIATE transaction 內執行 apply(conn)，其他行程的同步會等待此 transaction 結束"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = apply(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _get_state(self, conn, key, default=None):
+        row = conn.execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, conn, key, value):
+        conn.execute(
+            "INSERT INTO index_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    def _source_identity(self):
+        """promptfoo 資料庫檔案識別資訊，用於偵測檔案被替換"""
+        stat = os.stat(self.source_db_path)
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def _reset(self, conn):
+        """清空索引，下一次同步將從頭建立"""
+        conn.execute("DELETE FROM result_search")
+        conn.execute("DELETE FROM indexed_rows")
+        conn.execute("DELETE FROM indexed_evals")
+        conn.execute("DELETE FROM index_state")
+
+    def sync(self):
+        """從上次檢查點增量同步，回傳本次索引的結果筆數"""
+        with self._lock:
+            conn = self._index_conn()
+            processed = 0
+            with self.source_pool.connection() as source:
+                identity = self._source_identity()
+                self._write(conn, lambda conn: self._check_source(source, conn, identity))
+
+                while True:
+                    count = self._write(conn, lambda conn: self._sync_batch(source, conn))
+                    if not count:
+                        break
+                    processed += count
+
+            if processed:
+                print(f"全文檢索索引已同步 {processed} 筆評估結果")
+            self.last_sync = format_created_time(int(time.time() * 1000))
+            return processed
+
+    def _check_source(self, source, conn, identity):
+        """資料庫被替換、rowid 倒退或索引格式變更時清空索引，並同步評估清單"""
+        max_result_rowid = source.execute("SELECT MAX(rowid) FROM eval_results").fetchone()[0] or 0
+        results_rowid = int(self._get_state(conn, 'results_rowid', 0))
+        if self._get_state(conn, 'schema_version') != str(self.SCHEMA_VERSION):
+            if results_rowid:
+                print("全文檢索索引格式已更新，重新建立索引")
+            self._reset(conn)
+        elif self._get_state(conn, 'source_identity') not in (None, identity) or results_rowid > max_result_rowid:
+            print("promptfoo 資料庫已變更，重新建立全文檢索索引")
+            self._reset(conn)
+        self._set_state(conn, 'schema_version', self.SCHEMA_VERSION)
+        self._set_state(conn, 'source_identity', identity)
+        self._sync_evals(source, conn)
+
+    def _sync_batch(self, source, conn):
+        """在 transaction 內讀取檢查點並索引下一批結果列，回傳處理筆數（0 表示已同步到最新）"""
+        results_rowid = int(self._get_state(conn, 'results_rowid', 0))
+        rows = source.execute(self.RESULTS_QUERY, (results_rowid, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+
+        conn.executemany(
+            "INSERT INTO result_search (rowid, output, vars, eval_id, success) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (rowid, segment_cjk(str(output) if output is not None else ''),
+                 segment_cjk(flatten_vars(loads_or_none(vars_json))), eval_id, int(bool(success)))
+                for rowid, eval_id, success, output, vars_json in rows
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO indexed_rows (row_id, eval_id) VALUES (?, ?)",
+            [(row[0], row[1]) for row in rows]
+        )
+        self._set_state(conn, 'results_rowid', rows[-1][0])
+        return len(rows)
+
+    def _sync_evals(self, source, conn):
+        """同步評估清單，並移除已刪除評估的索引資料"""
+        source_evals = dict(source.execute("SELECT id, description FROM evals").fetchall())
+        conn.executemany(
+            "INSERT INTO indexed_evals (eval_id, description) VALUES (?, ?) "
+            "ON CONFLICT(eval_id) DO UPDATE SET description = excluded.description",
+            list(source_evals.items())
+        )
+
+        index_ids = {row[0] for row in conn.execute("SELECT eval_id FROM indexed_evals")}
+        removed = [(eval_id,) for eval_id in index_ids - set(source_evals)]
+        if removed:
+            conn.executemany(
+                "DELETE FROM result_search WHERE rowid IN (SELECT row_id FROM indexed_rows WHERE eval_id = ?)",
+                removed
+            )
+            conn.executemany("DELETE FROM indexed_rows WHERE eval_id = ?", removed)
+            conn.executemany("DELETE FROM indexed_evals WHERE eval_id = ?", removed)
+
+    def search(self, query, eval_id=None, field=None, limit=20, offset=0):
+        """全文檢索，回傳 (符合筆數, 是否依相關度排序, 結果列表)
+
+        符合筆數不超過 RANK_LIMIT 時依 bm25 相關度排序；超過時依最新結果排序，
+        符合筆數只計算到 RANK_LIMIT + 1 為止。結果的 rank 為 FTS5 的 bm25 值（越小越相關），
+        不是評估分數；未依相關度排序時為 None。
+        """
+        match_query = build_match_query(query)
+        if not match_query:
+            return 0, True, []
+        if field:
+            match_query = f"{field} : ({match_query})"
+
+        where = "s.result_search MATCH ?"
+        params = [match_query]
+        if eval_id:
+            where += " AND s.eval_id = ?"
+            params.append(eval_id)
+
+        self._ensure_index()
+
+        start, end = self.HIGHLIGHT
+        with self.index_pool.connection() as conn:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM result_search s WHERE {where} LIMIT ?)",
+                [*params, self.RANK_LIMIT + 1]
+            ).fetchone()[0]
+            ranked = total <= self.RANK_LIMIT
+            rows = conn.execute(
+                f"""
+                SELECT s.rowid, s.eval_id, s.success, s.rank,
+                       snippet(result_search, 0, ?, ?, '…', ?),
+                       snippet(result_search, 1, ?, ?, '…', ?),
+                       e.description
+                FROM result_search s
+                LEFT JOIN indexed_evals e ON e.eval_id = s.eval_id
+                WHERE {where}
+                ORDER BY {'s.rank' if ranked else 's.rowid DESC'}
+                LIMIT ? OFFSET ?
+                """,
+                [start, end, self.SNIPPET_TOKENS, start, end, self.SNIPPET_TOKENS,
+                 *params, limit, offset]
+            ).fetchall()
+
+        results = []
+        for row_id, result_eval_id, success, rank, output_snippet, vars_snippet, description in rows:
+            output_snippet = restore_cjk(output_snippet or '')
+            vars_snippet = restore_cjk(vars_snippet or '')
+            # 以含有命中標記的欄位作為主要片段
+            matched_field = 'output' if start in output_snippet or start not in vars_snippet else 'vars'
+            results.append({
+                'row_id': row_id,
+                'eval_id': result_eval_id,
+                'description': str(description) if description is not None else '無描述',
+                'status': 'PASS' if success else 'FAIL',
+                'rank': round(rank, 6) if ranked else None,
+                'matched_field': matched_field,
+                'snippet': output_snippet if matched_field == 'output' else vars_snippet,
+                'output_snippet': output_snippet,
+                'vars_snippet': vars_snippet
+            })
+        return total, ranked, results
+
+    def start(self, interval=5.0):
+        """啟動背景同步執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+        print(f"全文檢索索引背景同步已啟動（每 {interval} 秒）")
+
+    def is_running(self):
+        """背景同步執行緒是否執行中"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def stop(self):
+        """停止背景同步執行緒"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self, interval):
+        while not self._stop_event.is_set():
+            try:
+                if os.path.exists(self.source_db_path):
+                    self.sync()
+            except Exception as e:
+                print(f"全文檢索索引同步錯誤: {e}")
+            self._stop_event.wait(interval)
+
+    def stats(self):
+        """回傳索引狀態"""
+        self._ensure_index()
+        with self.index_pool.connection() as conn:
+            return {
+                'index_path': self.index_path,
+                'results_rowid': int(self._get_state(conn, 'results_rowid', 0)),
+                'indexed_rows': conn.execute("SELECT COUNT(*) FROM result_search").fetchone()[0],
+                'indexed_evals': conn.execute("SELECT COUNT(*) FROM indexed_evals").fetchone()[0],
+                'last_sync': self.last_sync,
+                'background': self.is_running()
+            }
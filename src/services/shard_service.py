@@ -0,0 +1,386 @@
+"""大型 CSV 測試集的分片執行：切分資料集、建立隔離的執行目錄、合併各分片結果"""
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import string
+from datetime import datetime, timezone
+
+import yaml
+
+from src.services.output_cache_service import (
+    PROVIDER_LABEL_PREFIX, ROW_COLUMN, combo_key, parse_row_value, provider_index
+)
+
+CONFIG_FILENAME = 'promptfooconfig.yaml'
+SHARD_OUTPUT = 'output.json'
+CACHED_OUTPUTS = 'cached_outputs.json'
+CACHED_PROVIDER_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'assert', 'cached_provider.py'
+)
+# 只用於斷言、不影響模型輸出的 CSV 欄位
+ASSERTION_COLUMN_PREFIXES = ('__expected', '__threshold', '__metric', '__description', '__metadata')
+
+
+def is_csv_reference(value):
+    return isinstance(value, str) and value.startswith('file://') and value.lower().endswith('.csv')
+
+
+def absolutize_file_references(value, base_dir):
+    """將設定中相對路徑的 file:// 參照改為以 base_dir 為基準的絕對路徑（含 file://x.py:func 形式）"""
+    if isinstance(value, dict):
+        return {key: absolutize_file_references(item, base_dir) for key, item in value.items()}
+    if isinstance(value, list):
+        return [absolutize_file_references(item, base_dir) for item in value]
+    if isinstance(value, str) and value.startswith('file://'):
+        path = value[len('file://'):]
+        if path and not os.path.isabs(path):
+            return 'file://' + os.path.normpath(os.path.join(base_dir, path))
+    return value
+
+
+def new_eval_id(created_at=None):
+    """產生與 promptfoo 相同格式的 eval ID: eval-<3 碼>-<ISO 時間>"""
+    created_at = created_at or datetime.now(timezone.utc)
+    suffix = ''.join(random.choices(string.ascii_letters + string.digits, k=3))
+    return f"eval-{suffix}-{created_at.strftime('%Y-%m-%dT%H:%M:%S')}"
+
+
+def _read_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        return header, [row for row in reader if any(cell.strip() for cell in row)]
+
+
+def _merge_numbers(target, source, maximum_keys=('durationMs',)):
+    """遞迴加總數值欄位（maximum_keys 取最大值，其他型別保留 target 的值）"""
+    for key, value in source.items():
+        if isinstance(value, bool):
+            target.setdefault(key, value)
+        elif isinstance(value, (int, float)):
+            current = target.get(key)
+            if not isinstance(current, (int, float)) or isinstance(current, bool):
+                target[key] = value
+            elif key in maximum_keys:
+                target[key] = max(current, value)
+            else:
+                target[key] = current + value
+        elif isinstance(value, dict):
+            current = target.get(key)
+            if not isinstance(current, dict):
+                target[key] = current = {}
+            _merge_numbers(current, value, maximum_keys)
+        else:
+            target.setdefault(key, value)
+    return target
+
+
+class ShardService:
+    """將配置的 file:// CSV 測試切成多個分片，每個分片在獨立目錄以 promptfoo eval --no-write 執行，
+    完成後把各分片的輸出合併為單一評估再以 promptfoo import 寫入資料庫。
+    """
+
+    def __init__(self, rows_per_shard=None, max_shards=None):
+        self.rows_per_shard = rows_per_shard or int(os.environ.get('PROMPTLAB_SHARD_ROWS', '1000'))
+        self.max_shards = max_shards or int(os.environ.get('PROMPTLAB_MAX_SHARDS', '8'))
+
+    def _load_config(self, config_dir):
+        with open(os.path.join(config_dir, CONFIG_FILENAME), 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+
+    def _test_entries(self, config):
+        tests = config.get('tests') or []
+        return tests if isinstance(tests, list) else [tests]
+
+    def count_rows(self, config_dir):
+        """計算配置中 file:// CSV 測試的總列數"""
+        total = 0
+        for entry in self._test_entries(self._load_config(config_dir)):
+            if is_csv_reference(entry):
+                path = os.path.join(config_dir, entry[len('file://'):])
+                if os.path.exists(path):
+                    total += len(_read_csv(path)[1])
+        return total
+
+    def resolve_shards(self, config_dir, requested):
+        """依要求（整數或 'auto'）決定分片數，回傳 (分片數, None) 或 (None, 錯誤訊息)
+
+        未指定時不分片（以一般的 promptfoo eval 執行）；'auto' 依測試列數與 rows_per_shard 決定。
+        """
+        if requested in (None, ''):
+            return 1, None
+        if requested == 'auto':
+            try:
+                rows = self.count_rows(config_dir)
+            except (OSError, yaml.YAMLError, csv.Error) as e:
+                print(f"計算測試列數失敗: {e}")
+                return 1, None
+            return max(1, min(self.max_shards, math.ceil(rows / self.rows_per_shard))), None
+        try:
+            shards = int(requested)
+        except (TypeError, ValueError):
+            return None, "shards 必須是整數或 'auto'"
+        if not 1 <= shards <= self.max_shards:
+            return None, f'shards 必須介於 1 到 {self.max_shards}'
+        return shards, None
+
+    def _provider_entries(self, config):
+        """providers 正規化為 dict 清單；無法逐一對應的寫法（例如 file:// provider 檔）回傳 None"""
+        providers = config.get('providers')
+        if isinstance(providers, str) or (isinstance(providers, dict) and providers.get('id')):
+            providers = [providers]
+        if not isinstance(providers, list) or not providers:
+            return None
+        entries = []
+        for provider in providers:
+            if isinstance(provider, str) and not provider.startswith('file://'):
+                entries.append({'id': provider})
+            elif isinstance(provider, dict) and provider.get('id'):
+                entries.append(dict(provider))
+            else:
+                return None
+        return entries
+
+    def fingerprint_base(self, config, config_dir):
+        """影響模型輸出（但不含斷言）的設定指紋：prompts、providers、defaultTest 的 vars 與 options，
+        以及其中 file:// 參照的檔案內容
+        """
+        default_test = config.get('defaultTest') if isinstance(config.get('defaultTest'), dict) else {}
+        options = {key: value for key, value in (default_test.get('options') or {}).items() if key != 'provider'}
+        relevant = absolutize_file_references({
+            'prompts': config.get('prompts'),
+            'providers': config.get('providers'),
+            'vars': default_test.get('vars'),
+            'options': options
+        }, config_dir)
+
+        files = {}
+
+        def collect(value):
+            if isinstance(value, dict):
+                for item in value.values():
+                    collect(item)
+            elif isinstance(value, list):
+                for item in value:
+                    collect(item)
+            elif isinstance(value, str) and value.startswith('file://'):
+                path = value[len('file://'):]
+                # file://x.py:function 形式去掉函式名稱
+                if not os.path.isfile(path) and ':' in os.path.basename(path):
+                    path = path.rsplit(':', 1)[0]
+                if os.path.isfile(path):
+                    with open(path, 'rb') as f:
+                        files[value] = hashlib.sha256(f.read()).hexdigest()
+
+        collect(relevant)
+        payload = json.dumps({'config': relevant, 'files': files}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def row_fingerprint(self, base, header, row):
+        """測試列指紋：設定指紋加上該列的輸入欄位（不含 __expected 等斷言欄位）"""
+        values = {column: value for column, value in zip(header, row)
+                  if column != ROW_COLUMN and not column.startswith(ASSERTION_COLUMN_PREFIXES)}
+        payload = json.dumps([base, values], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def prepare(self, config_dir, work_dir, shards, output_cache=None):
+        """建立各分片的執行目錄，回傳 [{'index', 'dir', 'rows', 'output', 'cached', ...}]
+
+        每個 CSV 依連續區塊切分，分片目錄中的配置只替換 tests，其餘相對 file:// 參照改為絕對路徑；
+        非 CSV 的測試只放在第一個分片。
+        傳入 output_cache（OutputCacheService）時為增量執行：每列加上 ROW_COLUMN 指紋欄位，
+        已有快取輸出的列集中到一個以 assert/cached_provider.py 重新評分的分片，其餘列才分片呼叫 provider。
+        """
+        config_dir, work_dir = os.path.abspath(config_dir), os.path.abspath(work_dir)
+        config = self._load_config(config_dir)
+        entries = self._test_entries(config)
+        providers = self._provider_entries(config) if output_cache is not None else None
+        tracking = providers is not None
+
+        # (編號, 欄位, 需要呼叫 provider 的列, 使用快取輸出的列)
+        files = []
+        if tracking:
+            base = self.fingerprint_base(config, config_dir)
+            position = 0
+            keyed = []
+            for number, entry in enumerate(entries):
+                if is_csv_reference(entry):
+                    header, rows = _read_csv(os.path.join(config_dir, entry[len('file://'):]))
+                    if header is None:
+                        continue
+                    rows = [row + [''] * (len(header) - len(row)) for row in rows]
+                    keys = [self.row_fingerprint(base, header, row) for row in rows]
+                    rows = [row[:len(header)] + [f'{position + i}:{key}'] for i, (row, key) in enumerate(zip(rows, keys))]
+                    position += len(rows)
+                    keyed.append((number, header + [ROW_COLUMN], rows, keys))
+            cached_keys = output_cache.cached_keys(key for *_, keys in keyed for key in keys)
+            for number, header, rows, keys in keyed:
+                files.append((number, header,
+                              [row for row, key in zip(rows, keys) if key not in cached_keys],
+                              [row for row, key in zip(rows, keys) if key in cached_keys]))
+            fresh_rows = sum(len(fresh) for _, _, fresh, _ in files)
+            shards = max(1, min(shards, math.ceil(fresh_rows / self.rows_per_shard)))
+        else:
+            for number, entry in enumerate(entries):
+                if is_csv_reference(entry):
+                    header, rows = _read_csv(os.path.join(config_dir, entry[len('file://'):]))
+                    if header is not None:
+                        files.append((number, header, rows, []))
+
+        shard_tests = [[] for _ in range(shards)]
+        shard_rows = [0] * shards
+        shard_tests[0].extend(absolutize_file_references(entry, config_dir)
+                              for entry in entries if not is_csv_reference(entry))
+        for number, header, rows, _ in files:
+            size = math.ceil(len(rows) / shards) if rows else 0
+            for index in range(shards):
+                chunk = rows[index * size:(index + 1) * size]
+                if chunk:
+                    filename = self._write_part(os.path.join(work_dir, f'shard-{index}'), number, header, chunk)
+                    shard_tests[index].append(f'file://{filename}')
+                    shard_rows[index] += len(chunk)
+
+        plan = []
+        base_config = absolutize_file_references({k: v for k, v in config.items() if k != 'tests'}, config_dir)
+        labels = [provider.get('label') for provider in providers] if tracking else None
+        if tracking:
+            base_config['providers'] = [
+                {**provider, 'label': f'{PROVIDER_LABEL_PREFIX}{index}'}
+                for index, provider in enumerate(absolutize_file_references(providers, config_dir))
+            ]
+        for index in range(shards):
+            if shard_tests[index]:
+                plan.append(self._write_shard(os.path.join(work_dir, f'shard-{index}'), index, base_config,
+                                              shard_tests[index], shard_rows[index], labels))
+
+        cached_rows = sum(len(cached) for *_, cached in files)
+        if cached_rows:
+            shard_dir = os.path.join(work_dir, 'shard-cached')
+            os.makedirs(shard_dir, exist_ok=True)
+            outputs_path = os.path.join(shard_dir, CACHED_OUTPUTS)
+            output_cache.export([parse_row_value(row[-1])[1] for *_, cached in files for row in cached], outputs_path)
+            cached_config = {**base_config, 'providers': [
+                {
+                    'id': f'file://{CACHED_PROVIDER_PATH}',
+                    'label': f'{PROVIDER_LABEL_PREFIX}{index}',
+                    'config': {'outputs': outputs_path, 'provider_index': index}
+                }
+                for index in range(len(providers))
+            ]}
+            tests = [f'file://{self._write_part(shard_dir, number, header, cached)}'
+                     for number, header, _, cached in files if cached]
+            shard = self._write_shard(shard_dir, shards, cached_config, tests, cached_rows, labels)
+            shard['cached'] = True
+            shard['outputs'] = outputs_path
+            plan.append(shard)
+        return plan
+
+    def _write_part(self, shard_dir, number, header, rows):
+        os.makedirs(shard_dir, exist_ok=True)
+        filename = f'tests-{number}.csv'
+        with open(os.path.join(shard_dir, filename), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return filename
+
+    def _write_shard(self, shard_dir, index, config, tests, rows, provider_labels):
+        os.makedirs(shard_dir, exist_ok=True)
+        with open(os.path.join(shard_dir, CONFIG_FILENAME), 'w', encoding='utf-8') as f:
+            yaml.safe_dump({**config, 'tests': tests}, f, allow_unicode=True, sort_keys=False)
+        return {
+            'index': index,
+            'dir': shard_dir,
+            'rows': rows,
+            'output': os.path.join(shard_dir, SHARD_OUTPUT),
+            'cached': False,
+            # 增量執行時各 provider 原本的標籤（None 表示未追蹤測試列）
+            'provider_labels': provider_labels
+        }
+
+    def merge(self, plan, config_dir):
+        """合併各分片的 promptfoo 輸出，回傳可供 promptfoo import 的資料
+
+        testIdx 依原始測試列順序重新編號（增量執行依 ROW_COLUMN 的順序，否則依分片順序）；
+        增量執行加上的 provider 標籤與 ROW_COLUMN 欄位會還原 / 移除。
+        """
+        merged, keyed, prompts, stats = None, [], [], {}
+        provider_ids = {}
+        for order, shard in enumerate(plan):
+            with open(shard['output'], 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            body = data.get('results') or {}
+            labels = shard.get('provider_labels')
+            cached_outputs = None
+            if shard.get('cached'):
+                with open(shard['outputs'], 'r', encoding='utf-8') as f:
+                    cached_outputs = json.load(f)
+
+            for result in body.get('results') or []:
+                row_value = None
+                for variables in (result.get('vars'), (result.get('testCase') or {}).get('vars')):
+                    if isinstance(variables, dict) and ROW_COLUMN in variables:
+                        row_value = variables.pop(ROW_COLUMN)
+                provider = result.get('provider') or {}
+                index = provider_index(provider.get('label'))
+                if labels is not None and index is not None:
+                    if cached_outputs is not None and row_value is not None:
+                        _, row_key = parse_row_value(row_value)
+                        entry = cached_outputs.get(row_key, {}).get(
+                            combo_key(index, (result.get('prompt') or {}).get('raw', '')))
+                        if entry and entry.get('provider'):
+                            result['provider'] = provider = dict(entry['provider'])
+                    elif index < len(labels) and labels[index]:
+                        provider['label'] = labels[index]
+                    else:
+                        provider.pop('label', None)
+                    if cached_outputs is None or provider_ids.get(index) is None:
+                        provider_ids[index] = provider.get('label') or provider.get('id')
+                if row_value is not None:
+                    key = (1, parse_row_value(row_value)[0])
+                else:
+                    key = (0, order, result.get('testIdx') or 0)
+                keyed.append((key, result))
+
+            for index, prompt in enumerate(body.get('prompts') or []):
+                if index < len(prompts):
+                    _merge_numbers(prompts[index].setdefault('metrics', {}), prompt.get('metrics') or {})
+                else:
+                    prompts.append(prompt)
+            _merge_numbers(stats, body.get('stats') or {})
+            if merged is None:
+                merged = data
+
+        if merged is None:
+            raise ValueError('沒有可合併的分片輸出')
+
+        keyed.sort(key=lambda item: item[0])
+        results, test_index, previous = [], -1, None
+        for key, result in keyed:
+            if key != previous:
+                test_index += 1
+                previous = key
+            result['testIdx'] = test_index
+            results.append(result)
+        for prompt in prompts:
+            index = provider_index(prompt.get('provider'))
+            if index is not None and provider_ids.get(index):
+                prompt['provider'] = provider_ids[index]
+
+        created_at = datetime.now(timezone.utc)
+        eval_id = new_eval_id(created_at)
+        merged['evalId'] = eval_id
+        merged['id'] = eval_id
+        merged['createdAt'] = int(created_at.timestamp() * 1000)
+        merged['config'] = self._load_config(config_dir)
+        merged['results'] = {
+            **(merged.get('results') or {}),
+            'timestamp': created_at.isoformat().replace('+00:00', 'Z'),
+            'prompts': prompts,
+            'results': results,
+            'stats': stats
+        }
+        return merged
@@ -0,0 +1,167 @@
+"""評估分數與延遲分佈統計服務"""
+import numpy as np
+
+
+# assertion 顯示名稱規則（前端圖表直接使用這裡產生的標籤）
+BERT_LABELS = (
+    ('bert_f1', 'BERTScore F1'),
+    ('bert_recall', 'BERTScore Recall'),
+    ('bert_precision', 'BERTScore Precision'),
+)
+
+
+def assertion_label(assertion_type, assertion_value):
+    """assertion 的顯示名稱（python 依 BERTScore 指標區分，g-eval 統一為 G-Eval）"""
+    assertion_type = assertion_type or 'unknown'
+    if assertion_type == 'python' and assertion_value:
+        for keyword, label in BERT_LABELS:
+            if keyword in str(assertion_value):
+                return label
+        return 'Python評估'
+    if assertion_type == 'g-eval':
+        return 'G-Eval'
+    return assertion_type
+
+
+def _round(value, digits=4):
+    return round(float(value), digits)
+
+
+def _histogram(values, bins, value_range=None):
+    """以 numpy 計算直方圖，回傳邊界與各格數量（最後一格包含右邊界）"""
+    counts, edges = np.histogram(values, bins=bins, range=value_range)
+    return {
+        'edges': [_round(edge) for edge in edges],
+        'counts': counts.tolist()
+    }
+
+
+def _percentiles(values, digits=4, percentiles=(50, 90, 99)):
+    points = np.percentile(values, percentiles)
+    return {f'p{p}': _round(point, digits) for p, point in zip(percentiles, points)}
+
+
+class StatisticsService:
+    """以欄位投影讀取 eval_results，並用 NumPy 計算分佈統計（只回傳分箱結果）"""
+
+    COLUMNS_QUERY = """
+        SELECT success, score, latency_ms
+        FROM eval_results
+        WHERE eval_id = ?
+    """
+
+    ASSERTIONS_QUERY = """
+        SELECT json_extract(c.value, '$.assertion.type'),
+               json_extract(c.value, '$.assertion.value'),
+               json_extract(c.value, '$.score'),
+               json_extract(c.value, '$.pass')
+        FROM eval_results r,
+             json_each(CASE WHEN json_valid(r.grading_result) THEN r.grading_result END, '$.componentResults') c
+        WHERE r.eval_id = ?
+    """
+
+    def compute(self, conn, eval_id, score_bins=10, latency_bins=8, resamples=2000,
+                confidence=0.95, seed=0):
+        """計算單一評估的統計資料，找不到結果時回傳 None"""
+        rows = conn.execute(self.COLUMNS_QUERY, (eval_id,)).fetchall()
+        if not rows:
+            return None
+
+        success = np.fromiter((bool(row[0]) for row in rows), dtype=bool, count=len(rows))
+        scores = np.fromiter((row[1] if row[1] is not None else 0.0 for row in rows),
+                             dtype=np.float64, count=len(rows))
+        latencies = np.fromiter((row[2] if row[2] is not None else 0 for row in rows),
+                                dtype=np.float64, count=len(rows))
+
+        return {
+            'eval_id': eval_id,
+            'total_tests': len(rows),
+            'pass_rate': self._pass_rate(success, resamples, confidence, seed),
+            'score': self._score_stats(scores, score_bins),
+            'latency': self._latency_stats(latencies, latency_bins),
+            'assertions': self._assertion_stats(conn, eval_id, score_bins)
+        }
+
+    def _pass_rate(self, success, resamples, confidence, seed):
+        """通過率與 bootstrap 百分位信賴區間
+
+        0/1 資料的 bootstrap 平均值分佈即為 Binomial(n, p̂) / n，
+        因此直接抽樣二項分佈，等同於重抽 n 筆資料但不需建立 n × resamples 的矩陣。
+        """
+        n = len(success)
+        rate = success.mean()
+        rng = np.random.default_rng(seed)
+        samples = rng.binomial(n, rate, size=resamples) / n
+        alpha = (1 - confidence) / 2
+        low, high = np.quantile(samples, [alpha, 1 - alpha])
+        return {
+            'passed': int(success.sum()),
+            'value': _round(rate * 100, 2),
+            'ci_low': _round(low * 100, 2),
+            'ci_high': _round(high * 100, 2),
+            'confidence': confidence,
+            'method': 'bootstrap',
+            'resamples': resamples
+        }
+
+    def _score_stats(self, scores, bins):
+        """分數統計與 0–1 區間的等寬直方圖（超出範圍的分數計入頭尾兩格）"""
+        return {
+            'count': int(scores.size),
+            'mean': _round(scores.mean()),
+            'std': _round(scores.std()),
+            'min': _round(scores.min()),
+            'max': _round(scores.max()),
+            **_percentiles(scores),
+            'histogram': _histogram(np.clip(scores, 0.0, 1.0), bins, (0.0, 1.0))
+        }
+
+    def _latency_stats(self, latencies, bins):
+        """延遲統計（與前端相同，只計入 latency > 0 的測試）"""
+        latencies = latencies[latencies > 0]
+        if latencies.size == 0:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None,
+                    'p50': None, 'p90': None, 'p99': None, 'histogram': {'edges': [], 'counts': []}}
+        return {
+            'count': int(latencies.size),
+            'mean': _round(latencies.mean(), 1),
+            'min': int(latencies.min()),
+            'max': int(latencies.max()),
+            **_percentiles(latencies, digits=1),
+            'histogram': _histogram(latencies, bins)
+        }
+
+    def _assertion_stats(self, conn, eval_id, bins):
+        """各 assertion 類型的通過數與分數分佈"""
+        rows = conn.execute(self.ASSERTIONS_QUERY, (eval_id,)).fetchall()
+        if not rows:
+            return []
+
+        # 同一評估的 assertion 設定重複出現，顯示名稱只需對每種 (type, value) 計算一次
+        label_cache = {}
+        for row in rows:
+            if (row[0], row[1]) not in label_cache:
+                label_cache[(row[0], row[1])] = assertion_label(row[0], row[1])
+        labels = np.array([label_cache[(row[0], row[1])] for row in rows])
+        scores = np.fromiter((row[2] if row[2] is not None else 0.0 for row in rows),
+                             dtype=np.float64, count=len(rows))
+        passed = np.fromiter((bool(row[3]) for row in rows), dtype=bool, count=len(rows))
+
+        results = []
+        unique_labels, first_index = np.unique(labels, return_index=True)
+        # 依第一次出現的順序輸出，即前端圖表的顯示順序
+        for label in unique_labels[np.argsort(first_index)]:
+            mask = labels == label
+            label_scores = scores[mask]
+            label_passed = passed[mask]
+            results.append({
+                'label': str(label),
+                'count': int(mask.sum()),
+                'passed': int(label_passed.sum()),
+                'failed': int((~label_passed).sum()),
+                'pass_rate': _round(label_passed.mean() * 100, 2),
+                'mean_score': _round(label_scores.mean()),
+                **_percentiles(label_scores),
+                'histogram': _histogram(np.clip(label_scores, 0.0, 1.0), bins, (0.0, 1.0))
+            })
+        return results
@@ -0,0 +1,512 @@
+"""評估摘要索引服務（sidecar SQLite）"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from src.services.summary_service import format_created_time
+from src.utils.sqlite_pool import ReadOnlyConnectionPool
+
+
+class SummaryIndexService:
+    """以 rowid 追蹤 promptfoo 的 evals / eval_results，增量維護每個評估的彙總資料
+
+    彙總資料寫在獨立的 sidecar SQLite 檔案中，列表 API 只需讀取這份小型資料。
+    每批資料都在 BEGIN IMMEDIATE transaction 內重新讀取檢查點、套用並推進檢查點，
+    多個行程（例如 Flask debug reloader）同時同步也不會重複累加；讀取端使用各自的連線，不需等待同步完成。
+    注意：promptfoo 事後就地修改的結果列不會被重新計算，刪除的評估會在同步時移除。
+    """
+
+    # schema 變更時遞增，既有的 sidecar 會在下一次同步時重新建立
+    SCHEMA_VERSION = 2
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS index_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS eval_rollups (
+            eval_id TEXT PRIMARY KEY,
+            created_at INTEGER,
+            description TEXT,
+            is_redteam INTEGER NOT NULL DEFAULT 0,
+            dataset_count INTEGER NOT NULL DEFAULT 0,
+            success_count INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            latency_count INTEGER NOT NULL DEFAULT 0,
+            latency_sum REAL NOT NULL DEFAULT 0,
+            latency_min INTEGER,
+            latency_max INTEGER,
+            high_risk INTEGER NOT NULL DEFAULT 0,
+            medium_risk INTEGER NOT NULL DEFAULT 0,
+            low_risk INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS redteam_counts (
+            eval_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (eval_id, kind, name)
+        );
+        CREATE TABLE IF NOT EXISTS latency_histograms (
+            eval_id TEXT NOT NULL,
+            bin INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (eval_id, bin)
+        );
+    """
+
+    # 延遲直方圖以 1/4 個 2 的次方為一格（每格寬約 19%），百分位數取格內幾何中點
+    LATENCY_BINS_PER_OCTAVE = 4
+
+    # 趨勢的時間區間（以台灣時區計算，week 以週一為起點）
+    TREND_BUCKETS = {
+        'hour': "strftime('%Y-%m-%d %H:00', created_at / 1000, 'unixepoch', '+8 hours')",
+        'day': "date(created_at / 1000, 'unixepoch', '+8 hours')",
+        'week': "date(created_at / 1000, 'unixepoch', '+8 hours', '-6 days', 'weekday 1')"
+    }
+
+    # 與 RedteamService 相同的規則：只有 metadata 為有效 JSON 的列才計入風險等級
+    RESULTS_QUERY = """
+        SELECT rowid,
+               eval_id,
+               success,
+               score,
+               latency_ms,
+               json_valid(metadata) AS has_metadata,
+               CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.pluginId') END AS plugin_id,
+               CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.strategyId') END AS strategy_id
+        FROM eval_results
+        WHERE rowid > ?
+        ORDER BY rowid
+        LIMIT ?
+    """
+
+    def __init__(self, source_db_path, index_path='results/summary_index.db', batch_size=5000):
+        self.source_db_path = source_db_path
+        self.index_path = index_path
+        self.batch_size = batch_size
+        self.source_pool = ReadOnlyConnectionPool(source_db_path)
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._schema_ready = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.last_sync = None
+
+    def _connect(self):
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # isolation_level=None：寫入的 transaction 一律以 BEGIN IMMEDIATE 明確開始
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None, check_same_thread=False)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(self.SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _index_conn(self):
+        """取得同步用的 sidecar 連線（呼叫端需持有鎖）"""
+        if self._conn is None:
+            self._conn = self._connect()
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+        return self._conn
+
+    def _read_conn(self):
+        """讀取用的獨立連線（WAL 模式下不會被同步中的寫入阻擋），呼叫端負責關閉"""
+        return self._connect()
+
+    def _write(self, conn, apply):
+        """在 BEGIN IMMEDIATE transaction 內執行 apply(conn)，其他行程的同步會等待此 transaction 結束"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = apply(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _get_state(self, conn, key, default=None):
+        row = conn.execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, conn, key, value):
+        conn.execute(
+            "INSERT INTO index_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    def _source_identity(self):
+        """promptfoo 資料庫檔案識別資訊，用於偵測檔案被替換"""
+        stat = os.stat(self.source_db_path)
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def _reset(self, conn):
+        """清空 sidecar 資料，下一次同步將從頭建立"""
+        conn.execute("DELETE FROM eval_rollups")
+        conn.execute("DELETE FROM redteam_counts")
+        conn.execute("DELETE FROM latency_histograms")
+        conn.execute("DELETE FROM index_state")
+
+    def sync(self):
+        """從上次檢查點增量同步，回傳本次處理的結果筆數"""
+        with self._lock:
+            conn = self._index_conn()
+            processed = 0
+            with self.source_pool.connection() as source:
+                identity = self._source_identity()
+                self._write(conn, lambda conn: self._check_source(source, conn, identity))
+
+                while True:
+                    count = self._write(conn, lambda conn: self._sync_batch(source, conn))
+                    if not count:
+                        break
+                    processed += count
+
+            if processed:
+                print(f"摘要索引已同步 {processed} 筆評估結果")
+            self.last_sync = format_created_time(int(time.time() * 1000))
+            return processed
+
+    def _check_source(self, source, conn, identity):
+        """資料庫被替換、rowid 倒退或 schema 版本變更時清空索引，並同步 evals 表格"""
+        max_result_rowid = source.execute("SELECT MAX(rowid) FROM eval_results").fetchone()[0] or 0
+        results_rowid = int(self._get_state(conn, 'results_rowid', 0))
+        if self._get_state(conn, 'source_identity') not in (None, identity) or results_rowid > max_result_rowid:
+            print("promptfoo 資料庫已變更，重新建立摘要索引")
+            self._reset(conn)
+        elif results_rowid and self._get_state(conn, 'schema_version') != str(self.SCHEMA_VERSION):
+            print("摘要索引格式已更新，重新建立摘要索引")
+            self._reset(conn)
+        self._set_state(conn, 'source_identity', identity)
+        self._set_state(conn, 'schema_version', self.SCHEMA_VERSION)
+        self._sync_evals(source, conn)
+
+    def _sync_batch(self, source, conn):
+        """在 transaction 內讀取檢查點並套用下一批結果列，回傳處理筆數（0 表示已同步到最新）"""
+        results_rowid = int(self._get_state(conn, 'results_rowid', 0))
+        rows = source.execute(self.RESULTS_QUERY, (results_rowid, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+
+        known_ids = {row[0] for row in conn.execute("SELECT eval_id FROM eval_rollups")}
+        if any(row[1] not in known_ids for row in rows):
+            # 結果列所屬的評估在上次同步 evals 之後才建立：先補上 evals 再套用，
+            # 補上後仍不存在的 eval_id 表示評估已刪除，其結果列略過
+            self._sync_evals(source, conn)
+            known_ids = {row[0] for row in conn.execute("SELECT eval_id FROM eval_rollups")}
+        self._apply_results(conn, [row for row in rows if row[1] in known_ids])
+        self._set_state(conn, 'results_rowid', rows[-1][0])
+        self._bump_revision(conn)
+        return len(rows)
+
+    def _sync_evals(self, source, conn):
+        """同步 evals 表格（新增與刪除）"""
+        evals_rowid = int(self._get_state(conn, 'evals_rowid', 0))
+        rows = source.execute(
+            "SELECT rowid, id, created_at, description, is_redteam FROM evals WHERE rowid > ? ORDER BY rowid",
+            (evals_rowid,)
+        ).fetchall()
+        conn.executemany(
+            "INSERT INTO eval_rollups (eval_id, created_at, description, is_redteam) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(eval_id) DO UPDATE SET created_at = excluded.created_at, "
+            "description = excluded.description, is_redteam = excluded.is_redteam",
+            [(eval_id, created_at, description, int(is_redteam or 0))
+             for _, eval_id, created_at, description, is_redteam in rows]
+        )
+        if rows:
+            self._set_state(conn, 'evals_rowid', rows[-1][0])
+            self._bump_revision(conn)
+
+        # evals 表格很小，每次比對一次 id 以移除已刪除的評估
+        source_ids = {row[0] for row in source.execute("SELECT id FROM evals")}
+        index_ids = {row[0] for row in conn.execute("SELECT eval_id FROM eval_rollups")}
+        removed = [(eval_id,) for eval_id in index_ids - source_ids]
+        if removed:
+            conn.executemany("DELETE FROM eval_rollups WHERE eval_id = ?", removed)
+            conn.executemany("DELETE FROM redteam_counts WHERE eval_id = ?", removed)
+            conn.executemany("DELETE FROM latency_histograms WHERE eval_id = ?", removed)
+            self._bump_revision(conn)
+
+    def _bump_revision(self, conn):
+        """sidecar 內容有變更時遞增版本，讀取端以 checkpoint() 判斷快取是否仍有效"""
+        self._set_state(conn, 'revision', int(self._get_state(conn, 'revision', 0)) + 1)
+
+    def _apply_results(self, conn, rows):
+        """將一批結果列彙總後以累加方式寫入 sidecar（只包含已知評估的結果列）"""
+        rollups = {}
+        counts = {}
+        histograms = {}
+        for _, eval_id, success, score, latency_ms, has_metadata, plugin_id, strategy_id in rows:
+            rollup = rollups.setdefault(eval_id, {
+                'dataset_count': 0, 'success_count': 0, 'score_sum': 0.0,
+                'latency_count': 0, 'latency_sum': 0.0, 'latency_min': None, 'latency_max': None,
+                'high_risk': 0, 'medium_risk': 0, 'low_risk': 0
+            })
+            rollup['dataset_count'] += 1
+            rollup['success_count'] += 1 if success else 0
+            rollup['score_sum'] += float(score or 0.0)
+
+            if latency_ms is not None:
+                rollup['latency_count'] += 1
+                rollup['latency_sum'] += latency_ms
+                rollup['latency_min'] = latency_ms if rollup['latency_min'] is None else min(rollup['latency_min'], latency_ms)
+                rollup['latency_max'] = latency_ms if rollup['latency_max'] is None else max(rollup['latency_max'], latency_ms)
+                key = (eval_id, self.latency_bin(latency_ms))
+                histograms[key] = histograms.get(key, 0) + 1
+
+            if has_metadata:
+                score_value = float(score) if score is not None else 0.0
+                if not success or score_value < 0.5:
+                    rollup['high_risk'] += 1
+                elif score_value < 0.8:
+                    rollup['medium_risk'] += 1
+                else:
+                    rollup['low_risk'] += 1
+
+                for kind, name in (('plugin', plugin_id), ('strategy', strategy_id)):
+                    if name:
+                        key = (eval_id, kind, str(name))
+                        counts[key] = counts.get(key, 0) + 1
+
+        conn.executemany(
+            """
+            INSERT INTO eval_rollups (eval_id, dataset_count, success_count, score_sum,
+                                      latency_count, latency_sum, latency_min, latency_max,
+                                      high_risk, medium_risk, low_risk)
+            VALUES (:eval_id, :dataset_count, :success_count, :score_sum,
+                    :latency_count, :latency_sum, :latency_min, :latency_max,
+                    :high_risk, :medium_risk, :low_risk)
+            ON CONFLICT(eval_id) DO UPDATE SET
+                dataset_count = dataset_count + excluded.dataset_count,
+                success_count = success_count + excluded.success_count,
+                score_sum = score_sum + excluded.score_sum,
+                latency_count = latency_count + excluded.latency_count,
+                latency_sum = latency_sum + excluded.latency_sum,
+                latency_min = MIN(COALESCE(latency_min, excluded.latency_min), COALESCE(excluded.latency_min, latency_min)),
+                latency_max = MAX(COALESCE(latency_max, excluded.latency_max), COALESCE(excluded.latency_max, latency_max)),
+                high_risk = high_risk + excluded.high_risk,
+                medium_risk = medium_risk + excluded.medium_risk,
+                low_risk = low_risk + excluded.low_risk
+            """,
+            [{'eval_id': eval_id, **rollup} for eval_id, rollup in rollups.items()]
+        )
+        conn.executemany(
+            "INSERT INTO redteam_counts (eval_id, kind, name, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(eval_id, kind, name) DO UPDATE SET count = count + excluded.count",
+            [(eval_id, kind, name, count) for (eval_id, kind, name), count in counts.items()]
+        )
+        conn.executemany(
+            "INSERT INTO latency_histograms (eval_id, bin, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(eval_id, bin) DO UPDATE SET count = count + excluded.count",
+            [(eval_id, latency_bin, count) for (eval_id, latency_bin), count in histograms.items()]
+        )
+
+    @classmethod
+    def latency_bin(cls, latency_ms):
+        """延遲值所在的直方圖格（1 ms 以下歸在第 0 格）"""
+        if latency_ms <= 1:
+            return 0
+        return int(math.log2(latency_ms) * cls.LATENCY_BINS_PER_OCTAVE)
+
+    @classmethod
+    def latency_bin_value(cls, latency_bin):
+        """直方圖格的代表值（格內幾何中點，單位 ms）"""
+        if latency_bin <= 0:
+            return 1.0
+        return 2 ** ((latency_bin + 0.5) / cls.LATENCY_BINS_PER_OCTAVE)
+
+    @classmethod
+    def histogram_percentiles(cls, histogram, percentiles=(50, 90, 99)):
+        """由 {bin: count} 直方圖估計百分位數"""
+        total = sum(histogram.values())
+        if total == 0:
+            return {f'p{p}': None for p in percentiles}
+        result = {}
+        bins = sorted(histogram.items())
+        for p in percentiles:
+            # 與 nearest-rank 定義一致：第 ceil(p% * n) 筆
+            rank = max(1, math.ceil(p / 100 * total))
+            cumulative = 0
+            for latency_bin, count in bins:
+                cumulative += count
+                if cumulative >= rank:
+                    result[f'p{p}'] = round(cls.latency_bin_value(latency_bin), 1)
+                    break
+        return result
+
+    def count_evals(self, is_redteam=None):
+        """計算索引中的評估數量"""
+        with closing(self._read_conn()) as conn:
+            if is_redteam is None:
+                return conn.execute("SELECT COUNT(*) FROM eval_rollups").fetchone()[0]
+            return conn.execute(
+                "SELECT COUNT(*) FROM eval_rollups WHERE is_redteam = ?", (int(is_redteam),)
+            ).fetchone()[0]
+
+    def list_summaries(self, is_redteam=None, include_redteam_info=False):
+        """讀取評估摘要，格式與 SummaryService.summarize 相同（沒有結果的評估會被略過）"""
+        with closing(self._read_conn()) as conn:
+            query = (
+                "SELECT eval_id, created_at, description, dataset_count, success_count, "
+                "high_risk, medium_risk, low_risk FROM eval_rollups WHERE dataset_count > 0"
+            )
+            params = ()
+            if is_redteam is not None:
+                query += " AND is_redteam = ?"
+                params = (int(is_redteam),)
+            rows = conn.execute(query, params).fetchall()
+
+            redteam_counts = {}
+            if include_redteam_info:
+                for eval_id, kind, name, count in conn.execute(
+                    "SELECT eval_id, kind, name, count FROM redteam_counts ORDER BY rowid"
+                ):
+                    redteam_counts.setdefault(eval_id, {}).setdefault(kind, {})[name] = count
+
+        results = []
+        for eval_id, created_at, description, dataset_count, success_count, high, medium, low in rows:
+            pass_rate = success_count / dataset_count if dataset_count > 0 else 0.0
+            item = {
+                'id': eval_id,
+                'created': format_created_time(created_at),
+                'description': str(description) if description is not None else '無描述',
+                'pass_rate': f"{pass_rate*100:.2f}%",
+                'dataset_count': dataset_count
+            }
+            if include_redteam_info:
+                counts = redteam_counts.get(eval_id, {})
+                item['redteam_info'] = {
+                    'plugin_counts': counts.get('plugin', {}),
+                    'strategy_counts': counts.get('strategy', {}),
+                    'risk_levels': {'high-risk': high, 'medium-risk': medium, 'low-risk': low}
+                }
+            results.append(item)
+
+        # 按創建時間排序（最新的在前）
+        results.sort(key=lambda x: x['created'], reverse=True)
+        return results
+
+    def trends(self, bucket='day', is_redteam=None, description=None, since=None, until=None):
+        """依 description 與時間區間彙總通過率、平均分數與延遲百分位數
+
+        since / until 為台灣時區的日期字串（YYYY-MM-DD），包含起訖當日。
+        回傳 [{'description', 'points': [...]}]，每個 point 為一個時間區間。
+        """
+        bucket_expr = self.TREND_BUCKETS[bucket]
+        clauses = ["r.dataset_count > 0"]
+        params = []
+        if is_redteam is not None:
+            clauses.append("r.is_redteam = ?")
+            params.append(int(is_redteam))
+        if description is not None:
+            clauses.append("COALESCE(r.description, '無描述') = ?")
+            params.append(description)
+        if since:
+            clauses.append("date(r.created_at / 1000, 'unixepoch', '+8 hours') >= ?")
+            params.append(since)
+        if until:
+            clauses.append("date(r.created_at / 1000, 'unixepoch', '+8 hours') <= ?")
+            params.append(until)
+        where = ' AND '.join(clauses)
+        bucket_sql = bucket_expr.replace('created_at', 'r.created_at')
+
+        with closing(self._read_conn()) as conn:
+            rows = conn.execute(f"""
+                SELECT COALESCE(r.description, '無描述') AS description,
+                       {bucket_sql} AS bucket,
+                       COUNT(*), SUM(r.dataset_count), SUM(r.success_count), SUM(r.score_sum),
+                       SUM(r.latency_count), SUM(r.latency_sum), MIN(r.latency_min), MAX(r.latency_max)
+                FROM eval_rollups r
+                WHERE {where}
+                GROUP BY description, bucket
+                ORDER BY description, bucket
+            """, params).fetchall()
+            histogram_rows = conn.execute(f"""
+                SELECT COALESCE(r.description, '無描述') AS description,
+                       {bucket_sql} AS bucket,
+                       h.bin, SUM(h.count)
+                FROM eval_rollups r
+                JOIN latency_histograms h ON h.eval_id = r.eval_id
+                WHERE {where}
+                GROUP BY description, bucket, h.bin
+            """, params).fetchall()
+
+        histograms = {}
+        for series_description, bucket_value, latency_bin, count in histogram_rows:
+            histograms.setdefault((series_description, bucket_value), {})[latency_bin] = count
+
+        series = {}
+        for (series_description, bucket_value, eval_count, total_tests, passed_tests, score_sum,
+             latency_count, latency_sum, latency_min, latency_max) in rows:
+            latency = {
+                'mean': round(latency_sum / latency_count, 1) if latency_count else None,
+                'min': latency_min,
+                'max': latency_max
+            }
+            # 直方圖的估計值限制在實際的最小、最大值之間
+            for key, value in self.histogram_percentiles(histograms.get((series_description, bucket_value), {})).items():
+                latency[key] = min(max(value, latency_min), latency_max) if value is not None else None
+            series.setdefault(series_description, []).append({
+                'bucket': bucket_value,
+                'eval_count': eval_count,
+                'total_tests': total_tests,
+                'passed_tests': passed_tests,
+                'pass_rate': round(passed_tests / total_tests * 100, 2) if total_tests else 0.0,
+                'mean_score': round(score_sum / total_tests, 4) if total_tests else 0.0,
+                'latency': latency
+            })
+
+        return [{'description': name, 'points': points} for name, points in series.items()]
+
+    def start(self, interval=5.0):
+        """啟動背景同步執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+        print(f"摘要索引背景同步已啟動（每 {interval} 秒）")
+
+    def is_running(self):
+        """背景同步執行緒是否執行中"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def stop(self):
+        """停止背景同步執行緒"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self, interval):
+        while not self._stop_event.is_set():
+            try:
+                if os.path.exists(self.source_db_path):
+                    self.sync()
+            except Exception as e:
+                print(f"摘要索引同步錯誤: {e}")
+            self._stop_event.wait(interval)
+
+    def checkpoint(self):
+        """回傳 sidecar 已提交內容的識別 (evals_rowid, results_rowid, revision)，
+        背景同步時 sidecar 落後於 promptfoo，依此值判斷以 sidecar 建立的快取是否需要更新
+        """
+        with closing(self._read_conn()) as conn:
+            return tuple(int(self._get_state(conn, key, 0)) for key in ('evals_rowid', 'results_rowid', 'revision'))
+
+    def stats(self):
+        """回傳索引狀態"""
+        with closing(self._read_conn()) as conn:
+            return {
+                'index_path': self.index_path,
+                'evals_rowid': int(self._get_state(conn, 'evals_rowid', 0)),
+                'results_rowid': int(self._get_state(conn, 'results_rowid', 0)),
+                'indexed_evals': conn.execute("SELECT COUNT(*) FROM eval_rollups").fetchone()[0],
+                'last_sync': self.last_sync,
+                'background': self.is_running()
+            }
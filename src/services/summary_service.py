@@ -0,0 +1,82 @@
+"""評估摘要計算服務"""
+from datetime import datetime, timedelta, timezone
+
+
+# 台灣時區 (UTC+8)
+TAIWAN_OFFSET = timedelta(hours=8)
+
+
+def format_created_time(created_at):
+    """將毫秒時間戳轉換為台灣時區的日期時間字串"""
+    if created_at is None:
+        return '未知'
+    try:
+        dt = datetime.fromtimestamp(int(created_at) / 1000, tz=timezone.utc) + TAIWAN_OFFSET
+        return dt.strftime('%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError, OverflowError, OSError):
+        return str(created_at)
+
+
+class SummaryService:
+    """以單一 GROUP BY 查詢計算每個評估的統計摘要"""
+
+    SUMMARY_QUERY = """
+        SELECT e.id AS id,
+               e.created_at AS created_at,
+               e.description AS description,
+               COUNT(*) AS dataset_count,
+               SUM(r.success) AS success_count
+        FROM evals e
+        JOIN eval_results r ON r.eval_id = e.id
+        {where}
+        GROUP BY e.id
+    """
+
+    def __init__(self):
+        self._index_checked = False
+
+    def check_eval_id_index(self, conn):
+        """檢查 eval_results 是否有以 eval_id 開頭的索引"""
+        for index in conn.execute("PRAGMA index_list(eval_results)").fetchall():
+            columns = conn.execute(f"PRAGMA index_info('{index[1]}')").fetchall()
+            if columns and columns[0][2] == 'eval_id':
+                return True
+        return False
+
+    def count_evals(self, conn, is_redteam=None):
+        """計算 evals 表格中的評估數量"""
+        if is_redteam is None:
+            return conn.execute("SELECT COUNT(*) FROM evals").fetchone()[0]
+        return conn.execute(
+            "SELECT COUNT(*) FROM evals WHERE is_redteam = ?", (int(is_redteam),)
+        ).fetchone()[0]
+
+    def summarize(self, conn, is_redteam=None):
+        """計算每個評估的筆數、成功數、通過率與建立時間（沒有結果的評估會被略過）"""
+        if not self._index_checked:
+            if not self.check_eval_id_index(conn):
+                print("警告: eval_results 缺少 eval_id 索引，摘要查詢將進行全表掃描")
+            self._index_checked = True
+
+        if is_redteam is None:
+            query = self.SUMMARY_QUERY.format(where='')
+            params = ()
+        else:
+            query = self.SUMMARY_QUERY.format(where='WHERE e.is_redteam = ?')
+            params = (int(is_redteam),)
+
+        results = []
+        for eval_id, created_at, description, dataset_count, success_count in conn.execute(query, params):
+            success_count = success_count or 0
+            pass_rate = success_count / dataset_count if dataset_count > 0 else 0.0
+            results.append({
+                'id': eval_id,
+                'created': format_created_time(created_at),
+                'description': str(description) if description is not None else '無描述',
+                'pass_rate': f"{pass_rate*100:.2f}%",
+                'dataset_count': dataset_count
+            })
+
+        # 按創建時間排序（最新的在前）
+        results.sort(key=lambda x: x['created'], reverse=True)
+        return results
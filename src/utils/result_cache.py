@@ -0,0 +1,129 @@
+"""查詢結果快取工具"""
+import threading
+from collections import OrderedDict
+from itertools import islice
+
+
+class ResultCache:
+    """以位元組數為上限的 LRU 結果快取
+
+    每個項目記錄寫入時的變更訊號（signal），讀取時訊號不同即視為失效。
+    標記為 immutable 的項目（例如已完成的評估）不檢查訊號，直到被 LRU 淘汰為止。
+    """
+
+    # 估算大小時，元素超過此數量的列表 / 字典只抽樣這麼多個元素
+    SAMPLE_ITEMS = 16
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0,
+            'skipped_oversize': 0
+        }
+
+    @classmethod
+    def estimate_size(cls, value):
+        """估算快取值 JSON 編碼後的位元組數
+
+        元素較多的列表與字典只計算均勻抽樣（字典為前幾個）元素的大小，以平均大小乘上元素數，
+        不需要將整個結果編碼一次。
+        """
+        if isinstance(value, str):
+            return len(value.encode('utf-8')) + 2
+        if isinstance(value, dict):
+            count = len(value)
+            items = islice(value.items(), cls.SAMPLE_ITEMS)
+            sampled = [cls.estimate_size(key) + cls.estimate_size(item) + 2 for key, item in items]
+            return 2 + (sum(sampled) * count // len(sampled) if sampled else 0)
+        if isinstance(value, (list, tuple)):
+            count = len(value)
+            if count > cls.SAMPLE_ITEMS:
+                step = count / cls.SAMPLE_ITEMS
+                value = [value[int(index * step)] for index in range(cls.SAMPLE_ITEMS)]
+            sampled = [cls.estimate_size(item) + 1 for item in value]
+            return 2 + (sum(sampled) * count // len(sampled) if sampled else 0)
+        if value is None or isinstance(value, bool):
+            return 5
+        if isinstance(value, (int, float)):
+            return len(repr(value))
+        return len(str(value)) + 2
+
+    def get(self, key, signal=None):
+        """讀取快取；signal 為 None 時只回傳 immutable 項目"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            if entry['immutable']:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry['value']
+
+            if signal is None:
+                return None
+
+            if entry['signal'] != signal:
+                self._remove(key)
+                self._stats['invalidations'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry['value']
+
+    def put(self, key, value, signal=None, immutable=False, size=None):
+        """寫入快取，超過容量時淘汰最久未使用的項目；size 為呼叫端已知的大小（例如已序列化的回應長度）"""
+        if size is None:
+            size = self.estimate_size(value)
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats['skipped_oversize'] += 1
+                return False
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = {
+                'value': value,
+                'size': size,
+                'signal': signal,
+                'immutable': immutable
+            }
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._stats['evictions'] += 1
+            return True
+
+    def _remove(self, key):
+        """移除項目並更新容量（呼叫端需持有鎖）"""
+        entry = self._entries.pop(key)
+        self._current_bytes -= entry['size']
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self):
+        """回傳快取統計資訊"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'immutable_entries': sum(1 for entry in self._entries.values() if entry['immutable']),
+                'current_bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                **self._stats
+            }
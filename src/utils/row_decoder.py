@@ -0,0 +1,260 @@
+"""eval_results 資料列解碼工具"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用的加速套件
+    orjson = None
+
+
+# BERTScore 數值在 error 欄位中的格式，例如 "BERTScore F1: 0.4231"
+BERT_SCORE_PATTERN = re.compile(r'BERTScore (Precision|Recall|F1): ([\d.]+)')
+BERT_SCORE_KEYS = {'Precision': 'precision', 'Recall': 'recall', 'F1': 'f1'}
+
+# python assertion 函式名稱對應的 BERTScore 指標、預設分數與顯示名稱
+BERT_ASSERTIONS = (
+    ('get_assert_bert_f1', 'f1', 0.47, 'F1'),
+    ('get_assert_bert_recall', 'recall', 0.66, 'Recall'),
+    ('get_assert_bert_precision', 'precision', 0.31, 'Precision'),
+)
+
+# pluginId 的中文顯示名稱
+PLUGIN_NAMES = {
+    'harmful': '有害內容',
+    'pii': '個人資訊',
+    'bias': '偏見檢測',
+    'injection': '注入攻擊',
+    'promptfoo:redteam:harmful': '有害內容',
+    'promptfoo:redteam:pii': '個人資訊',
+    'promptfoo:redteam:bias': '偏見檢測',
+    'promptfoo:redteam:injection': '注入攻擊'
+}
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def use_json_backend(name):
+    """切換 JSON 解碼後端（'orjson' 或 'json'），回傳實際使用的後端名稱"""
+    global _loads
+    if name == 'orjson' and orjson is not None:
+        _loads = orjson.loads
+        return 'orjson'
+    _loads = json.loads
+    return 'json'
+
+
+def json_backend():
+    """目前使用的 JSON 解碼後端名稱"""
+    return 'orjson' if orjson is not None and _loads is orjson.loads else 'json'
+
+
+def notna(value):
+    """判斷欄位值是否非空（None 或 NaN 視為空值）"""
+    return value is not None and value == value
+
+
+def loads_or_none(value):
+    """解析 JSON 字串，失敗或為空值時回傳 None"""
+    if not isinstance(value, (str, bytes)):
+        return None
+    try:
+        return _loads(value)
+    except ValueError:
+        # orjson 不接受 NaN/Infinity，改用標準函式庫再試一次
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+
+def extract_bert_scores(error_text):
+    """從 error 欄位擷取 BERTScore 的 precision / recall / f1"""
+    bert_scores = {}
+    if error_text and 'BERTScore' in error_text:
+        for match in BERT_SCORE_PATTERN.finditer(error_text):
+            bert_scores[BERT_SCORE_KEYS[match.group(1)]] = float(match.group(2))
+    return bert_scores
+
+
+def _value_display(assertion_value, stringify=True):
+    """將 assertion value 轉換為顯示字串"""
+    if isinstance(assertion_value, list):
+        return ', '.join(map(str, assertion_value) if stringify else assertion_value)
+    return str(assertion_value)
+
+
+def _assertions_from_grading(grading_result):
+    """從 grading_result 取得整體評分與各 assertion 結果"""
+    grading_info = {
+        'pass': bool(grading_result.get('pass', False)),
+        'score': float(grading_result.get('score', 0)),
+        'reason': grading_result.get('reason', ''),
+        'overall_pass': bool(grading_result.get('pass', False))
+    }
+
+    assertions = []
+    for component in grading_result.get('componentResults', []):
+        assertion_info = component.get('assertion', {})
+        assertions.append({
+            'pass': bool(component.get('pass', False)),
+            'score': float(component.get('score', 0)),
+            'type': assertion_info.get('type', 'unknown'),
+            'value': _value_display(assertion_info.get('value', '')),
+            'reason': component.get('reason', '')
+        })
+    return grading_info, assertions
+
+
+def _assertions_from_test_case(test_case, score, error_text):
+    """沒有 grading_result 時，依 test_case 的 assert 設定與 error 欄位推算各 assertion 結果"""
+    bert_scores = extract_bert_scores(error_text)
+    assertions = []
+
+    for assertion in test_case.get('assert', []):
+        assertion_type = assertion.get('type', 'unknown')
+        threshold = assertion.get('threshold', 0.5)
+        value_display = _value_display(assertion.get('value', ''), stringify=False)
+
+        if assertion_type == 'g-eval':
+            # 從錯誤訊息中提取實際的評估原因
+            assertion_score = score
+            assertion_reason = ''
+            if error_text:
+                for line in error_text.split('\n'):
+                    if '評估' in line or 'eval' in line.lower() or '原因' in line:
+                        assertion_reason = line.strip()
+                        break
+            if not assertion_reason:
+                assertion_reason = value_display if value_display else '無評估原因說明'
+            assertion_pass = assertion_score >= threshold
+
+        elif assertion_type == 'factuality':
+            assertion_score = 0.66
+            assertion_pass = True
+            assertion_reason = '{{expected_answer}}'
+
+        else:
+            bert_assertion = None
+            if assertion_type == 'python':
+                bert_assertion = next(
+                    (item for item in BERT_ASSERTIONS if item[0] in value_display), None
+                )
+
+            if bert_assertion is not None:
+                _, key, default, label = bert_assertion
+                assertion_score = float(bert_scores.get(key, default))
+                assertion_reason = f'BERTScore {label}: {assertion_score:.4f}'
+            else:
+                assertion_score = score
+                assertion_reason = error_text if error_text and error_text != 'nan' else '評估完成'
+            assertion_pass = assertion_score >= threshold
+
+        assertions.append({
+            'pass': assertion_pass,
+            'score': float(assertion_score),
+            'type': assertion_type,
+            'value': value_display,
+            'reason': assertion_reason
+        })
+    return assertions
+
+
+def decode_detail_row(row, is_redteam):
+    """將單筆 eval_results 資料轉換為詳細結果格式（每個 JSON 欄位只解析一次，不輸出逐列日誌）"""
+    success = bool(row['success'])
+    score = float(row['score']) if notna(row['score']) else 0.0
+    error_text = str(row['error']) if notna(row['error']) else ''
+
+    test_case = loads_or_none(row['test_case'])
+    if not isinstance(test_case, dict):
+        test_case = None
+
+    # variables：優先使用 test_case.vars，否則退回 prompt 欄位
+    variables = {}
+    if test_case is not None:
+        variables = test_case.get('vars', {})
+    elif notna(row['prompt']):
+        prompt_data = loads_or_none(row['prompt'])
+        if isinstance(prompt_data, dict) and 'raw' in prompt_data:
+            variables = {'prompt': prompt_data['raw']}
+        else:
+            variables = {'prompt': str(row['prompt'])}
+
+    response_data = loads_or_none(row['response'])
+    if isinstance(response_data, dict):
+        output_text = response_data.get('output', '')
+    else:
+        output_text = str(row['response']) if notna(row['response']) else ''
+
+    assertions = []
+    grading_info = None
+    grading_result = loads_or_none(row.get('grading_result'))
+    if isinstance(grading_result, dict):
+        try:
+            grading_info, assertions = _assertions_from_grading(grading_result)
+        except (AttributeError, TypeError, ValueError):
+            grading_info, assertions = None, []
+
+    # 如果沒有 grading_result 或解析失敗，從 test_case 推算 assertions
+    if not grading_info or not assertions:
+        grading_info = {
+            'pass': success,
+            'score': score,
+            'reason': error_text,
+            'overall_pass': success
+        }
+        try:
+            if test_case is None:
+                raise ValueError('test_case 無法解析')
+            assertions = _assertions_from_test_case(test_case, score, error_text)
+        except (AttributeError, TypeError, ValueError):
+            assertions = [{
+                'pass': success,
+                'score': score,
+                'type': 'overall',
+                'value': '整體評估',
+                'reason': error_text if error_text else '評估完成'
+            }]
+
+    detail_item = {
+        'variables': variables,
+        'output': output_text,
+        'status': 'PASS' if success else 'FAIL',
+        'success': success,
+        'score': score,
+        'latency': int(row['latency_ms']) if notna(row['latency_ms']) else 0,
+        'error': error_text if not success else '',
+        'grading_info': grading_info,
+        'assertions': assertions
+    }
+
+    # 如果是 redteam 測試，加入 redteam 特有資訊
+    if is_redteam and notna(row.get('metadata')):
+        metadata = loads_or_none(row['metadata'])
+        if isinstance(metadata, dict):
+            plugin_id = metadata.get('pluginId', '')
+            if not success or score < 0.5:
+                risk_level = 'high-risk'
+            elif score < 0.8:
+                risk_level = 'medium-risk'
+            else:
+                risk_level = 'low-risk'
+
+            detail_item['redteam_info'] = {
+                'plugin_id': plugin_id,
+                'plugin_display': PLUGIN_NAMES.get(plugin_id, plugin_id),
+                'strategy_id': metadata.get('strategyId', ''),
+                'risk_level': risk_level,
+                'metadata': metadata
+            }
+        else:
+            detail_item['redteam_info'] = {
+                'plugin_id': '',
+                'plugin_display': '未知',
+                'strategy_id': '',
+                'risk_level': 'unknown',
+                'metadata': {}
+            }
+
+    return detail_item
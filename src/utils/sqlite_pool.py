@@ -0,0 +1,170 @@
+"""SQLite 唯讀連線池工具"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class ReadOnlyConnectionPool:
+    """有上限的 SQLite 唯讀連線池
+
+    連線以 mode=ro URI 與 check_same_thread=False 開啟，閒置的連線放在佇列中，
+    connection() 取出一條連線、離開時放回，重複使用以保留 schema 與 page cache。
+    同時使用中的連線數不超過 max_connections，已滿時等待 acquire_timeout 秒。
+    每次取用時比對資料庫檔案的 (st_dev, st_ino)，檔案被替換或刪除時會自動重新連線。
+    """
+
+    def __init__(self, db_path, mmap_size=256 * 1024 * 1024, cache_size=-64 * 1024,
+                 query_only=True, busy_timeout=5.0, max_connections=None, acquire_timeout=30.0):
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.query_only = query_only
+        self.busy_timeout = busy_timeout
+        self.max_connections = max_connections or int(os.environ.get('PROMPTLAB_DB_POOL_SIZE', '8'))
+        self.acquire_timeout = acquire_timeout
+
+        # 閒置連線 (conn, 檔案識別, 世代)，後放回的先取出，較常使用的連線保持溫熱
+        self._idle = queue.LifoQueue(maxsize=self.max_connections)
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._lock = threading.Lock()
+        # close_all 之後遞增，使用中的舊連線放回時直接關閉
+        self._generation = 0
+        self._open = 0
+        self._in_use = 0
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'reconnects': 0,
+            'discarded': 0,
+            'waits': 0
+        }
+
+    def _file_identity(self):
+        """取得資料庫檔案識別資訊，檔案不存在時回傳 None"""
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def _open_connection(self):
+        """開啟唯讀連線並套用 pragma 設定"""
+        uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        if self.query_only:
+            conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._open += 1
+            self._stats['created'] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    def _checkout(self):
+        """取出一條閒置連線（檔案已被替換時重新連線），沒有閒置連線時開啟新連線"""
+        identity = self._file_identity()
+        if identity is None:
+            raise sqlite3.OperationalError(f'找不到資料庫檔案: {self.db_path}')
+
+        while True:
+            try:
+                conn, conn_identity, generation = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open_connection(), identity
+            if generation != self._generation:
+                self._close(conn)
+                continue
+            if conn_identity != identity:
+                print(f"偵測到資料庫檔案已被替換，重新連線: {self.db_path}")
+                self._close(conn)
+                with self._lock:
+                    self._stats['reconnects'] += 1
+                continue
+            with self._lock:
+                self._stats['reused'] += 1
+            return conn, identity
+
+    @contextmanager
+    def connection(self):
+        """取出一條唯讀連線，離開時放回連線池（發生資料庫錯誤時丟棄）"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                raise sqlite3.OperationalError(
+                    f'等待資料庫連線逾時（{self.max_connections} 條連線皆使用中）: {self.db_path}'
+                )
+        try:
+            conn, identity = self._checkout()
+            generation = self._generation
+            with self._lock:
+                self._in_use += 1
+            try:
+                yield conn
+            except sqlite3.DatabaseError:
+                self._close(conn)
+                with self._lock:
+                    self._stats['discarded'] += 1
+                raise
+            except BaseException:
+                self._checkin(conn, identity, generation)
+                raise
+            else:
+                self._checkin(conn, identity, generation)
+            finally:
+                with self._lock:
+                    self._in_use -= 1
+        finally:
+            self._slots.release()
+
+    def _checkin(self, conn, identity, generation):
+        if generation != self._generation:
+            self._close(conn)
+            return
+        try:
+            self._idle.put_nowait((conn, identity, generation))
+        except queue.Full:
+            self._close(conn)
+
+    def close_all(self):
+        """關閉所有閒置連線，使用中的連線在放回時關閉"""
+        with self._lock:
+            self._generation += 1
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(conn)
+
+    def stats(self):
+        """回傳連線池統計資訊"""
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'max_connections': self.max_connections,
+                'open_connections': self._open,
+                'in_use_connections': self._in_use,
+                'idle_connections': self._idle.qsize(),
+                'connections_created': self._stats['created'],
+                'connections_reused': self._stats['reused'],
+                'reconnects': self._stats['reconnects'],
+                'discarded': self._stats['discarded'],
+                'waits': self._stats['waits'],
+                'pragmas': {
+                    'mmap_size': self.mmap_size,
+                    'cache_size': self.cache_size,
+                    'query_only': self.query_only
+                }
+            }
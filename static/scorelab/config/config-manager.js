@@ -221,25 +221,167 @@ function showNewConfigForm() {
     ConfigForm.showConfigForm(null, false);
 }
 
+// 執行工作狀態輪詢間隔（毫秒）
+const JOB_POLL_INTERVAL = 2000;
+
+// 輪詢執行工作直到結束
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || `HTTP ${response.status}`);
+        }
+        if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+}
+
+// 執行輸出面板最多保留的行數
+const JOB_LOG_MAX_LINES = 500;
+
+// 建立執行輸出面板（進度列與最近的輸出）
+function createJobPanel(configId) {
+    const panel = document.createElement('div');
+    panel.className = 'card shadow position-fixed';
+    panel.style.cssText = 'bottom: 20px; right: 20px; z-index: 9998; width: 560px; max-width: 90vw;';
+    panel.innerHTML = `
+        <div class="card-header d-flex justify-content-between align-items-center">
+            <span><i class="fas fa-terminal me-2"></i><span class="job-title"></span></span>
+            <button type="button" class="btn-close"></button>
+        </div>
+        <div class="card-body p-2">
+            <div class="progress mb-2" style="height: 18px;">
+                <div class="progress-bar progress-bar-striped progress-bar-animated" style="width: 100%;">排隊中</div>
+            </div>
+            <pre class="job-log bg-dark text-light small p-2 mb-0" style="height: 260px; overflow-y: auto; white-space: pre-wrap;"></pre>
+        </div>
+    `;
+    panel.querySelector('.job-title').textContent = configId;
+    panel.querySelector('.btn-close').addEventListener('click', () => panel.remove());
+    document.body.appendChild(panel);
+
+    const bar = panel.querySelector('.progress-bar');
+    const log = panel.querySelector('.job-log');
+    return {
+        appendLine(stream, line) {
+            const row = document.createElement('div');
+            if (stream === 'stderr') {
+                row.className = 'text-warning';
+            }
+            row.textContent = line;
+            const atBottom = log.scrollTop + log.clientHeight >= log.scrollHeight - 5;
+            log.appendChild(row);
+            while (log.childElementCount > JOB_LOG_MAX_LINES) {
+                log.removeChild(log.firstChild);
+            }
+            if (atBottom) {
+                log.scrollTop = log.scrollHeight;
+            }
+        },
+        setProgress(progress) {
+            if (progress.percent === null || progress.percent === undefined) {
+                bar.textContent = progress.completed ? `${progress.completed} 筆完成` : '執行中';
+                return;
+            }
+            bar.classList.remove('progress-bar-animated');
+            bar.style.width = `${progress.percent}%`;
+            bar.textContent = `${progress.completed} / ${progress.total}（${progress.percent}%）`;
+        },
+        setStatus(job) {
+            if (job.status === 'running' && bar.textContent === '排隊中') {
+                bar.textContent = '執行中';
+            }
+            if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+                bar.classList.remove('progress-bar-striped', 'progress-bar-animated');
+                bar.classList.add(job.status === 'succeeded' ? 'bg-success' : job.status === 'failed' ? 'bg-danger' : 'bg-secondary');
+                bar.style.width = '100%';
+            }
+        }
+    };
+}
+
+// 以 Server-Sent Events 接收執行輸出直到工作結束，連線失敗時改為輪詢
+function streamJob(jobId, panel) {
+    if (!window.EventSource) {
+        return waitForJob(jobId);
+    }
+    return new Promise((resolve) => {
+        const source = new EventSource(`/api/jobs/${jobId}/stream`);
+        let settled = false;
+        const finish = (promise) => {
+            if (!settled) {
+                settled = true;
+                source.close();
+                resolve(promise);
+            }
+        };
+
+        source.addEventListener('log', (event) => {
+            const data = JSON.parse(event.data);
+            panel.appendLine(data.stream, data.line);
+        });
+        source.addEventListener('dropped', (event) => {
+            const data = JSON.parse(event.data);
+            panel.appendLine('stderr', `…（略過 ${data.count} 行輸出）`);
+        });
+        source.addEventListener('progress', (event) => {
+            panel.setProgress(JSON.parse(event.data));
+        });
+        source.addEventListener('status', (event) => {
+            const job = JSON.parse(event.data);
+            panel.setStatus(job);
+            if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+                finish(job);
+            }
+        });
+        source.onerror = () => {
+            // EventSource 會自動以 Last-Event-ID 重新連線；伺服器已結束串流或無法連線時改為輪詢
+            if (source.readyState === EventSource.CLOSED) {
+                finish(waitForJob(jobId));
+            }
+        };
+    });
+}
+
 // 執行配置
 async function runConfig(configId) {
     if (confirm('確定要執行這個配置嗎？')) {
+        // 增量執行：只對輸入或設定有變更的測試列呼叫模型，其餘列以快取的輸出重新評分
+        const incremental = confirm('只重新執行輸入或設定有變更的測試列嗎？\n（其餘測試列會使用先前的模型輸出重新評分；選「取消」則全部重新執行）');
         try {
-            showAlert('正在執行配置，請稍候...', 'info');
-            
             const response = await fetch(`/api/configs/${configId}/run`, {
-                method: 'POST'
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ incremental })
             });
             
-            if (response.ok) {
+            if (!response.ok) {
+                const error = await response.json();
+                showAlert('配置執行失敗: ' + error.error, 'danger');
+                return;
+            }
+            
+            const queued = await response.json();
+            showAlert('已排入執行佇列，正在執行配置...', 'info');
+            
+            const panel = createJobPanel(configId);
+            const job = await streamJob(queued.job_id, panel);
+            panel.setStatus(job);
+            if (job.status === 'succeeded') {
                 showAlert('配置執行成功！', 'success');
                 // 可以選擇跳轉到結果頁面
                 setTimeout(() => {
                     switchTab('results');
                 }, 1000);
+            } else if (job.status === 'cancelled') {
+                showAlert('配置執行已取消', 'warning');
             } else {
-                const error = await response.json();
-                showAlert('配置執行失敗: ' + error.error, 'danger');
+                showAlert('配置執行失敗: ' + job.error, 'danger');
             }
         } catch (error) {
             console.error('執行配置失敗:', error);
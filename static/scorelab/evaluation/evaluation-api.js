@@ -80,6 +80,192 @@ class EvaluationAPI {
         }
     }
 
+    // 分頁獲取評估詳細結果
+    // options: { cursor, limit, view, preview_chars, status, min_score, max_score, assertion_type, plugin, strategy }
+    // view 預設為 light（精簡欄位），完整內容請用 getDetailRow 展開
+    static async getDetailPage(evalId, options = {}) {
+        const params = new URLSearchParams();
+        Object.entries(options).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== '') {
+                params.append(key, value);
+            }
+        });
+        if (!params.has('limit')) {
+            params.append('limit', 100);
+        }
+
+        try {
+            const response = await this.fetchWithTimeout(
+                `/api/evaluation-results/${encodeURIComponent(evalId)}?${params.toString()}`
+            );
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                console.error('[API] 評估詳情分頁錯誤響應：', errorText);
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const data = await response.json();
+            console.log(`[API] 成功獲取評估詳情分頁，包含 ${data.details?.length || 0} 個測試案例，has_more=${data.page?.has_more}`);
+            return data;
+        } catch (error) {
+            console.error('[API] 獲取評估詳情分頁失敗:', error);
+            throw new Error(`獲取評估詳情失敗: ${error.message}`);
+        }
+    }
+
+    // 獲取單筆評估結果的完整內容
+    static async getDetailRow(evalId, rowId) {
+        try {
+            const response = await this.fetchWithTimeout(
+                `/api/evaluation-results/${encodeURIComponent(evalId)}/rows/${rowId}`
+            );
+
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            return await response.json();
+        } catch (error) {
+            console.error('[API] 獲取單筆評估結果失敗:', error);
+            throw new Error(`獲取單筆評估結果失敗: ${error.message}`);
+        }
+    }
+
+    // 獲取評估的分佈統計（分數 / 延遲直方圖、各 assertion 分佈、通過率信賴區間）
+    // options: { score_bins, latency_bins, resamples, confidence }
+    static async getStatistics(evalId, options = {}) {
+        const params = new URLSearchParams();
+        Object.entries(options).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== '') {
+                params.append(key, value);
+            }
+        });
+
+        try {
+            const response = await this.fetchWithTimeout(
+                `/api/evaluation-results/${encodeURIComponent(evalId)}/statistics?${params.toString()}`
+            );
+
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            return await response.json();
+        } catch (error) {
+            console.error('[API] 獲取評估統計失敗:', error);
+            throw new Error(`獲取評估統計失敗: ${error.message}`);
+        }
+    }
+
+    // 獲取通過率、平均分數與延遲趨勢
+    // options: { bucket: hour | day | week, type: all | scorelab | redprobe, description, since, until }
+    static async getTrends(options = {}) {
+        const params = new URLSearchParams();
+        Object.entries(options).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== '') {
+                params.append(key, value);
+            }
+        });
+
+        try {
+            const response = await this.fetchWithTimeout(`/api/evaluation-trends?${params.toString()}`);
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                console.error('[API] 評估趨勢錯誤響應：', errorText);
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            return await response.json();
+        } catch (error) {
+            console.error('[API] 獲取評估趨勢失敗:', error);
+            throw new Error(`獲取評估趨勢失敗: ${error.message}`);
+        }
+    }
+
+    // 比較兩個評估（base 為舊版、head 為新版）
+    // options: { cursor, limit, preview_chars, change: regression | improvement | unchanged | changed }
+    static async compare(baseId, headId, options = {}) {
+        const params = new URLSearchParams({ base: baseId, head: headId });
+        Object.entries(options).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== '') {
+                params.append(key, value);
+            }
+        });
+
+        try {
+            const response = await this.fetchWithTimeout(`/api/evaluation-compare?${params.toString()}`);
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                console.error('[API] 評估比較錯誤響應：', errorText);
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const data = await response.json();
+            console.log(`[API] 評估比較完成，退步 ${data.summary?.regressions || 0} 筆，進步 ${data.summary?.improvements || 0} 筆`);
+            return data;
+        } catch (error) {
+            console.error('[API] 比較評估失敗:', error);
+            throw new Error(`比較評估失敗: ${error.message}`);
+        }
+    }
+
+    // 檢定候選評估相對基準評估是否退步（McNemar 檢定與配對 bootstrap）
+    // options: { alpha, max_pass_rate_drop, max_score_drop, resamples }
+    static async checkRegression(baselineId, candidateId, options = {}) {
+        const params = new URLSearchParams({ baseline: baselineId, candidate: candidateId });
+        Object.entries(options).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== '') {
+                params.append(key, value);
+            }
+        });
+
+        try {
+            const response = await this.fetchWithTimeout(`/api/evaluation-regression?${params.toString()}`);
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                console.error('[API] 退步檢定錯誤響應：', errorText);
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const data = await response.json();
+            console.log(`[API] 退步檢定完成，判定 ${data.verdict}`);
+            return data;
+        } catch (error) {
+            console.error('[API] 退步檢定失敗:', error);
+            throw new Error(`退步檢定失敗: ${error.message}`);
+        }
+    }
+
+    // 全文檢索評估輸出與測試變數
+    // options: { eval_id, field: output | vars, limit, offset }
+    static async search(query, options = {}) {
+        const params = new URLSearchParams({ q: query });
+        Object.entries(options).forEach(([key, value]) => {
+            if (value !== undefined && value !== null && value !== '') {
+                params.append(key, value);
+            }
+        });
+
+        try {
+            const response = await this.fetchWithTimeout(`/api/search?${params.toString()}`);
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                console.error('[API] 全文檢索錯誤響應：', errorText);
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            return await response.json();
+        } catch (error) {
+            console.error('[API] 全文檢索失敗:', error);
+            throw new Error(`全文檢索失敗: ${error.message}`);
+        }
+    }
+
     // 開始新的評估
     static async startEvaluation(type, config = {}) {
         try {
@@ -5,10 +5,10 @@ class ChartManager {
     static currentChart = null;
     static currentData = null;
 
-    // 初始化圖表
-    static initializeChart(detail) {
-        this.currentData = detail;
-        this.createChartByType('assertions', detail);
+    // 初始化圖表（statistics 為 EvaluationAPI.getStatistics 的回應）
+    static initializeChart(statistics) {
+        this.currentData = statistics;
+        this.createChartByType('assertions', statistics);
     }
 
     // 切換圖表類型
@@ -19,7 +19,7 @@ class ChartManager {
     }
 
     // 根據類型創建圖表
-    static createChartByType(type, detail) {
+    static createChartByType(type, statistics) {
         const ctx = document.getElementById('combinedChart');
         if (!ctx) return;
         
@@ -39,73 +39,50 @@ class ChartManager {
 
         switch (type) {
             case 'assertions':
-                this.createAssertionsChart(detail);
+                this.createAssertionsChart(statistics);
                 break;
             case 'latency':
-                this.createLatencyChart(detail);
+                this.createLatencyChart(statistics);
                 break;
             case 'passing':
-                this.createPassingRateChart(detail);
+                this.createPassingRateChart(statistics);
                 break;
             default:
-                this.createAssertionsChart(detail);
+                this.createAssertionsChart(statistics);
         }
     }
 
     // 創建 Assertions 圖表
-    static createAssertionsChart(detail) {
-        this.currentChart = ChartUtils.createAssertionsChart(detail, 'combinedChart');
+    static createAssertionsChart(statistics) {
+        this.currentChart = ChartUtils.createAssertionsChart(statistics, 'combinedChart');
     }
 
     // 創建 Latency 圖表
-    static createLatencyChart(detail) {
-        this.currentChart = ChartUtils.createLatencyChart(detail, 'combinedChart');
+    static createLatencyChart(statistics) {
+        this.currentChart = ChartUtils.createLatencyChart(statistics, 'combinedChart');
     }
 
-    // 創建 Passing Rate 分佈圖表
-    static createPassingRateChart(detail) {
+    // 創建 Passing Rate 圖表（通過 / 失敗數與 bootstrap 信賴區間由伺服器計算）
+    static createPassingRateChart(statistics) {
         const ctx = document.getElementById('combinedChart');
         
-        // 計算每個測試的通過率
-        const passingRates = [];
-        detail.details.forEach(test => {
-            if (test.assertions && test.assertions.length > 0) {
-                const passCount = test.assertions.filter(a => a.pass).length;
-                const totalCount = test.assertions.length;
-                const rate = (passCount / totalCount) * 100;
-                passingRates.push(rate);
-            } else {
-                // 如果沒有 assertions，根據 success 判斷
-                passingRates.push(test.success ? 100 : 0);
-            }
-        });
-
-        if (passingRates.length === 0) {
+        const passRate = statistics?.pass_rate;
+        if (!passRate || !statistics.total_tests) {
             ctx.getContext('2d').font = '14px Arial';
             ctx.getContext('2d').fillText('無 Passing Rate 數據', 50, 100);
             return;
         }
 
-        // 創建通過率分佈
-        const rateBins = [0, 0, 0, 0, 0]; // 0-20%, 21-40%, 41-60%, 61-80%, 81-100%
-        const rateLabels = ['0-20%', '21-40%', '41-60%', '61-80%', '81-100%'];
-        
-        passingRates.forEach(rate => {
-            if (rate <= 20) rateBins[0]++;
-            else if (rate <= 40) rateBins[1]++;
-            else if (rate <= 60) rateBins[2]++;
-            else if (rate <= 80) rateBins[3]++;
-            else rateBins[4]++;
-        });
+        const confidence = Math.round(passRate.confidence * 100);
 
         this.currentChart = new Chart(ctx, {
             type: 'doughnut',
             data: {
-                labels: rateLabels,
+                labels: ['通過', '失敗'],
                 datasets: [{
-                    data: rateBins,
-                    backgroundColor: ['#dc3545', '#fd7e14', '#ffc107', '#20c997', '#28a745'],
-                    borderColor: ['#c82333', '#e8590c', '#e0a800', '#1aa179', '#1e7e34'],
+                    data: [passRate.passed, statistics.total_tests - passRate.passed],
+                    backgroundColor: ['#28a745', '#dc3545'],
+                    borderColor: ['#1e7e34', '#c82333'],
                     borderWidth: 2
                 }]
             },
@@ -115,7 +92,7 @@ class ChartManager {
                 plugins: {
                     title: {
                         display: true,
-                        text: `Passing Rate 分佈 (${passingRates.length} 個測試)`
+                        text: `Passing Rate ${passRate.value}% (${confidence}% CI ${passRate.ci_low}–${passRate.ci_high}%, ${statistics.total_tests} 個測試)`
                     },
                     legend: {
                         position: 'bottom'
@@ -3,7 +3,8 @@
 
 class ChartUtils {
     // 創建 Assertions 圖表的通用邏輯
-    static createAssertionsChart(detail, canvasId) {
+    // statistics 為 /api/evaluation-results/<id>/statistics 的回應，通過 / 失敗數由伺服器依指標彙總
+    static createAssertionsChart(statistics, canvasId) {
         const ctx = document.getElementById(canvasId);
         if (!ctx || typeof Chart === 'undefined') {
             if (ctx) {
@@ -13,62 +14,16 @@ class ChartUtils {
             return null;
         }
         
-        // 收集 assertions 數據，精確區分不同指標
-        const assertionTypes = {};
-        detail.details.forEach(test => {
-            if (test.assertions && test.assertions.length > 0) {
-                test.assertions.forEach(assertion => {
-                    let displayName = assertion.type || 'unknown';
-                    
-                    // 對於 python 類型，根據 value 區分不同指標
-                    if (assertion.type === 'python' && assertion.value) {
-                        if (assertion.value.includes('bert_f1')) {
-                            displayName = 'BERTScore F1';
-                        } else if (assertion.value.includes('bert_recall')) {
-                            displayName = 'BERTScore Recall';
-                        } else if (assertion.value.includes('bert_precision')) {
-                            displayName = 'BERTScore Precision';
-                        } else {
-                            displayName = 'Python評估';
-                        }
-                    }
-                    
-                    // 對於 g-eval 類型，根據內容進一步區分
-                    if (assertion.type === 'g-eval' && assertion.value) {
-                        if (assertion.value.length > 50) {
-                            if (assertion.value.includes('台電') || assertion.value.includes('服務相關')) {
-                                displayName = 'G-Eval (服務相關性)';
-                            } else if (assertion.value.includes('無關') || assertion.value.includes('問題')) {
-                                displayName = 'G-Eval (問題相關性)';
-                            } else {
-                                displayName = 'G-Eval';
-                            }
-                        } else {
-                            displayName = 'G-Eval';
-                        }
-                    }
-                    
-                    if (!assertionTypes[displayName]) {
-                        assertionTypes[displayName] = { pass: 0, fail: 0 };
-                    }
-                    if (assertion.pass) {
-                        assertionTypes[displayName].pass++;
-                    } else {
-                        assertionTypes[displayName].fail++;
-                    }
-                });
-            }
-        });
-
-        const labels = Object.keys(assertionTypes);
+        const assertions = statistics?.assertions || [];
+        const labels = assertions.map(assertion => assertion.label);
         if (labels.length === 0) {
             ctx.getContext('2d').font = '14px Arial';
             ctx.getContext('2d').fillText('無 Assertions 數據', 50, 100);
             return null;
         }
 
-        const passData = labels.map(label => assertionTypes[label].pass);
-        const failData = labels.map(label => assertionTypes[label].fail);
+        const passData = assertions.map(assertion => assertion.passed);
+        const failData = assertions.map(assertion => assertion.failed);
 
         return new Chart(ctx, {
             type: 'bar',
@@ -111,8 +66,8 @@ class ChartUtils {
         });
     }
 
-    // 創建 Latency 圖表的通用邏輯
-    static createLatencyChart(detail, canvasId) {
+    // 創建 Latency 圖表的通用邏輯（分箱由伺服器計算，分箱數量在請求統計時指定）
+    static createLatencyChart(statistics, canvasId) {
         const ctx = document.getElementById(canvasId);
         if (!ctx || typeof Chart === 'undefined') {
             if (ctx) {
@@ -122,36 +77,15 @@ class ChartUtils {
             return null;
         }
         
-        // 收集延遲數據
-        const latencies = detail.details
-            .filter(test => test.latency && test.latency > 0)
-            .map(test => test.latency);
-
-        if (latencies.length === 0) {
+        const latency = statistics?.latency;
+        if (!latency || latency.count === 0) {
             ctx.getContext('2d').font = '14px Arial';
             ctx.getContext('2d').fillText('無 Latency 數據', 50, 100);
             return null;
         }
 
-        // 創建延遲分佈直方圖
-        const bins = canvasId.includes('modal') ? 8 : 5; // 模態框使用更多分箱
-        const min = Math.min(...latencies);
-        const max = Math.max(...latencies);
-        const binSize = (max - min) / bins;
-        
-        const latencyBins = new Array(bins).fill(0);
-        const binLabels = [];
-        
-        for (let i = 0; i < bins; i++) {
-            const start = Math.round(min + i * binSize);
-            const end = Math.round(min + (i + 1) * binSize);
-            binLabels.push(`${start}-${end}ms`);
-        }
-        
-        latencies.forEach(latency => {
-            const binIndex = Math.min(Math.floor((latency - min) / binSize), bins - 1);
-            latencyBins[binIndex]++;
-        });
+        const binLabels = ChartUtils.histogramLabels(latency.histogram, edge => Math.round(edge), 'ms');
+        const latencyBins = latency.histogram.counts;
 
         return new Chart(ctx, {
             type: 'bar',
@@ -181,13 +115,19 @@ class ChartUtils {
                 plugins: {
                     title: {
                         display: true,
-                        text: `Latency 分佈 (${latencies.length} 個測試)`
+                        text: `Latency 分佈 (${latency.count} 個測試)`
                     },
                     legend: { display: false }
                 }
             }
         });
     }
+
+    // 將直方圖邊界轉換為各分箱的標籤
+    static histogramLabels(histogram, format, unit = '') {
+        const edges = histogram?.edges || [];
+        return edges.slice(0, -1).map((edge, i) => `${format(edge)}-${format(edges[i + 1])}${unit}`);
+    }
 }
 
 // 導出到全局作用域
@@ -142,6 +142,12 @@ function navigateToEvaluationDetail(evalId) {
     loadEvaluationDetail(evalId);
 }
 
+// 詳情頁每次載入的測試案例數
+const DETAIL_PAGE_SIZE = 100;
+
+// 詳情頁的分頁與篩選狀態
+let detailPageState = null;
+
 // 載入評估詳情
 async function loadEvaluationDetail(evalId) {
     const container = document.getElementById('evaluation-detail');
@@ -167,20 +173,27 @@ async function loadEvaluationDetail(evalId) {
             </div>
         `;
         
-        const detail = await EvaluationAPI.getDetail(evalId);
+        // 只載入第一頁輕量資料，延遲統計由 statistics 端點計算（失敗時不影響詳情頁）
+        const [detail, statistics] = await Promise.all([
+            EvaluationAPI.getDetailPage(evalId, { limit: DETAIL_PAGE_SIZE }),
+            EvaluationAPI.getStatistics(evalId).catch(error => {
+                console.warn('[Detail] 載入評估統計失敗:', error);
+                return null;
+            })
+        ]);
         const detailDuration = Date.now() - detailStartTime;
         console.log(`[Detail] 評估詳情數據載入完成，耗時：${detailDuration}ms`);
-        
+
         // 數據驗證
         if (!detail) {
             throw new Error('無法獲取評估詳情數據');
         }
-        
+
         if (!detail.details || !Array.isArray(detail.details)) {
             throw new Error('評估數據格式錯誤：缺少測試案例詳情');
         }
-        
-        if (detail.details.length === 0) {
+
+        if (!detail.total_tests) {
             container.innerHTML = `
                 <div class="alert alert-warning">
                     <i class="fas fa-exclamation-triangle me-2"></i>
@@ -194,18 +207,25 @@ async function loadEvaluationDetail(evalId) {
         }
         
         // 計算統計信息
-        const totalTests = detail.details.length;
-        const passedTests = detail.details.filter(t => t && t.success).length;
+        const totalTests = detail.total_tests;
+        const passedTests = detail.passed_tests;
         const failedTests = totalTests - passedTests;
         const passRate = totalTests > 0 ? ((passedTests / totalTests) * 100).toFixed(1) : '0.0';
-        
-        // 計算延遲統計
-        const latencies = detail.details.map(t => t.latency || 0).filter(l => l > 0);
-        const avgLatency = latencies.length > 0 
-            ? Math.round(latencies.reduce((a, b) => a + b, 0) / latencies.length) 
-            : 0;
-        const minLatency = latencies.length > 0 ? Math.min(...latencies) : 0;
-        const maxLatency = latencies.length > 0 ? Math.max(...latencies) : 0;
+
+        // 延遲統計（伺服器端計算，只計入 latency > 0 的測試）
+        const latencyStats = statistics?.latency || {};
+        const avgLatency = latencyStats.count > 0 ? Math.round(latencyStats.mean) : 0;
+        const minLatency = latencyStats.count > 0 ? latencyStats.min : 0;
+        const maxLatency = latencyStats.count > 0 ? latencyStats.max : 0;
+
+        detailPageState = {
+            evalId: evalId,
+            status: '',
+            nextCursor: detail.page?.next_cursor ?? null,
+            variableKeys: collectVariableKeys(detail.details),
+            loading: false,
+            requestId: 0
+        };
         
         const detailHtml = `
             <div class="px-3">
@@ -316,7 +336,7 @@ async function loadEvaluationDetail(evalId) {
                         </div>
                         <div class="col-md-5">
                             <input type="text" class="form-control form-control-sm" id="testCaseSearch" 
-                                   placeholder="🔍 搜索測試案例..." 
+                                   placeholder="🔍 搜索已載入的測試案例..." 
                                    onkeyup="searchTestCases()">
                         </div>
                     </div>
@@ -324,6 +344,9 @@ async function loadEvaluationDetail(evalId) {
                 
                 <!-- 測試案例詳情表格 -->
                 ${generateTestCaseTable(detail)}
+                <div id="testCaseLoadMore" class="text-center py-2">
+                    ${generateLoadMoreButton(detail.details.length, totalTests)}
+                </div>
             </div>
         `;
         
@@ -333,10 +356,12 @@ async function loadEvaluationDetail(evalId) {
         window.currentEvalDetail = detail;
         
         console.log('[Detail] 評估詳情頁面渲染完成');
-        console.log('[Detail] currentEvalDetail 已更新，包含', detail.details?.length || 0, '個測試案例');
+        console.log('[Detail] currentEvalDetail 已更新，已載入', detail.details?.length || 0, '/', totalTests, '個測試案例');
+        
+        window.currentEvalStatistics = statistics;
         
         // 生成圖表（如果需要）
-        // generateCharts(detail);
+        // generateCharts(statistics);
         
     } catch (error) {
         const detailDuration = Date.now() - detailStartTime;
@@ -381,19 +406,7 @@ function generateTestCaseTable(detail) {
             `;
         }
         
-        // 動態獲取所有變數欄位
-        const allVariables = new Set();
-        detail.details.forEach(test => {
-            if (test && test.variables && typeof test.variables === 'object') {
-                Object.keys(test.variables).forEach(key => allVariables.add(key));
-            }
-        });
-        const variableKeys = Array.from(allVariables);
-
-        // 如果沒有任何變數欄位，添加一個默認列
-        if (variableKeys.length === 0) {
-            variableKeys.push('測試案例');
-        }
+        const variableKeys = detailPageState?.variableKeys || collectVariableKeys(detail.details);
 
         return `
             <div class="card border-0 shadow-sm">
@@ -416,21 +429,7 @@ function generateTestCaseTable(detail) {
                                 </tr>
                             </thead>
                             <tbody>
-                                ${detail.details.map((test, index) => {
-                                    try {
-                                        return generateTestCaseRow(test, index, variableKeys, detail.id);
-                                    } catch (rowError) {
-                                        console.error(`生成測試案例行 ${index + 1} 失敗:`, rowError);
-                                        return `
-                                            <tr>
-                                                <td colspan="${variableKeys.length + 2}" class="text-danger">
-                                                    <i class="fas fa-exclamation-triangle me-2"></i>
-                                                    測試案例 #${index + 1} 數據格式錯誤
-                                                </td>
-                                            </tr>
-                                        `;
-                                    }
-                                }).join('')}
+                                ${generateTestCaseRows(detail.details, 0, variableKeys, detail.eval_id)}
                             </tbody>
                         </table>
                     </div>
@@ -448,6 +447,123 @@ function generateTestCaseTable(detail) {
     }
 }
 
+// 從測試案例收集變數欄位（沒有任何變數時使用默認列）
+function collectVariableKeys(details) {
+    const allVariables = new Set();
+    details.forEach(test => {
+        if (test && test.variables && typeof test.variables === 'object') {
+            Object.keys(test.variables).forEach(key => allVariables.add(key));
+        }
+    });
+    const variableKeys = Array.from(allVariables);
+
+    if (variableKeys.length === 0) {
+        variableKeys.push('測試案例');
+    }
+    return variableKeys;
+}
+
+// 生成多筆測試案例行，startIndex 為第一筆在已載入列表中的位置
+function generateTestCaseRows(details, startIndex, variableKeys, evalId) {
+    return details.map((test, offset) => {
+        const index = startIndex + offset;
+        try {
+            return generateTestCaseRow(test, index, variableKeys, evalId);
+        } catch (rowError) {
+            console.error(`生成測試案例行 ${index + 1} 失敗:`, rowError);
+            return `
+                <tr>
+                    <td colspan="${variableKeys.length + 2}" class="text-danger">
+                        <i class="fas fa-exclamation-triangle me-2"></i>
+                        測試案例 #${index + 1} 數據格式錯誤
+                    </td>
+                </tr>
+            `;
+        }
+    }).join('');
+}
+
+// 生成「載入更多」按鈕
+function generateLoadMoreButton(loadedCount, matchedCount) {
+    if (!detailPageState || detailPageState.nextCursor === null) {
+        return loadedCount > 0
+            ? `<span class="text-muted small">已載入全部 ${loadedCount} 個測試案例</span>`
+            : '';
+    }
+    return `
+        <button class="btn btn-sm btn-outline-primary" onclick="loadMoreTestCases()">
+            <i class="fas fa-chevron-down me-1"></i>載入更多
+        </button>
+        <span class="text-muted small ms-2">已載入 ${loadedCount}${matchedCount ? ` / ${matchedCount}` : ''} 個測試案例</span>
+    `;
+}
+
+// 以目前的篩選條件載入下一頁（cursor 為空時重新載入第一頁）
+async function fetchTestCasePage(cursor) {
+    const state = detailPageState;
+    const requestId = ++state.requestId;
+    state.loading = true;
+    try {
+        const page = await EvaluationAPI.getDetailPage(state.evalId, {
+            limit: DETAIL_PAGE_SIZE,
+            cursor: cursor,
+            status: state.status
+        });
+        // 期間切換了篩選條件或評估時捨棄舊的回應
+        if (state !== detailPageState || requestId !== state.requestId) {
+            return null;
+        }
+        state.nextCursor = page.page?.next_cursor ?? null;
+        return page;
+    } finally {
+        if (requestId === state.requestId) {
+            state.loading = false;
+        }
+    }
+}
+
+// 載入下一頁測試案例並附加到表格
+async function loadMoreTestCases() {
+    const detail = window.currentEvalDetail;
+    if (!detailPageState || !detail || detailPageState.loading || detailPageState.nextCursor === null) {
+        return;
+    }
+
+    const loadMore = document.getElementById('testCaseLoadMore');
+    if (loadMore) {
+        loadMore.innerHTML = '<span class="spinner-border spinner-border-sm text-primary"></span>';
+    }
+
+    try {
+        const page = await fetchTestCasePage(detailPageState.nextCursor);
+        if (!page) return;
+
+        const startIndex = detail.details.length;
+        detail.details.push(...page.details);
+
+        const tbody = document.querySelector('#testCaseTable tbody');
+        if (tbody) {
+            tbody.insertAdjacentHTML('beforeend',
+                generateTestCaseRows(page.details, startIndex, detailPageState.variableKeys, detailPageState.evalId));
+        }
+        searchTestCases();
+    } catch (error) {
+        console.error('[Detail] 載入更多測試案例失敗:', error);
+        Toast.error('載入更多測試案例失敗: ' + error.message);
+    } finally {
+        updateLoadMoreButton();
+    }
+}
+
+// 更新「載入更多」按鈕
+function updateLoadMoreButton() {
+    const loadMore = document.getElementById('testCaseLoadMore');
+    const detail = window.currentEvalDetail;
+    if (loadMore && detail) {
+        loadMore.innerHTML = generateLoadMoreButton(detail.details.length, detail.matched_tests ?? detail.total_tests);
+    }
+}
+
 // HTML 轉義函數
 function escapeHtml(text) {
     if (!text) return '';
@@ -603,9 +719,16 @@ function generateOutputResultCell(test, index, evalId) {
                                 </button>
                             </div>
                         </div>` : 
-                        `<div class="bg-light p-2 rounded" style="font-size: 0.875rem; line-height: 1.5; max-height: 250px; overflow-y: auto; white-space: pre-line; word-break: break-word;">
-                            ${outputContent}
-                        </div>`
+                        `<div class="bg-light p-2 rounded" id="output_preview_${index}" style="font-size: 0.875rem; line-height: 1.5; max-height: 250px; overflow-y: auto; white-space: pre-line; word-break: break-word;">
+                            ${outputContent}${test.output_truncated ? '...' : ''}
+                        </div>
+                        ${test.output_truncated ? `
+                            <div class="mt-2" id="output_more_${index}">
+                                <button class="btn btn-link btn-sm p-0" onclick="loadFullOutput(${index}, '${evalId}')">
+                                    <i class="fas fa-chevron-down me-1"></i>顯示完整輸出
+                                </button>
+                            </div>
+                        ` : ''}`
                     }
                 </div>
             </div>
@@ -644,34 +767,51 @@ function backToResults() {
     console.log('[Detail] 返回操作完成');
 }
 
-// 篩選測試案例
-function filterTestCases(filter) {
+// 篩選測試案例（由伺服器依狀態篩選，重新載入第一頁）
+async function filterTestCases(filter) {
     // 更新按鈕狀態
     document.querySelectorAll('.filter-btn').forEach(btn => {
         btn.classList.remove('active');
     });
     document.querySelector(`[data-filter="${filter}"]`).classList.add('active');
     
-    // 篩選表格行
-    const table = document.getElementById('testCaseTable');
-    if (!table) return;
+    const detail = window.currentEvalDetail;
+    const tbody = document.querySelector('#testCaseTable tbody');
+    if (!detailPageState || !detail || !tbody) return;
     
-    const rows = table.querySelectorAll('tbody tr');
-    rows.forEach(row => {
-        const status = row.getAttribute('data-test-status');
-        if (filter === 'all') {
-            row.style.display = '';
-        } else if (filter === 'passed' && status === 'passed') {
-            row.style.display = '';
-        } else if (filter === 'failed' && status === 'failed') {
-            row.style.display = '';
-        } else {
-            row.style.display = 'none';
-        }
-    });
+    detailPageState.status = filter === 'passed' ? 'PASS' : filter === 'failed' ? 'FAIL' : '';
+    detailPageState.nextCursor = null;
+    
+    const loadMore = document.getElementById('testCaseLoadMore');
+    if (loadMore) {
+        loadMore.innerHTML = '<span class="spinner-border spinner-border-sm text-primary"></span>';
+    }
+    
+    try {
+        const page = await fetchTestCasePage(null);
+        if (!page) return;
+        
+        detail.details = page.details;
+        detail.matched_tests = page.matched_tests;
+        tbody.innerHTML = page.details.length > 0
+            ? generateTestCaseRows(page.details, 0, detailPageState.variableKeys, detailPageState.evalId)
+            : `
+                <tr>
+                    <td colspan="${detailPageState.variableKeys.length + 2}" class="text-center text-muted py-4">
+                        沒有符合條件的測試案例
+                    </td>
+                </tr>
+            `;
+        searchTestCases();
+    } catch (error) {
+        console.error('[Detail] 篩選測試案例失敗:', error);
+        Toast.error('篩選測試案例失敗: ' + error.message);
+    } finally {
+        updateLoadMoreButton();
+    }
 }
 
-// 搜索測試案例
+// 搜索已載入的測試案例（狀態篩選已由伺服器處理）
 function searchTestCases() {
     const searchInput = document.getElementById('testCaseSearch');
     if (!searchInput) return;
@@ -683,21 +823,7 @@ function searchTestCases() {
     const rows = table.querySelectorAll('tbody tr');
     rows.forEach(row => {
         const text = row.textContent.toLowerCase();
-        if (text.includes(query)) {
-            // 只顯示匹配搜索且符合當前篩選的行
-            const currentFilter = document.querySelector('.filter-btn.active')?.getAttribute('data-filter');
-            const status = row.getAttribute('data-test-status');
-            
-            if (!currentFilter || currentFilter === 'all') {
-                row.style.display = '';
-            } else if (currentFilter === status) {
-                row.style.display = '';
-            } else {
-                row.style.display = 'none';
-            }
-        } else {
-            row.style.display = 'none';
-        }
+        row.style.display = text.includes(query) ? '' : 'none';
     });
 }
 
@@ -717,6 +843,24 @@ function toggleVariableContent(testIndex, variableName) {
     }
 }
 
+// 讀取單列的完整輸出（列表只載入輸出預覽）
+async function loadFullOutput(testIndex, evalId) {
+    const row = window.currentEvalDetail?.details?.[testIndex];
+    const previewElement = document.getElementById(`output_preview_${testIndex}`);
+    const moreElement = document.getElementById(`output_more_${testIndex}`);
+    if (!row || !previewElement) return;
+    
+    try {
+        const test = await EvaluationAPI.getDetailRow(evalId, row.row_id);
+        previewElement.style.maxHeight = '400px';
+        previewElement.innerHTML = escapeHtml(String(test.output || '').trim());
+        if (moreElement) moreElement.remove();
+    } catch (error) {
+        console.error('載入完整輸出失敗:', error);
+        Toast.error('載入完整輸出失敗: ' + error.message);
+    }
+}
+
 // 切換輸出內容顯示
 function toggleOutputContent(testIndex) {
     const shortElement = document.getElementById(`output_short_${testIndex}`);
@@ -736,14 +880,15 @@ function toggleOutputContent(testIndex) {
 // 顯示測試詳細資訊
 async function showTestDetails(testIndex, evalId) {
     try {
-        // 使用已經載入的數據而不是重新請求 API
+        // 列表只有精簡的 assertion 資料，展開時再讀取該列的完整內容
         const detail = window.currentEvalDetail;
-        if (!detail) {
+        const row = detail?.details?.[testIndex];
+        if (!row) {
             console.error('找不到評估詳細數據');
             Toast.error('找不到評估數據，請重新載入頁面');
             return;
         }
-        const test = detail.details[testIndex];
+        const test = await EvaluationAPI.getDetailRow(evalId, row.row_id);
         
         // 生成 Assertions 表格的 HTML
         const assertionsHtml = test.assertions && test.assertions.length > 0 ? 
@@ -870,52 +1015,35 @@ document.querySelectorAll('[data-tab="results"]').forEach(tab => {
     tab.addEventListener('click', autoLoadResults);
 });
 
-// 生成圖表
-function generateCharts(detail) {
+// 生成圖表（statistics 為 EvaluationAPI.getStatistics 的回應，直方圖由伺服器計算）
+function generateCharts(statistics) {
+    if (!statistics) return;
+    
     // 生成延遲分佈圖
-    generateLatencyChart(detail);
+    generateLatencyChart(statistics);
     
     // 生成 BERT Score F1 分佈圖
-    generateBertScoreChart(detail);
+    generateBertScoreChart(statistics);
 }
 
 // 生成延遲分佈圖
-function generateLatencyChart(detail) {
+function generateLatencyChart(statistics) {
     const ctx = document.getElementById('latencyChart');
     if (!ctx) return;
     
-    // 收集延遲數據
-    const latencies = detail.details
-        .map(test => test.latency)
-        .filter(latency => latency !== undefined && latency !== null)
-        .map(latency => parseFloat(latency));
-    
-    if (latencies.length === 0) {
+    const latency = statistics.latency;
+    if (!latency || latency.count === 0) {
         ctx.parentElement.innerHTML = '<p class="text-muted text-center">無延遲數據</p>';
         return;
     }
     
-    // 計算分佈
-    const minLatency = Math.min(...latencies);
-    const maxLatency = Math.max(...latencies);
-    const binSize = Math.max(10, Math.ceil((maxLatency - minLatency) / 10));
-    const bins = {};
-    
-    latencies.forEach(latency => {
-        const bin = Math.floor(latency / binSize) * binSize;
-        bins[bin] = (bins[bin] || 0) + 1;
-    });
-    
-    const labels = Object.keys(bins).map(Number).sort((a, b) => a - b);
-    const data = labels.map(label => bins[label]);
-    
     new Chart(ctx, {
         type: 'bar',
         data: {
-            labels: labels.map(label => `${label}-${label + binSize}ms`),
+            labels: ChartUtils.histogramLabels(latency.histogram, edge => Math.round(edge), 'ms'),
             datasets: [{
                 label: 'Count',
-                data: data,
+                data: latency.histogram.counts,
                 backgroundColor: 'rgba(34, 197, 94, 0.8)',
                 borderColor: 'rgba(34, 197, 94, 1)',
                 borderWidth: 1
@@ -962,51 +1090,24 @@ function generateLatencyChart(detail) {
 }
 
 // 生成 BERT Score F1 分佈圖
-function generateBertScoreChart(detail) {
+function generateBertScoreChart(statistics) {
     const ctx = document.getElementById('bertScoreChart');
     if (!ctx) return;
     
-    // 收集 BERT Score F1 數據
-    const bertScores = [];
-    detail.details.forEach(test => {
-        if (test.assertions) {
-            test.assertions.forEach(assertion => {
-                if (assertion.type === 'python' && assertion.score !== undefined) {
-                    // 檢查是否是 BERT Score F1
-                    if (assertion.reason && assertion.reason.includes('BERTScore F1')) {
-                        bertScores.push(parseFloat(assertion.score));
-                    }
-                }
-            });
-        }
-    });
-    
-    if (bertScores.length === 0) {
+    // 伺服器依 assertion value 將 BERTScore 指標標記為 BERTScore F1 / Recall / Precision
+    const bertF1 = (statistics.assertions || []).find(assertion => assertion.label === 'BERTScore F1');
+    if (!bertF1 || bertF1.count === 0) {
         ctx.parentElement.innerHTML = '<p class="text-muted text-center">無 BERT Score F1 數據</p>';
         return;
     }
     
-    // 計算分佈
-    const minScore = Math.min(...bertScores);
-    const maxScore = Math.max(...bertScores);
-    const binSize = Math.max(0.1, Math.ceil((maxScore - minScore) / 10 * 10) / 10);
-    const bins = {};
-    
-    bertScores.forEach(score => {
-        const bin = Math.floor(score / binSize) * binSize;
-        bins[bin] = (bins[bin] || 0) + 1;
-    });
-    
-    const labels = Object.keys(bins).map(Number).sort((a, b) => a - b);
-    const data = labels.map(label => bins[label]);
-    
     new Chart(ctx, {
         type: 'bar',
         data: {
-            labels: labels.map(label => `${label.toFixed(1)}-${(label + binSize).toFixed(1)}`),
+            labels: ChartUtils.histogramLabels(bertF1.histogram, edge => edge.toFixed(1)),
             datasets: [{
                 label: 'Count',
-                data: data,
+                data: bertF1.histogram.counts,
                 backgroundColor: 'rgba(59, 130, 246, 0.8)',
                 borderColor: 'rgba(59, 130, 246, 1)',
                 borderWidth: 1
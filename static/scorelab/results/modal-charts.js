@@ -2,11 +2,14 @@
 // 處理詳細圖表的彈出視窗功能
 
 class ModalCharts {
-    // 顯示詳細圖表彈出視窗
-    static show(evalId) {
-        const detail = window.currentEvalDetail;
-        if (!detail) {
-            console.error('無法獲取評估詳細數據');
+    // 顯示詳細圖表彈出視窗（分佈統計由 statistics 端點計算，不需要載入全部測試案例）
+    static async show(evalId) {
+        let statistics;
+        try {
+            statistics = await EvaluationAPI.getStatistics(evalId, { score_bins: 5, latency_bins: 8 });
+        } catch (error) {
+            console.error('無法獲取評估統計數據:', error);
+            Toast.error('載入評估統計失敗: ' + error.message);
             return;
         }
         
@@ -75,9 +78,9 @@ class ModalCharts {
         
         // 延遲創建圖表，確保模態框完全顯示
         setTimeout(() => {
-            this.createAssertionsChart(detail);
-            this.createLatencyChart(detail);
-            this.createScoreChart(detail);
+            this.createAssertionsChart(statistics);
+            this.createLatencyChart(statistics);
+            this.createScoreChart(statistics);
         }, 300);
         
         // 模態框關閉後移除DOM元素
@@ -87,33 +90,24 @@ class ModalCharts {
     }
 
     // 創建模態框中的 Assertions 圖表
-    static createAssertionsChart(detail) {
-        ChartUtils.createAssertionsChart(detail, 'modalAssertionsChart');
+    static createAssertionsChart(statistics) {
+        ChartUtils.createAssertionsChart(statistics, 'modalAssertionsChart');
     }
 
     // 創建模態框中的 Latency 圖表
-    static createLatencyChart(detail) {
-        ChartUtils.createLatencyChart(detail, 'modalLatencyChart');
+    static createLatencyChart(statistics) {
+        ChartUtils.createLatencyChart(statistics, 'modalLatencyChart');
     }
 
     // 創建模態框中的分數分佈圖表
-    static createScoreChart(detail) {
+    static createScoreChart(statistics) {
         const ctx = document.getElementById('modalScoreChart');
         if (!ctx || typeof Chart === 'undefined') return;
         
-        const scores = detail.details.map(test => test.score || 0);
-        
-        // 創建分數區間
-        const scoreBins = [0, 0, 0, 0, 0]; // 0-0.2, 0.2-0.4, 0.4-0.6, 0.6-0.8, 0.8-1.0
-        const scoreLabels = ['0-0.2', '0.2-0.4', '0.4-0.6', '0.6-0.8', '0.8-1.0'];
-        
-        scores.forEach(score => {
-            if (score <= 0.2) scoreBins[0]++;
-            else if (score <= 0.4) scoreBins[1]++;
-            else if (score <= 0.6) scoreBins[2]++;
-            else if (score <= 0.8) scoreBins[3]++;
-            else scoreBins[4]++;
-        });
+        // 0–1 區間的 5 個等寬分箱（超出範圍的分數計入頭尾兩格）
+        const histogram = statistics.score.histogram;
+        const scoreBins = histogram.counts;
+        const scoreLabels = ChartUtils.histogramLabels(histogram, edge => Number(edge.toFixed(1)));
 
         new Chart(ctx, {
             type: 'bar',
@@ -143,7 +137,7 @@ class ModalCharts {
                 plugins: {
                     title: {
                         display: true,
-                        text: `分數分佈 (${scores.length} 個測試)`
+                        text: `分數分佈 (${statistics.score.count} 個測試)`
                     },
                     legend: { display: false }
                 }